@@ -24,8 +24,25 @@ SOFTWARE.
 import pandas as pd
 import numpy as np
 import pickle
+import os
 
 import streamlit as st
+
+from utils import telemetry
+from utils.data import data_path, data_version
+from utils.loader import EV_PARQUET, load_ev
+from utils.dtypes import compact_frame
+from utils.coverage import coverage_version, load_coverage, summarize_coverage
+from utils.timeseries import SnapshotCube, load_store, store_version
+from utils.forecast import forecast_version, load_forecast
+from utils.states import STATE_HISTORY, StateAnalytics, load_state_history
+from utils.correlation import CorrelationService
+from utils.vehicle_index import load_vehicle_index
+from utils.rollup import load_rollup, rollup_version
+from utils.tiles import load_tiles
+from utils.geometry import geometry_version, load_geometry
+from utils.query import BACKEND, load_backend
+from utils.features import load_feature_store, store_version as feature_store_version
 # ================================== #
 # Global setting
 
@@ -57,6 +74,7 @@ st.markdown("""
     }
     </style>
 """, unsafe_allow_html=True)
+telemetry.hide_diagnostics_link() # Diagnostics stays reachable by URL only
 
 highlight_color = '#0068C9'
 unhighlight_color = 'lightgray'
@@ -123,8 +141,12 @@ Use the menu at the top left to navigate between pages and explore the features
 def load_data():
     """Load required data"""
     try:
-        with open('data_processed/ev.pickle', 'rb') as f:
-            ev = pickle.load(f)
+        # Prefer the typed columnar store (utils/loader.py) over the pickled notebook output
+        if os.path.exists(data_path(EV_PARQUET)):
+            ev = load_ev()
+        else:
+            with open('data_processed/ev.pickle', 'rb') as f:
+                ev = pickle.load(f)
         with open('data_processed/ev_merged.pickle', 'rb') as f:
             ev_merged = pickle.load(f)
         with open('data_processed/ev_state.pickle', 'rb') as f:
@@ -133,6 +155,106 @@ def load_data():
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None, None, None
+
+@st.cache_data
+def compact_ev(_ev, version):
+    """Categorical/narrow-dtype copy of the EV table, so group-bys run on integer codes"""
+    return compact_frame(_ev)
+
+@st.cache_data
+def load_charger_coverage(_ev, ev_file, version):
+    """Load nearest-charger distances for every EV and summarize them by district and census tract"""
+    # _ev is not hashed by Streamlit; the data version string keys the cache instead
+    try:
+        coverage = load_coverage(_ev, ev_file)
+        by_district = summarize_coverage(_ev, coverage, by='legislative_district')
+        by_tract = summarize_coverage(_ev, coverage, by='2020_census_tract')
+        return coverage, by_district, by_tract
+    except Exception as e:
+        st.error(f"Error computing charger coverage: {e}")
+        return None, None, None
+
+@st.cache_resource(show_spinner=False)
+def load_ev_index(_ev, ev_file, version):
+    """VIN prefix and DOL vehicle ID index over the EV table (saved per data version, memory-mapped read-only)"""
+    try:
+        return load_vehicle_index(_ev, ev_file)
+    except Exception as e:
+        st.error(f"Error building the vehicle index: {e}")
+        return None
+
+@st.cache_resource(show_spinner=False)
+def load_query_backend(_ev, ev_file, version, backend):
+    """Query backend for the EV Analysis aggregations (DuckDB over Parquet when installed, pandas otherwise)"""
+    try:
+        return load_backend(_ev, ev_file, backend)
+    except Exception as e:
+        st.error(f"Error opening the DuckDB query backend, using pandas: {e}")
+        return load_backend(_ev, ev_file, 'pandas')
+
+@st.cache_resource(show_spinner=False)
+def load_density_tiles(_ev, ev_file, version):
+    """Binned EV and charger locations for every map zoom level (saved per data version, memory-mapped read-only)"""
+    try:
+        return load_tiles(_ev, ev_file)
+    except Exception as e:
+        st.error(f"Error building the density map tiles: {e}")
+        return None
+
+@st.cache_data
+def load_district_geometry(version):
+    """Simplified district polygons per detail level (None without the source GeoJSON)"""
+    try:
+        return load_geometry()
+    except Exception as e:
+        st.error(f"Error building the district geometry: {e}")
+        return None
+
+@st.cache_resource(show_spinner=False)
+def load_features(_ev_merged, version):
+    """Point-in-time district features (the current ev_merged table while the feature store is empty)"""
+    try:
+        return load_feature_store(_ev_merged)
+    except Exception as e:
+        st.error(f"Error loading the feature store: {e}")
+        return None
+
+@st.cache_data
+def load_ev_rollup(_ev, ev_file, version):
+    """Counts and sums by state > district > county > city > census tract, from one pass over the EV table"""
+    try:
+        return load_rollup(_ev, ev_file)
+    except Exception as e:
+        st.error(f"Error building the regional rollup: {e}")
+        return None
+
+@st.cache_data
+def load_district_forecast(_ev, ev_file, version):
+    """Fit adoption curves (logistic/Bass) for every district: 2030 projections and target gaps"""
+    try:
+        return load_forecast(_ev, ev_file)
+    except Exception as e:
+        st.error(f"Error fitting adoption forecasts: {e}")
+        return None, None, None
+
+@st.cache_data
+def load_state_analytics(_ev_state, version):
+    """State metrics with ranks and percentiles, one precomputed table per year"""
+    try:
+        return StateAnalytics(_ev_state, load_state_history())
+    except Exception as e:
+        st.error(f"Error computing state rankings: {e}")
+        return None
+
+@st.cache_data
+def load_snapshot_cube(version):
+    """Monthly EV counts across registration snapshots (None while the snapshot store is empty)"""
+    try:
+        store = load_store()
+        return SnapshotCube(store) if store is not None else None
+    except Exception as e:
+        st.error(f"Error loading registration snapshots: {e}")
+        return None
 # The load_data() function is executed on the main page, caching the data and storing it in st.session_state
 # Using @st.cache_data ensures the data load is cached, preventing repeated file reads
 
@@ -146,9 +268,54 @@ if 'data_loaded' not in st.session_state:
     if ev is None or ev_merged is None or ev_state is None:
         st.stop() # Stop the app if data loading fails
         
+    # Normalize dtypes once at load time (categoricals and narrowest numeric types)
+    ev_file = EV_PARQUET if os.path.exists(data_path(EV_PARQUET)) else 'ev.pickle'
+    ev, ev_memory_report = compact_ev(ev, data_version(ev_file))
+
     st.session_state['ev'] = ev
+    st.session_state['ev_memory_report'] = ev_memory_report # Memory before/after (MB) per column
     st.session_state['ev_merged'] = ev_merged
     st.session_state['ev_state'] = ev_state
+    st.session_state['ev_file'] = ev_file # Source of the EV table, for data-versioned results computed on the pages
+
+    # Derived charger coverage columns (persisted per data version, so reruns never recompute them)
+    coverage, coverage_by_district, coverage_by_tract = load_charger_coverage(ev, ev_file, coverage_version(ev_file))
+    st.session_state['ev_coverage'] = coverage
+    st.session_state['coverage_by_district'] = coverage_by_district
+    st.session_state['coverage_by_tract'] = coverage_by_tract
+
+    # Counts, means and distinct values of the EV table for the analysis page (SQL over Parquet, or pandas)
+    st.session_state['ev_query'] = load_query_backend(ev, ev_file, data_version(ev_file), BACKEND)
+
+    # Vehicle lookup and duplicate checks by VIN prefix / DOL vehicle ID (built once per data version)
+    st.session_state['vehicle_index'] = load_ev_index(ev, ev_file, data_version(ev_file))
+
+    # County, city and census tract views with drill-down (built once per data version)
+    st.session_state['ev_rollup'] = load_ev_rollup(ev, ev_file, rollup_version(ev_file))
+
+    # EV and charger density map tiles (binned once per data version)
+    st.session_state['density_tiles'] = load_density_tiles(ev, ev_file, data_version(ev_file, 'charger.pickle'))
+
+    # Legislative district boundaries for choropleth maps (simplified and cached per source file)
+    st.session_state['district_geometry'] = load_district_geometry(geometry_version())
+
+    # District feature vectors by as-of date, with per-feature statistics (utils/features.py)
+    st.session_state['feature_store'] = load_features(ev_merged, (feature_store_version(), data_version('ev_merged.pickle')))
+
+    # Cross-state rankings (2023 counts plus any extra years/metrics in state_history.csv)
+    st.session_state['state_analytics'] = load_state_analytics(ev_state, data_version('ev_state.pickle', STATE_HISTORY))
+
+    # Correlations between district features (matrices memoized per district subset and method)
+    st.session_state['correlations'] = CorrelationService(ev_merged)
+
+    # District adoption forecasts (fitted once per data version)
+    forecast, forecast_curves, adoption_history = load_district_forecast(ev, ev_file, forecast_version(ev_file))
+    st.session_state['district_forecast'] = forecast
+    st.session_state['forecast_curves'] = forecast_curves
+    st.session_state['adoption_history'] = adoption_history
+
+    # Registration snapshots over time (utils/timeseries.py), rebuilt only when a snapshot is appended
+    st.session_state['ev_snapshots'] = load_snapshot_cube(store_version())
     st.session_state['data_loaded'] = True # Set a flag to ensure data is loaded only once
 
 # ================================== #
@@ -0,0 +1,636 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from utils import telemetry
+from utils.data import data_path, data_version, load_pickle
+from utils.coverage import compute_charger_coverage, summarize_coverage
+from utils.dtypes import compact_frame
+from utils.loader import load_ev
+from utils.forecast import forecast_districts
+from utils.states import StateAnalytics
+from utils.correlation import KEY_FEATURES, CorrelationService
+from utils.warmup import warm_up
+from utils.coalesce import RunTracker
+from utils.goal_seek import GOAL_FEATURES, GoalSeeker
+from utils.sensitivity import DEFAULT_SAMPLES, sobol_analysis
+from utils.batch_shap import BatchTreeShap, load_engine, shap_values
+from utils.vehicle_index import VehicleIndex
+from utils.rollup import Rollup
+from utils.tiles import DensityTiles
+from utils.query import DuckDBBackend, PandasBackend, duckdb, write_query_table
+from utils.geometry import GEOMETRY_FILE, build_geometry, load_geometry, to_geojson
+from utils.features import FeatureStore, add_features
+from utils.surrogate import DEFAULT_TOLERANCE, compact_model, validation_inputs
+from utils.timeseries import SnapshotCube, aggregate_snapshot, append_snapshot, load_store, rolling_mean, year_over_year, growth_rate
+from benchmarks.synthetic import load_real_ev, make_district_geojson, make_ev_table, make_snapshot_history, make_state_history
+
+# ================================== #
+# Headless benchmark suite: data load, analysis page render and prediction latency
+# Usage (from the repository root):
+#   python -m benchmarks.run_benchmarks                     # run and compare with benchmarks/baseline.json
+#   python -m benchmarks.run_benchmarks --scales 1 10       # smaller synthetic tables
+#   python -m benchmarks.run_benchmarks --update-baseline   # store this run as the new baseline
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_DIR, 'benchmarks', 'baseline.json')
+DEFAULT_SCALES = [1, 10, 100]
+TOLERANCE = 0.25 # Allowed slowdown / memory growth vs. the baseline
+NOISE_FLOOR_SECONDS = 0.005 # Differences below these are never reported
+NOISE_FLOOR_MB = 5.0
+NOISE_FLOOR_BYTES = 2048
+QUERY_BUDGET_SECONDS = 0.1 # Time-series window queries over 10 years of monthly snapshots
+PAYLOAD_GROWTH_LIMIT = 1.25 # Max chart payload growth from the smallest to the largest scale (payloads must not follow len(ev))
+DRAG_VALUES = 40 # Slider values sent during one simulated drag
+DRAG_INTERVAL_SECONDS = 0.025 # Time between slider values while dragging
+DRAG_RENDER_STEPS = 10 # Yield points (st.* calls) in the rest of the page render
+SCENARIO_ROWS = 100_000 # Rows of the synthetic scenario file explained in one batch
+SHAP_TOLERANCE = 1e-6 # Max allowed difference between the batch engine and shap.Explainer
+APP_DEPENDENCIES = ['pandas', 'numpy', 'streamlit', 'plotly.express', 'statsmodels.api', 'sklearn.ensemble', 'shap']
+
+def measure(fn, repeat=3):
+    """Median wall time over repeat runs, then one traced run for peak Python heap memory"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': statistics.median(times), 'min_seconds': min(times), 'peak_mb': peak / 1e6}
+
+# ================================== #
+# Benchmarks
+
+def bench_import_cost(repeat=3):
+    """Cold import time of the app's dependencies in a fresh interpreter"""
+    code = (
+        'import time, resource; start = time.perf_counter()\n'
+        f'import {", ".join(APP_DEPENDENCIES)}\n'
+        'print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+    )
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+        runs.append((float(out[0]), float(out[1])))
+    max_rss_kb = runs[-1][1] if platform.system() != 'Darwin' else runs[-1][1] / 1024 # ru_maxrss is bytes on macOS
+    return {'seconds': statistics.median(r[0] for r in runs), 'min_seconds': min(r[0] for r in runs), 'peak_mb': max_rss_kb / 1024}
+
+def bench_load_artifacts():
+    """Pickled district table, state table and model artifact (what every session loads)"""
+    def load():
+        load_pickle(data_path('ev_merged.pickle'))
+        load_pickle(data_path('ev_state.pickle'))
+        load_pickle(data_path('final_model.pkl'))
+    return measure(load)
+
+def bench_load_ev(ev, tmp_dir, scale):
+    """Main.load_data path for the EV table: read the columnar store, then normalize dtypes"""
+    path = os.path.join(tmp_dir, f'ev_{scale}x.parquet')
+    ev.to_parquet(path, index=False)
+    return measure(lambda: compact_frame(load_ev(path)), repeat=1 if scale >= 100 else 3)
+
+def bench_coverage(ev, charger, scale):
+    """Nearest-charger computation for every EV"""
+    return measure(lambda: compute_charger_coverage(ev, charger), repeat=1 if scale >= 10 else 3)
+
+def bench_vehicle_index(ev, scale):
+    """VIN/DOL ID index: build, lookups and the duplicate report, with the linear scans they replace for reference"""
+    repeat = 1 if scale >= 10 else 3
+    index = VehicleIndex.build(ev)
+    vin = str(ev['vin'].iloc[len(ev) // 2])
+    vehicle_id = int(ev['dol_vehicle_id'].iloc[len(ev) // 2])
+    return {
+        f'vehicle_index/build@{scale}x': measure(lambda: VehicleIndex.build(ev), repeat=repeat),
+        f'vehicle_index/vin_prefix@{scale}x': measure(lambda: index.vin_rows_for(vin[:4]), repeat=20),
+        f'vehicle_index/dol_id@{scale}x': measure(lambda: index.id_rows_for(vehicle_id), repeat=20),
+        f'vehicle_index/duplicates@{scale}x': measure(lambda: index.duplicate_report(ev), repeat=repeat),
+        f'vehicle_index/scan_vin_prefix@{scale}x': measure(lambda: ev['vin'].astype(str).str.startswith(vin[:4]).sum(), repeat=repeat),
+        f'vehicle_index/scan_duplicates@{scale}x': measure(lambda: ev[['vin', 'dol_vehicle_id']].value_counts(), repeat=repeat)
+    }
+
+def bench_rollup(ev, scale):
+    """Regional rollup: one build, then drill-down and a county view under two districts (no scan of the table)"""
+    rollup = Rollup(ev)
+    district = rollup.children(rollup.children().index[:1]).index[0] # Largest district of the largest state
+    return {
+        f'rollup/build@{scale}x': measure(lambda: Rollup(ev), repeat=1 if scale >= 10 else 3),
+        f'rollup/children@{scale}x': measure(lambda: rollup.children(district), repeat=20),
+        f'rollup/county_view@{scale}x': measure(lambda: rollup.view('county', 'legislative_district', ['1', '2']), repeat=20),
+        f'rollup/scan_county_view@{scale}x': measure( # The per-query scan it replaces, for reference
+            lambda: ev[ev['legislative_district'].isin(['1', '2'])].groupby('county', observed=True).size(), repeat=5)
+    }
+
+def bench_tiles(ev, charger, scale):
+    """Density tile pyramid: build (all zoom levels and layers), then one map view's bins at the default detail"""
+    tiles = DensityTiles.build(ev, charger)
+    return {
+        f'tiles/build@{scale}x': measure(lambda: DensityTiles.build(ev, charger), repeat=1 if scale >= 10 else 3),
+        f'tiles/view@{scale}x': measure(lambda: tiles.bins(tiles.finest_zoom('all', None, 5000, zoom=9), 'all'), repeat=20)
+    }
+
+def comparable(result):
+    """Query result as a frame of text (index as a column, means rounded) to compare backends"""
+    frame = result.reset_index() if isinstance(result, pd.Series) else pd.DataFrame(result).reset_index(drop=True)
+    return frame.round(9).astype(str)
+
+def bench_query(ev, tmp_dir, scale):
+    """EV Analysis aggregations on the pandas backend and (when installed) DuckDB, over the whole table and within
+    two districts (results must match); also returns the backend the main page would use"""
+    results, backends = {}, [PandasBackend(ev)]
+    if duckdb is not None:
+        path = os.path.join(tmp_dir, f'ev_query_{scale}x.parquet')
+        results[f'query/duckdb/write@{scale}x'] = measure(lambda: write_query_table(ev, path), repeat=1)
+        backends.append(DuckDBBackend(path))
+    queries = {
+        'counts/ev_type': lambda b, d: b.counts('ev_type', d),
+        'counts/make': lambda b, d: b.counts('make', d),
+        'counts_by/model_year': lambda b, d: b.counts_by(['model_year'], d),
+        'counts_by/model_year_ev_type': lambda b, d: b.counts_by(['model_year', 'ev_type'], d),
+        'nonzero_mean_by/make_range': lambda b, d: b.nonzero_mean_by('make', 'electric_range', d),
+        'distinct/census_tract': lambda b, d: b.distinct('2020_census_tract', d)
+    }
+    for name, query in queries.items():
+        for scope, districts in (('all', None), ('two_districts', ['1', '2'])):
+            outputs = [comparable(query(backend, districts)) for backend in backends]
+            if any(not output.equals(outputs[0]) for output in outputs[1:]):
+                raise RuntimeError(f'Query backends disagree on {name} ({scope})')
+            for backend in backends:
+                results[f'query/{backend.name}/{name}/{scope}@{scale}x'] = measure(lambda: query(backend, districts), repeat=5)
+    return results, backends[-1]
+
+def bench_geometry(tmp_dir):
+    """District geometry: build (topology and every simplification level), then the GeoJSON size of each level"""
+    path = data_path(GEOMETRY_FILE)
+    if not os.path.exists(path):
+        path = make_district_geojson(os.path.join(tmp_dir, GEOMETRY_FILE)) # Synthetic districts with jagged shared edges
+    results = {'geometry/build': measure(lambda: build_geometry(path), repeat=1)}
+    for detail, topology in build_geometry(path).items():
+        results[f'geometry/geojson/{detail.lower()}'] = {'bytes': len(json.dumps(to_geojson(topology), separators=(',', ':')))}
+    return results
+
+def bench_feature_store(ev_merged, tmp_dir, months=120, lookups=1000):
+    """Feature store over 10 years of monthly feature sets: load, serving lookups (vs. a pandas scan),
+    per-set statistics and a point-in-time training join"""
+    store_dir = os.path.join(tmp_dir, 'feature_store')
+    rng = np.random.default_rng(0)
+    numeric = ev_merged.select_dtypes('number').columns
+    dates = pd.date_range('2014-11-01', periods=months, freq='MS')
+    for date in dates: # Drifting copies of the current features
+        add_features(ev_merged.assign(**{col: ev_merged[col] * rng.uniform(0.9, 1.1) for col in numeric}), date, store_dir)
+    results = {'features/load': measure(lambda: FeatureStore.load(store_dir))}
+
+    store = FeatureStore.load(store_dir)
+    table = pd.concat([store.frame(as_of=date).assign(as_of_date=date) for date in store.as_of_dates]).reset_index()
+    columns = ['median_household_income', 'margin_error', 'dem_votes', 'rep_votes', 'charger_density'] # Prediction model inputs
+    keys = list(zip(rng.choice(store.districts[dates[-1]], lookups), rng.choice(dates, lookups)))
+    def scan():
+        for district, date in keys:
+            table.loc[(table['legislative_district'] == district) & (table['as_of_date'] == date), columns].to_numpy()
+    results[f'features/vector_x{lookups}'] = measure(lambda: [store.vector(district, columns, date) for district, date in keys], repeat=5)
+    results[f'features/vector_scan_x{lookups}'] = measure(scan, repeat=1)
+    results['features/statistics'] = measure(lambda: store.statistics(), repeat=20)
+    labels = pd.DataFrame({'legislative_district': np.repeat(store.districts[dates[-1]], months),
+                           'date': np.tile(dates + pd.Timedelta(days=14), len(store.districts[dates[-1]]))})
+    results[f'features/training_frame@{len(labels)}'] = measure(lambda: store.training_frame(labels, columns))
+    return results
+
+def bench_timeseries(ev, tmp_dir, years=10):
+    """Append monthly snapshots for the given years, build the query cube, then time the window queries"""
+    store_dir = os.path.join(tmp_dir, 'ev_snapshots')
+    history = list(make_snapshot_history(aggregate_snapshot(ev), years=years))
+    start = time.perf_counter()
+    for date, snapshot in history:
+        append_snapshot(snapshot, date, store_dir)
+    results = {'timeseries/append_snapshot': {'seconds': (time.perf_counter() - start) / len(history)}}
+    results['timeseries/load'] = measure(lambda: SnapshotCube(load_store(store_dir)))
+
+    cube = SnapshotCube(load_store(store_dir))
+    districts, makes, ev_types = list(cube.districts[:2]), [cube.makes[0]], [cube.ev_types[0]]
+    queries = {
+        'timeseries/query/series': lambda: cube.series(),
+        'timeseries/query/series_filtered': lambda: cube.series(districts, makes=makes, ev_types=ev_types),
+        'timeseries/query/statewide_total': lambda: cube.series(by_district=False),
+        'timeseries/query/rolling_mean': lambda: rolling_mean(cube.series(), 3),
+        'timeseries/query/year_over_year': lambda: year_over_year(cube.series()),
+        'timeseries/query/growth_rate': lambda: growth_rate(cube.series(), 3),
+    }
+    results.update({name: measure(query, repeat=20) for name, query in queries.items()})
+    return results
+
+def bench_forecast(ev, scale):
+    """Adoption curve fits for every district (history aggregation included)"""
+    return measure(lambda: forecast_districts(ev), repeat=1 if scale >= 100 else 3)
+
+def bench_states(ev_state):
+    """State ranking tables for the 51 states over 10 years and for 3,000 regions over 30 years, plus one lookup"""
+    results = {}
+    for label, history in (('51x10', make_state_history(ev_state, years=10)),
+                           ('3000x30', make_state_history(ev_state, years=30, regions=3000))):
+        results[f'states/build@{label}'] = measure(lambda: StateAnalytics(ev_state, history))
+    analytics = StateAnalytics(ev_state, history)
+    results['states/ranking@3000x30'] = measure(lambda: analytics.ranking('per_1000_residents', 2010), repeat=20)
+    return results
+
+def bench_correlations(ev_merged):
+    """One batched pass over 49 district subsets (all numeric columns), a cold matrix and a memoized lookup"""
+    service = CorrelationService(ev_merged)
+    districts = service.districts.tolist()
+    subsets = [districts[:i] + districts[i + 1:] for i in range(len(districts))] # Leave-one-district-out
+    results = {f'correlation/batch49/{method}': measure(lambda: service.matrices(subsets, method), repeat=5)
+               for method in ('Pearson', 'Spearman', 'Partial')}
+    def cold():
+        service._matrices.cache_clear()
+        service.matrix('Spearman', districts=districts[:20], columns=KEY_FEATURES)
+    results['correlation/matrix'] = measure(cold, repeat=20)
+    results['correlation/matrix_memoized'] = measure(lambda: service.matrix('Spearman', districts=districts[:20], columns=KEY_FEATURES), repeat=20)
+    return results
+
+def bench_goal_seek(ev_merged):
+    """Goal seeking for all districts: prediction curves over every split interval (cold), then solving a target (memoized curves)"""
+    artifact = load_pickle(data_path('final_model.pkl'))
+    model, scaler, features = artifact['model'], artifact['scaler'], artifact['selected_features']
+    target = float(ev_merged['ev_count'].quantile(0.75))
+    cold = lambda: [GoalSeeker(model, scaler, features, ev_merged).solve(feature, target) for feature in GOAL_FEATURES]
+    seeker = GoalSeeker(model, scaler, features, ev_merged)
+    seeker.solve('charger_density', target) # Memoize the curve
+    return {
+        'goal_seek/curves': measure(cold, repeat=5),
+        'goal_seek/solve': measure(lambda: seeker.solve('charger_density', target), repeat=20)
+    }
+
+def bench_batch_shap(ev_merged):
+    """Batch TreeSHAP: cell-table build, all districts, a 100k-row scenario file, and shap.Explainer per row for reference"""
+    import shap
+    artifact = load_pickle(data_path('final_model.pkl'))
+    model, scaler, features = artifact['model'], artifact['scaler'], artifact['selected_features']
+    version = data_version('final_model.pkl')
+    engine = load_engine(model, version)
+    districts = scaler.transform(ev_merged[features])
+    rng = np.random.default_rng(0)
+    scenarios = districts[rng.integers(0, len(districts), SCENARIO_ROWS)] + rng.normal(0, 0.25, (SCENARIO_ROWS, len(features)))
+
+    # Outputs must match shap.Explainer (checked on the districts and a sample of scenarios)
+    explainer = shap.Explainer(model, feature_names=features)
+    sample = np.concatenate([districts, scenarios[:2000]])
+    difference = np.abs(engine.explain(sample) - explainer(sample).values).max()
+    if difference > SHAP_TOLERANCE:
+        raise RuntimeError(f'Batch SHAP differs from shap.Explainer by {difference:g}')
+    return {
+        'batch_shap/build': measure(lambda: BatchTreeShap.build(model), repeat=3),
+        'batch_shap/districts': measure(lambda: engine.explain(districts), repeat=20),
+        f'batch_shap/scenarios@{SCENARIO_ROWS // 1000}k': measure(lambda: shap_values(scenarios, model, version), repeat=3),
+        'batch_shap/shap_explainer@2k': measure(lambda: explainer(scenarios[:2000]), repeat=1) # Reference: shap, row by row
+    }
+
+def bench_surrogate(ev_merged):
+    """Compact surrogate: compression against the validation inputs, then the prediction path with it (compare prediction/*)"""
+    import shap
+    artifact = load_pickle(data_path('final_model.pkl'))
+    model, scaler, features = artifact['model'], artifact['scaler'], artifact['selected_features']
+    inputs = scaler.transform(validation_inputs(ev_merged, features))
+    compact, report = compact_model(model, inputs, DEFAULT_TOLERANCE)
+    if report['max_deviation'] > DEFAULT_TOLERANCE:
+        raise RuntimeError(f"Compact model deviates by {report['max_deviation']:g}")
+    row = ev_merged[features].mean().to_frame().T
+    scaled = scaler.transform(row)
+    return {
+        'surrogate/build': measure(lambda: compact_model(model, inputs, DEFAULT_TOLERANCE), repeat=3),
+        'surrogate/predict': measure(lambda: compact.predict(scaler.transform(row)), repeat=20),
+        'surrogate/shap': measure(lambda: shap.Explainer(compact, feature_names=features)(scaled), repeat=5)
+    }
+
+def session_state_for(ev, ev_merged, ev_state, charger, ev_query):
+    """Session state the main page would have prepared for this EV table"""
+    coverage = compute_charger_coverage(ev, charger)
+    return {
+        'ev': ev,
+        'ev_merged': ev_merged,
+        'ev_state': ev_state,
+        'state_analytics': StateAnalytics(ev_state),
+        'correlations': CorrelationService(ev_merged),
+        'ev_coverage': coverage,
+        'coverage_by_district': summarize_coverage(ev, coverage, by='legislative_district'),
+        'coverage_by_tract': summarize_coverage(ev, coverage, by='2020_census_tract'),
+        'ev_rollup': Rollup(ev),
+        'density_tiles': DensityTiles.build(ev, charger),
+        'district_geometry': load_geometry(), # None (map skipped) without the district GeoJSON
+        'ev_query': ev_query,
+        'data_loaded': True
+    }
+
+def run_page(page, state, timeout=600):
+    """Run one page headlessly with Streamlit's AppTest"""
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(page, default_timeout=timeout)
+    for key, value in state.items():
+        app.session_state[key] = value
+    app.run()
+    if app.exception:
+        raise RuntimeError(f'{page} raised: {app.exception[0].message}')
+    return app
+
+def bench_page(page, state, prefixes, repeat=3):
+    """Whole-page render time plus per-chart/per-stage times and chart payload sizes taken from the telemetry histograms"""
+    run_page(page, state) # Warm-up (imports, Streamlit caches)
+    telemetry.reset()
+    result = measure(lambda: run_page(page, state), repeat=repeat)
+    histograms = telemetry.snapshot()['histograms']
+    stages = {name: {'seconds': summary['p50'] / 1000} for name, summary in histograms.items() if name.startswith(prefixes)}
+    # Payload sizes from one extra run (measuring them serializes every chart again, so the timed runs leave it off)
+    telemetry.PAYLOADS = True
+    try:
+        run_page(page, state)
+    finally:
+        telemetry.PAYLOADS = False
+    histograms = telemetry.snapshot()['histograms']
+    payloads = {name: {'bytes': summary['max']} for name, summary in histograms.items() if name.startswith('payload/')}
+    return result, {**stages, **payloads}
+
+def bench_prediction_direct(ev_merged):
+    """Prediction path called directly: scale + predict, SHAP values and force-plot data"""
+    import shap
+    artifact = load_pickle(data_path('final_model.pkl'))
+    model, scaler, features = artifact['model'], artifact['scaler'], artifact['selected_features']
+    row = ev_merged[features].mean().to_frame().T
+    scaled = scaler.transform(row)
+
+    explainer = shap.Explainer(model, feature_names=features)
+    shap_values = explainer(scaled)
+    return {
+        'prediction/predict': measure(lambda: model.predict(scaler.transform(row)), repeat=20),
+        'prediction/shap': measure(lambda: shap.Explainer(model, feature_names=features)(scaled), repeat=5),
+        'prediction/force_plot_html': measure(
+            lambda: json.dumps(shap.force_plot(explainer.expected_value, shap_values.values[0], feature_names=features).data),
+            repeat=5
+        )
+    }
+
+class Superseded(Exception):
+    """A newer slider value arrived while the run was in flight"""
+
+def replay_drag(stages, coalesce_runs, values=DRAG_VALUES, interval=DRAG_INTERVAL_SECONDS):
+    """Replay one slider drag against the prediction stages; returns per-value latency (s), completed and dropped runs
+    Without coalescing every value is computed in arrival order. With coalescing a run stops at the next stage
+    boundary once a newer value has arrived, and the next run jumps to the latest value (Streamlit's rerun model).
+    A value's latency runs from its arrival until a run for it, or for a newer value, has finished."""
+    arrivals = []
+    arrived = threading.Condition()
+
+    def drag():
+        for _ in range(values):
+            with arrived:
+                arrivals.append(time.perf_counter())
+                arrived.notify()
+            time.sleep(interval)
+
+    tracker = RunTracker({}, 'benchmark/drag')
+    shown = np.zeros(values)
+    done = -1 # Last value covered by a finished run
+    producer = threading.Thread(target=drag)
+    producer.start()
+    while done < values - 1:
+        with arrived:
+            arrived.wait_for(lambda: len(arrivals) > done + 1)
+            target = len(arrivals) - 1 if coalesce_runs else done + 1
+        tracker.begin()
+        try:
+            for i, stage in enumerate(stages):
+                if i and coalesce_runs and len(arrivals) - 1 > target:
+                    raise Superseded
+                stage(target / (values - 1))
+        except Superseded:
+            continue
+        tracker.finish()
+        shown[done + 1:target + 1] = time.perf_counter()
+        done = target
+    producer.join()
+    return shown - np.array(arrivals), tracker.state['completed'], tracker.state['dropped']
+
+def bench_slider_drag(ev_merged, render_seconds):
+    """Latency of a rapid slider drag on the prediction page, computing every value vs. only the latest one
+    Stages are the real prediction steps plus the rest of the page render (render_seconds, from the page benchmark)."""
+    import shap
+    artifact = load_pickle(data_path('final_model.pkl'))
+    model, scaler, features = artifact['model'], artifact['scaler'], artifact['selected_features']
+    explainer = shap.Explainer(model, feature_names=features)
+    low, high = ev_merged['median_household_income'].min(), ev_merged['median_household_income'].max()
+    row = ev_merged[features].mean().to_frame().T
+    run = {}
+
+    def predict(position):
+        run['scaled'] = scaler.transform(row.assign(median_household_income=low + position * (high - low)))
+        model.predict(run['scaled'])
+
+    def explain(position):
+        run['shap_values'] = explainer(run['scaled'])
+
+    def force_plot(position):
+        json.dumps(shap.force_plot(explainer.expected_value, run['shap_values'].values[0], feature_names=features).data)
+
+    render_step = lambda position: time.sleep(render_seconds / DRAG_RENDER_STEPS)
+    stages = [predict, explain, force_plot] + [render_step] * DRAG_RENDER_STEPS
+    results = {}
+    for mode, coalesce_runs in (('every_value', False), ('coalesced', True)):
+        latency, completed, dropped = replay_drag(stages, coalesce_runs)
+        for q in (50, 99):
+            results[f'prediction/drag/{mode}/p{q}'] = {'seconds': float(np.percentile(latency, q)), 'runs': completed, 'dropped': dropped}
+    return results
+
+# ================================== #
+# Baseline comparison
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Rows of (benchmark, metric, baseline, current, ratio, regressed)"""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            metric = next(iter(current))
+            rows.append((name, metric, None, current[metric], None, False))
+            continue
+        for metric, floor in (('seconds', NOISE_FLOOR_SECONDS), ('peak_mb', NOISE_FLOOR_MB), ('bytes', NOISE_FLOOR_BYTES)):
+            if metric not in previous or metric not in current:
+                continue
+            ratio = current[metric] / previous[metric] if previous[metric] else float('inf')
+            regressed = ratio > 1 + tolerance and current[metric] - previous[metric] > floor
+            rows.append((name, metric, previous[metric], current[metric], ratio, regressed))
+    return rows
+
+def check_payload_growth(results, limit=PAYLOAD_GROWTH_LIMIT):
+    """Rows comparing each chart's payload at the largest scale with the smallest (bounded regardless of the baseline)"""
+    by_chart = {}
+    for name, current in results.items():
+        page, _, chart = name.partition('/payload/')
+        if chart and '@' in page:
+            scale = float(page.rsplit('@', 1)[1].rstrip('x'))
+            by_chart.setdefault(f'{page.rsplit("@", 1)[0]}/payload/{chart}', {})[scale] = current['bytes']
+    rows = []
+    for chart, sizes in sorted(by_chart.items()):
+        if len(sizes) < 2:
+            continue
+        smallest, largest = sizes[min(sizes)], sizes[max(sizes)]
+        ratio = largest / smallest if smallest else float('inf')
+        regressed = ratio > limit and largest - smallest > NOISE_FLOOR_BYTES
+        rows.append((f'{chart} ({min(sizes):g}x -> {max(sizes):g}x)', 'growth', smallest, largest, ratio, regressed))
+    return rows
+
+def check_query_budget(results, budget=QUERY_BUDGET_SECONDS):
+    """Rows checking each time-series query against the absolute latency budget"""
+    return [
+        (name, 'budget', budget, current['seconds'], current['seconds'] / budget, current['seconds'] > budget)
+        for name, current in results.items() if name.startswith('timeseries/query/')
+    ]
+
+def print_comparison(rows):
+    """Human-readable comparison table"""
+    print(f"\n{'benchmark':<52} {'metric':<8} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, metric, previous, current, ratio, regressed in rows:
+        previous_text = f'{previous:10.4f}' if previous is not None else f"{'(new)':>10}"
+        ratio_text = f'{ratio:7.2f}' if ratio is not None else f"{'':>7}"
+        print(f"{name:<52} {metric:<8} {previous_text} {current:10.4f} {ratio_text}{'  REGRESSION' if regressed else ''}")
+
+# ================================== #
+# Entry point
+
+def run(scales, include_pages=True):
+    """Run every benchmark and return {name: {'seconds', 'min_seconds', 'peak_mb'}} ({'bytes'} for chart payloads)"""
+    results = {}
+    ev_merged = load_pickle(data_path('ev_merged.pickle'))
+    ev_state = load_pickle(data_path('ev_state.pickle'))
+    charger = load_pickle(data_path('charger.pickle'))
+    base_ev = load_real_ev() # Resample the real table when it is available, otherwise synthesize
+
+    print('Benchmarking import cost and artifact loading...')
+    results['import/app_dependencies'] = bench_import_cost()
+    results['load/artifacts'] = bench_load_artifacts()
+
+    print('Benchmarking cross-state rankings...')
+    results.update(bench_states(ev_state))
+
+    print('Benchmarking feature correlations...')
+    results.update(bench_correlations(ev_merged))
+
+    print('Benchmarking the deploy-time chart warm-up...')
+    results['warmup/district_charts'] = measure(warm_up, repeat=1)
+
+    print('Benchmarking the prediction path...')
+    results.update(bench_prediction_direct(ev_merged))
+    results.update(bench_goal_seek(ev_merged))
+    results.update(bench_batch_shap(ev_merged))
+    results.update(bench_surrogate(ev_merged))
+    results[f'sensitivity/sobol@{DEFAULT_SAMPLES}'] = measure(lambda: sobol_analysis(ev_merged, DEFAULT_SAMPLES, workers=1), repeat=1)
+    if include_pages:
+        ev = make_ev_table(1, base=base_ev)
+        forecast, forecast_curves, adoption_history = forecast_districts(ev)
+        state = {'ev_merged': ev_merged, 'ev_state': ev_state, 'ev': ev, 'feature_store': FeatureStore.from_frame(ev_merged), 'district_forecast': forecast,
+                 'forecast_curves': forecast_curves, 'adoption_history': adoption_history, 'data_loaded': True}
+        results['page/EV Prediction'], stages = bench_page('pages/2_EV_Prediction.py', state, ('prediction/', 'batch_shap/', 'sensitivity/', 'goal_seek/', 'forecast/'), repeat=5)
+        results.update({f'page/EV Prediction/{name}': stage for name, stage in stages.items()})
+        render_seconds = results['page/EV Prediction']['seconds'] - stages['prediction/compute']['seconds'] # Page outside the prediction stages
+        print('Benchmarking a rapid slider drag on the prediction page...')
+        results.update(bench_slider_drag(ev_merged, max(render_seconds, 0.0)))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print('Benchmarking the time-series store (10 years of monthly snapshots)...')
+        results.update(bench_timeseries(make_ev_table(1, base=base_ev), tmp_dir))
+        print('Benchmarking the feature store (10 years of monthly feature sets)...')
+        results.update(bench_feature_store(ev_merged, tmp_dir))
+        print('Benchmarking district geometry...')
+        results.update(bench_geometry(tmp_dir))
+
+        for scale in scales:
+            print(f'Benchmarking the {scale}x EV table...')
+            ev = make_ev_table(scale, base=base_ev)
+            results[f'load/ev@{scale}x'] = bench_load_ev(ev, tmp_dir, scale)
+            results[f'coverage/compute@{scale}x'] = bench_coverage(ev, charger, scale)
+            results[f'forecast/fit@{scale}x'] = bench_forecast(ev, scale)
+            results.update(bench_vehicle_index(ev, scale))
+            results.update(bench_rollup(ev, scale))
+            results.update(bench_tiles(ev, charger, scale))
+            query_results, ev_query = bench_query(ev, tmp_dir, scale)
+            results.update(query_results)
+            if include_pages:
+                state = session_state_for(ev, ev_merged, ev_state, charger, ev_query)
+                repeat = 1 if scale >= 100 else 3
+                results[f'page/EV Analysis@{scale}x'], stages = bench_page('pages/1_EV_Analysis.py', state, ('render_chart/', 'section/'), repeat=repeat)
+                results.update({f'page/EV Analysis@{scale}x/{name}': stage for name, stage in stages.items()})
+            del ev
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark suite and compare against the stored baseline')
+    parser.add_argument('--scales', type=float, nargs='+', default=DEFAULT_SCALES, help='EV table scales (1 = current size)')
+    parser.add_argument('--skip-pages', action='store_true', help='Skip the AppTest page renders')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Write this run to the baseline file')
+    parser.add_argument('--output', default=None, help='Also write the results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='Allowed relative regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on any regression')
+    args = parser.parse_args()
+
+    os.chdir(REPO_DIR) # Pages use paths relative to the repository root
+    scales = [int(s) if float(s).is_integer() else s for s in args.scales]
+    results = run(scales, include_pages=not args.skip_pages)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    rows = compare(results, baseline, args.tolerance) + check_payload_growth(results) + check_query_budget(results)
+    print_comparison(rows)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {args.baseline}')
+
+    regressions = [row for row in rows if row[-1]]
+    print(f'\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}')
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils.data import data_path, load_pickle
+from utils.dtypes import compact_frame
+from utils.loader import EV_PARQUET, load_ev
+
+# ================================== #
+# EV registration tables at a given scale (1x = current registration count per district)
+
+WA_COUNTIES = [
+    'Adams', 'Asotin', 'Benton', 'Chelan', 'Clallam', 'Clark', 'Columbia', 'Cowlitz', 'Douglas', 'Ferry',
+    'Franklin', 'Garfield', 'Grant', 'Grays Harbor', 'Island', 'Jefferson', 'King', 'Kitsap', 'Kittitas',
+    'Klickitat', 'Lewis', 'Lincoln', 'Mason', 'Okanogan', 'Pacific', 'Pend Oreille', 'Pierce', 'San Juan',
+    'Skagit', 'Skamania', 'Snohomish', 'Spokane', 'Stevens', 'Thurston', 'Wahkiakum', 'Walla Walla',
+    'Whatcom', 'Whitman', 'Yakima'
+]
+# Approximate market shares of the largest manufacturers
+MAKE_SHARES = {
+    'TESLA': 0.43, 'CHEVROLET': 0.07, 'NISSAN': 0.07, 'FORD': 0.05, 'KIA': 0.05, 'BMW': 0.04, 'TOYOTA': 0.04,
+    'HYUNDAI': 0.03, 'RIVIAN': 0.03, 'VOLKSWAGEN': 0.03, 'JEEP': 0.025, 'VOLVO': 0.025, 'AUDI': 0.02,
+    'CHRYSLER': 0.015, 'MERCEDES-BENZ': 0.015, 'POLESTAR': 0.01, 'PORSCHE': 0.01, 'MINI': 0.01, 'GMC': 0.01
+}
+EV_TYPES = ['Battery Electric Vehicle (BEV)', 'Plug-in Hybrid Electric Vehicle (PHEV)']
+CAFV_VALUES = [
+    'Clean Alternative Fuel Vehicle Eligible',
+    'Eligibility unknown as battery range has not been researched',
+    'Not eligible due to low battery range'
+]
+UTILITIES = [
+    'BONNEVILLE POWER ADMINISTRATION||PUGET SOUND ENERGY INC||CITY OF TACOMA - (WA)',
+    'CITY OF SEATTLE - (WA)|CITY OF TACOMA - (WA)',
+    'PACIFICORP',
+    'PUGET SOUND ENERGY INC',
+    'PUGET SOUND ENERGY INC||CITY OF TACOMA - (WA)',
+    'Other'
+]
+MODELS_PER_MAKE = 5
+N_VIN_PREFIXES = 11_000 # Distinct 10-character VIN prefixes in the real export
+N_LOCATIONS = 900 # Distinct vehicle locations (postal code centroids)
+N_CITIES = 500
+TRACTS_PER_LOCATION = 2
+
+def make_synthetic_ev(scale=1.0, seed=777):
+    """Synthetic EV table with the cleaned, compact schema and district totals of ev_merged x scale"""
+    rng = np.random.default_rng(seed)
+    ev_merged = load_pickle(data_path('ev_merged.pickle'))
+    district_counts = np.round(ev_merged['ev_count'].to_numpy() * scale).astype(np.int64)
+    n = int(district_counts.sum())
+
+    def categorical(codes, categories):
+        return pd.Categorical.from_codes(codes.astype(np.int32), categories=categories)
+
+    # Districts keep their exact totals; rows are shuffled so they are not grouped
+    districts = pd.Index(sorted(ev_merged['legislative_district'], key=int))
+    district_codes = rng.permutation(np.repeat(districts.get_indexer(ev_merged['legislative_district']), district_counts))
+
+    # A vehicle location determines postal code, city, county and a small set of census tracts
+    lon = rng.uniform(-124.5, -117.1, N_LOCATIONS).round(5)
+    lat = rng.uniform(45.6, 49.0, N_LOCATIONS).round(5)
+    location_codes = rng.integers(0, N_LOCATIONS, n)
+    location_city = rng.integers(0, N_CITIES, N_LOCATIONS)
+    location_county = rng.integers(0, len(WA_COUNTIES), N_LOCATIONS)
+    tract_codes = location_codes * TRACTS_PER_LOCATION + rng.integers(0, TRACTS_PER_LOCATION, n)
+
+    # Make and model
+    makes = list(MAKE_SHARES)
+    shares = np.array(list(MAKE_SHARES.values()))
+    make_codes = rng.choice(len(makes), size=n, p=shares / shares.sum())
+    model_codes = make_codes * MODELS_PER_MAKE + rng.integers(0, MODELS_PER_MAKE, n)
+
+    # Model year skewed towards recent years; older BEVs carry a researched range, most MSRPs are 0
+    model_year = (2025 - np.minimum(rng.geometric(0.22, n) - 1, 25)).astype(np.int16)
+    ev_type_codes = (rng.random(n) >= 0.78).astype(np.int32) # 0 = BEV, 1 = PHEV
+    electric_range = np.where(model_year < 2021, rng.choice([25, 84, 150, 238, 291, 322], n), 0)
+    base_msrp = np.where(rng.random(n) < 0.02, rng.choice([31950, 59900, 69900, 110950], n), 0)
+
+    vin_prefixes = np.array(list('0123456789ABCDEFGHJKLMNPRSTUVWXYZ'))[rng.integers(0, 33, (N_VIN_PREFIXES, 10))]
+    vin_prefixes = pd.Index(vin_prefixes.view('<U10').ravel()).unique()
+
+    return pd.DataFrame({
+        'vin': categorical(rng.integers(0, len(vin_prefixes), n), vin_prefixes),
+        'county': categorical(location_county[location_codes], pd.Index(WA_COUNTIES)),
+        'city': categorical(location_city[location_codes], pd.Index([f'CITY {i:03d}' for i in range(N_CITIES)])),
+        'state': categorical(np.zeros(n), pd.Index(['WA'])),
+        'postal_code': categorical(location_codes, pd.Index((98001 + np.arange(N_LOCATIONS)).astype(str))),
+        'model_year': model_year,
+        'make': categorical(make_codes, pd.Index(makes)),
+        'model': categorical(model_codes, pd.Index([f'{make} MODEL {i}' for make in makes for i in range(MODELS_PER_MAKE)])),
+        'ev_type': categorical(ev_type_codes, pd.Index(EV_TYPES)),
+        'cafv_eligibility': categorical(rng.integers(0, len(CAFV_VALUES), n), pd.Index(CAFV_VALUES)),
+        'electric_range': pd.array(electric_range, dtype='Int16'),
+        'base_msrp': pd.array(base_msrp, dtype='Int32'),
+        'legislative_district': categorical(district_codes, districts),
+        'dol_vehicle_id': pd.array(rng.permutation(n) + 100_000_000, dtype='Int64'),
+        'vehicle_location': categorical(location_codes, pd.Index([f'POINT ({x} {y})' for x, y in zip(lon, lat)])),
+        'electric_utility': categorical(rng.integers(0, len(UTILITIES), n), pd.Index(UTILITIES)),
+        '2020_census_tract': categorical(tract_codes, pd.Index([f'53033{i:06d}' for i in range(N_LOCATIONS * TRACTS_PER_LOCATION)]))
+    })
+
+def load_real_ev():
+    """The real EV table (columnar store or pickle), compacted like the main page does; None if absent"""
+    if os.path.exists(data_path(EV_PARQUET)):
+        ev = load_ev()
+    elif os.path.exists(data_path('ev.pickle')):
+        ev = load_pickle(data_path('ev.pickle'))
+    else:
+        return None
+    return compact_frame(ev)[0]
+
+def make_ev_table(scale=1.0, seed=777, base=None):
+    """EV table at the given scale: resampled real rows when available, synthetic rows otherwise"""
+    if base is None:
+        return make_synthetic_ev(scale, seed)
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(base), int(round(len(base) * scale))) if scale != 1 else np.arange(len(base))
+    ev = base.iloc[rows].reset_index(drop=True)
+    ev['dol_vehicle_id'] = pd.array(np.arange(len(ev)) + 100_000_000, dtype='Int64') # Keep vehicle ids unique
+    return ev
+
+# ================================== #
+# Monthly registration snapshots (time-series store)
+
+def make_snapshot_history(counts, end='2024-10-01', years=10, seed=777):
+    """Monthly snapshots (date, counts) ending with the given counts; each district follows its own S-curve"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end, periods=years * 12, freq='MS')
+    t = np.arange(len(dates))[:, None]
+
+    # Logistic adoption per district (steepness and midpoint vary), scaled so the last month matches counts
+    districts = counts['legislative_district'].astype(str)
+    codes, uniques = pd.factorize(districts)
+    steepness = rng.uniform(0.03, 0.08, len(uniques))[codes]
+    midpoint = rng.uniform(0.6, 1.1, len(uniques))[codes] * len(dates)
+    curve = 1 / (1 + np.exp(-steepness * (t - midpoint)))
+    share = curve / curve[-1]
+    noise = rng.normal(1.0, 0.02, share.shape)
+    history = np.rint(counts['ev_count'].to_numpy() * share * noise).clip(0).astype(np.int64)
+
+    for i, date in enumerate(dates):
+        snapshot = counts.assign(ev_count=history[i])
+        yield date, snapshot[snapshot['ev_count'] > 0]
+
+# ================================== #
+# Multi-year state metrics (cross-state rankings)
+
+def make_state_history(ev_state, years=10, regions=None, end_year=2023, seed=777):
+    """Yearly registration counts and population per state (or per synthetic region when regions is given)"""
+    rng = np.random.default_rng(seed)
+    if regions is None:
+        names, latest = ev_state['state'].to_numpy(), ev_state['registration_count'].to_numpy(float)
+    else:
+        names = np.array([f'Region {i}' for i in range(regions)])
+        latest = rng.choice(ev_state['registration_count'].to_numpy(float), regions)
+    # Counts grow 20-50% a year back from the latest year; population is flat with small drift
+    growth = rng.uniform(1.2, 1.5, len(names))
+    year_list = np.arange(end_year - years + 1, end_year + 1)
+    counts = latest[:, None] / growth[:, None] ** (end_year - year_list)[None, :]
+    population = rng.uniform(5e5, 4e7, len(names))[:, None] * rng.normal(1.0, 0.01, (len(names), years))
+    return pd.DataFrame({
+        'state': np.repeat(names, years),
+        'year': np.tile(year_list, len(names)),
+        'registration_count': np.rint(counts).ravel(),
+        'population': np.rint(population).ravel()
+    })
+
+# ================================== #
+# Legislative district boundaries (GeoJSON), when data_processed has none
+
+def make_district_geojson(path, grid=7, points_per_edge=3000, seed=777):
+    """grid x grid districts over Washington's bounding box, with jagged high-resolution shared edges"""
+    rng = np.random.default_rng(seed)
+    corners = np.stack(np.meshgrid(np.linspace(-124.7, -116.9, grid + 1), np.linspace(45.5, 49.0, grid + 1), indexing='ij'), -1)
+    corners[1:-1, 1:-1] += rng.normal(0, 0.08, corners[1:-1, 1:-1].shape)
+    edges = {}
+
+    def edge(a, b):
+        """Points from corner a to corner b (each edge is generated once and shared by its two districts)"""
+        if (b, a) in edges:
+            return edges[(b, a)][::-1]
+        if (a, b) not in edges:
+            start, end = corners[a], corners[b]
+            walk = np.cumsum(rng.normal(0, 0.0008, points_per_edge))
+            walk -= np.linspace(walk[0], walk[-1], points_per_edge) # Pinned to both corners
+            normal = np.array([start[1] - end[1], end[0] - start[0]]) / np.hypot(*(end - start))
+            edges[(a, b)] = start + np.linspace(0, 1, points_per_edge)[:, None] * (end - start) + walk[:, None] * normal
+        return edges[(a, b)]
+
+    features = []
+    for i in range(grid):
+        for j in range(grid):
+            square = [(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1)]
+            ring = np.vstack([edge(square[k], square[(k + 1) % 4])[:-1] for k in range(4)] + [corners[square[0]][None]])
+            features.append({'type': 'Feature', 'properties': {'DISTRICTN': f'{len(features) + 1:02d}'},
+                             'geometry': {'type': 'Polygon', 'coordinates': [ring.tolist()]}})
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+    return path
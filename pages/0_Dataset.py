@@ -21,8 +21,15 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
+import re
+
+import numpy as np
 import streamlit as st
 
+from utils import telemetry
+from utils.data import data_version
+from utils.vehicle_index import MAX_VEHICLE_ID
+
 # ================================== #
 # Global setting
 
@@ -54,9 +61,11 @@ st.markdown("""
     }
     </style>
 """, unsafe_allow_html=True)
+telemetry.hide_diagnostics_link() # Diagnostics stays reachable by URL only
 
 highlight_color = '#0068C9'
 unhighlight_color = 'lightgray'
+MAX_LOOKUP_ROWS = 1000 # Rows shown for a lookup (the count covers all matches)
 
 # ================================== #
 # Title and introduction
@@ -124,6 +133,57 @@ st.markdown("""
 For a complete list of features, refer to the README document on the [GitHub page](https://github.com/eodud0582/Washington_State_Electric_Vehicle_Adoption_Analysis).
 """)
 
+# Memory footprint of the EV registration table (recorded by the dtype normalization on the main page)
+if 'ev_memory_report' in st.session_state:
+    with st.expander("In-Memory Data Footprint (EV Registration Table)"):
+        st.markdown("Text columns are stored as categoricals and numeric columns with the narrowest dtypes when the data is loaded.")
+        st.dataframe(st.session_state['ev_memory_report'].style.format(precision=2), hide_index=True)
+
+# ================================== #
+# Vehicle lookup (VIN prefix and DOL vehicle ID index, built on the main page)
+if st.session_state.get('vehicle_index') is not None:
+    ev = st.session_state['ev']
+    vehicle_index = st.session_state['vehicle_index']
+
+    st.header("4. Vehicle Lookup")
+    st.markdown("""
+Find registrations by VIN (the first 10 characters published in the dataset, or any leading part of them, such as a manufacturer code) or by DOL vehicle ID.
+Both are answered from an index built once when the data is loaded, instead of scanning every registration.
+""")
+    col1, col2 = st.columns(2)
+    with col1:
+        vin_query = st.text_input("VIN or VIN prefix", key='lookup_vin', placeholder="e.g. 5YJ3E1EB")
+    with col2:
+        id_query = st.text_input("DOL vehicle ID(s)", key='lookup_id', placeholder="e.g. 170173, 152717")
+
+    if vin_query.strip() or id_query.strip():
+        with telemetry.timer('vehicle_index/lookup'):
+            rows = vehicle_index.vin_rows_for(vin_query) if vin_query.strip() else None
+            if id_query.strip():
+                ids = [int(i) for i in re.findall(r'\d+', id_query)]
+                out_of_range = [i for i in ids if i > MAX_VEHICLE_ID] # Too long to be a vehicle ID: no match, not an error
+                id_rows = vehicle_index.id_rows_for([i for i in ids if i <= MAX_VEHICLE_ID])
+                rows = id_rows if rows is None else np.intersect1d(rows, id_rows) # Both given: rows matching both
+            rows = np.sort(rows)
+        shown = f" (first {MAX_LOOKUP_ROWS:,} shown)" if len(rows) > MAX_LOOKUP_ROWS else ""
+        if id_query.strip() and out_of_range:
+            st.caption(f"Ignored {len(out_of_range)} ID(s) too large to be a DOL vehicle ID: {', '.join(map(str, out_of_range[:5]))}")
+        st.caption(f"{len(rows):,} matching registrations{shown}")
+        st.dataframe(ev.iloc[rows[:MAX_LOOKUP_ROWS]], hide_index=True)
+
+    with st.expander("Duplicate Check (VIN and DOL Vehicle ID)"):
+        # Computed once per session and data version from the index groups (a reloaded table gets a new report)
+        version = data_version(st.session_state.get('ev_file', 'ev.pickle'))
+        if st.session_state.get('vehicle_duplicates', (None,))[0] != version:
+            st.session_state['vehicle_duplicates'] = (version, *vehicle_index.duplicate_report(ev))
+        _, duplicate_summary, duplicate_records = st.session_state['vehicle_duplicates']
+        st.markdown("The VIN field only holds the first 10 characters, so several vehicles of the same make, model and year can share it. "\
+                    "A DOL vehicle ID should appear once: a repeated ID with the same VIN is a repeated record, and with a different VIN a conflict.")
+        st.dataframe(duplicate_summary, hide_index=True)
+        if len(duplicate_records):
+            st.caption(f"Registrations with a repeated DOL vehicle ID ({len(duplicate_records):,} rows)")
+            st.dataframe(duplicate_records.sort_values('dol_vehicle_id').head(MAX_LOOKUP_ROWS), hide_index=True)
+
 # ================================== #
 # Add a sidebar for additional information or controls
 
@@ -134,6 +194,7 @@ st.sidebar.markdown("""
 - [1. Data Sources](#1-data-sources)
 - [2. Data Cleaning Process](#2-data-cleaning-process)
 - [3. Feature Engineering](#3-feature-engineering)
+- [4. Vehicle Lookup](#4-vehicle-lookup)
 """)
 
 # Sidebar for navigation guidance
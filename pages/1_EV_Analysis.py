@@ -22,15 +22,29 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import os
 import pandas as pd
 import numpy as np
 import pickle
-import statsmodels.api as sm
+import time
 
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 
+from utils import telemetry, district_charts
+from utils.components import COMPONENT_DIR, district_chart, save_figure
+from utils.warmup import figure_version, load_manifest, variant_key
+from utils.figures import plotly_chart
+from utils.timeseries import rolling_mean, year_over_year, growth_rate
+from utils.states import FOCUS_STATE, METRIC_LABELS
+from utils.correlation import KEY_FEATURES, METHODS
+from utils.rollup import LEVELS, LEVEL_LABELS
+from utils.tiles import BIN_PIXELS, MAX_ZOOM, MIN_ZOOM, OTHER_MAKES, TILE_PIXELS
+from utils.geometry import DEFAULT_DETAIL, DETAIL_KM, GEOMETRY_FILE, district_map
+
+page_start = time.perf_counter() # Whole-page render time (telemetry)
+
 # ================================== #
 # Global setting
 
@@ -62,9 +76,11 @@ st.markdown("""
     }
     </style>
 """, unsafe_allow_html=True)
+telemetry.hide_diagnostics_link() # Diagnostics stays reachable by URL only
 
 highlight_color = '#0068C9'
 unhighlight_color = 'lightgray'
+red_color = '#D32F2F'
 
 # ================================== #
 # Data preparation
@@ -95,6 +111,15 @@ if 'data_loaded' in st.session_state and st.session_state['data_loaded']:
     ev = st.session_state['ev']
     ev_merged = st.session_state['ev_merged']
     ev_state = st.session_state['ev_state']
+    coverage_by_district = st.session_state.get('coverage_by_district') # Precomputed on the main page
+    coverage_by_tract = st.session_state.get('coverage_by_tract')
+    ev_snapshots = st.session_state.get('ev_snapshots') # Monthly counts across registration snapshots (may be None)
+    state_analytics = st.session_state.get('state_analytics') # Ranked state metrics by year (utils/states.py)
+    correlations = st.session_state.get('correlations') # Memoized correlation matrices of ev_merged (utils/correlation.py)
+    ev_rollup = st.session_state.get('ev_rollup') # State > district > county > city > tract counts (utils/rollup.py)
+    density_tiles = st.session_state.get('density_tiles') # Binned EV/charger locations per zoom level (utils/tiles.py)
+    district_geometry = st.session_state.get('district_geometry') # Simplified district polygons per detail level (utils/geometry.py)
+    ev_query = st.session_state['ev_query'] # Aggregations over the EV table: DuckDB or pandas backend (utils/query.py)
 else:
     st.warning("Data has not been loaded. Please load the data on the main page.")
     st.stop()
@@ -115,13 +140,11 @@ selected_districts = st.sidebar.multiselect(
     help="Select legislative district(s) of interest"
 )
 
-# Filter the data based on selected districts
+# Filter the data based on selected districts (EV table aggregations take the districts instead: see ev_query)
 try:
     if selected_districts:
-        ev_filtered = ev[ev['legislative_district'].isin(selected_districts)]
         ev_merged_filtered = ev_merged[ev_merged['legislative_district'].isin(selected_districts)]
     else:
-        ev_filtered = ev
         ev_merged_filtered = ev_merged
 except Exception as e:
     st.error(f"Error filtering data: {e}")
@@ -173,54 +196,85 @@ Washington State is a major player in the U.S. electric vehicle (EV) market, con
 ### 1. Overview of EV Adoption in Washington
 st.header("1. Overview of EV Adoption in Washington")
 
-def render_chart(chart_function, chart_title):
+def render_chart(chart_function, chart_title, *args):
     """Exceute visualization function and handle any error"""
     try:
         # st.subheader(chart_title)
-        chart_function(chart_title) # visualizatino function
+        with telemetry.timer(f'render_chart/{chart_function.__name__}'): # Per-chart timing (see Diagnostics page)
+            chart_function(chart_title, *args) # visualizatino function
     except Exception as e:
+        telemetry.count(f'render_chart_error/{chart_function.__name__}')
         st.error(f"Error in Chart '{chart_title}': {e}")
 
+# District charts (Sections 3-5) are built once per dataset version and restyled in the browser;
+# after a deploy-time warm-up (python -m utils.warmup) they are only looked up in its manifest
+chart_version = figure_version()
+
+@st.cache_data(show_spinner=False)
+def landing_figures(version):
+    """Precomputed figure URLs of this version ({} if the warm-up has not run)"""
+    return load_manifest(version)
+
+@st.cache_data(show_spinner=False)
+def district_figure(chart, version, *args):
+    """Static file URL of a district chart in its no-selection state (precomputed, or built on first use)"""
+    precomputed = landing_figures(version).get(variant_key(chart, args))
+    if precomputed and os.path.exists(os.path.join(COMPONENT_DIR, precomputed)):
+        return precomputed
+    return save_figure(district_charts.BUILDERS[chart](ev_merged, *args))
+
 ## 1.1) Electric Vehicle Population by State
-def viz_1_1(chart_title='Electric Vehicle Registrations by State'):
+def viz_1_1(chart_title='Electric Vehicle Registrations by State', metric='registration_count', year=None):
     
-    # Set colors, highlighting Washington state
-    ev_state['state_category'] = np.where(
-        ev_state['state'] == 'Washington',
-        'Washington', 
-        'Other'
-    )
+    # Ranked states for the chosen metric and year (precomputed on the main page)
+    ranking = state_analytics.ranking(metric, year)
     
     fig_state = px.bar(
-        ev_state, 
+        ranking, 
         x='state',
-        y='registration_count', 
+        y='value', 
         title=chart_title, 
-        color='state_category', # Use the color column to set the bar colors
-        color_discrete_map={'Other': unhighlight_color, 'Washington': highlight_color}, 
-        category_orders={'state': ev_state['state']} # Maintain the original order of 'state'
+        color=np.where(ranking['state'] == FOCUS_STATE, FOCUS_STATE, 'Other'), # Highlight Washington state
+        color_discrete_map={'Other': unhighlight_color, FOCUS_STATE: highlight_color}, 
+        custom_data=['rank', 'percentile']
     ) 
-    fig_state.update_xaxes(title='State')
-    fig_state.update_yaxes(title='Number of EVs')
+    fig_state.update_xaxes(title='State', categoryorder='array', categoryarray=ranking['state']) # Rank order
+    fig_state.update_yaxes(title=METRIC_LABELS.get(metric, metric), tickformat='.0%' if metric in ('share_of_us', 'growth_yoy') else None)
     fig_state.update_layout(showlegend=False)
-    fig_state.update_traces(hovertemplate='State: %{x}<br>EV Count: %{y}')
+    value_format = ':.1%' if metric in ('share_of_us', 'growth_yoy') else ':,.4~g' if metric == 'per_1000_residents' else ':,'
+    fig_state.update_traces(hovertemplate=f'State: %{{x}}<br>{METRIC_LABELS.get(metric, metric)}: %{{y{value_format}}}'\
+                                          '<br>Rank: %{customdata[0]}<br>Percentile: %{customdata[1]:.0%}<extra></extra>')
     
-    st.plotly_chart(fig_state)
+    plotly_chart(fig_state, 'viz_1_1')
 
-render_chart(viz_1_1, 'Electric Vehicle Registrations by State')
+if state_analytics is None:
+    st.info("State rankings are not available.")
+else:
+    # Year and metric selectors appear only when state_history.csv adds more than the 2023 counts
+    state_year, state_metric = state_analytics.latest_year, 'registration_count'
+    col1, col2 = st.columns(2)
+    if len(state_analytics.years) > 1:
+        with col1:
+            state_year = st.selectbox("Select Year", state_analytics.years[::-1], key='state_year')
+    state_metrics = state_analytics.metrics_for(state_year)
+    if len(state_metrics) > 1:
+        with col2:
+            state_metric = st.selectbox("Select State Metric", state_metrics, format_func=METRIC_LABELS.get, key='state_metric')
+    render_chart(viz_1_1, f'{METRIC_LABELS[state_metric]} by State ({state_year})', state_metric, state_year)
 
 ## 1.2) EV Type Distribution
 def viz_1_2(chart_title='EV Type Distribution'):
     
+    # Pre-aggregate: one slice per EV type instead of one label per registration
+    ev_type_counts = ev_query.counts('ev_type', selected_districts) # Counts for each ev_type within the districts
+    largest_ev_type = ev_type_counts.idxmax() # ev_type with the largest count
     # Set colors for each ev_type: largest gets '#0068C9', others get 'lightgray'
-    ev_type_counts = ev_filtered.groupby('ev_type').size() # Calculate the counts for each ev_type
-    largest_ev_type = ev_type_counts.idxmax() # Index of ev_type with the largest count
-    custom_colors = [highlight_color if ev_type == largest_ev_type else unhighlight_color for ev_type in ev_filtered['ev_type']]
+    custom_colors = [highlight_color if ev_type == largest_ev_type else unhighlight_color for ev_type in ev_type_counts.index]
     
     # Create the pie chart with the custom colors
     fig_ev_type = px.pie(
-        ev_filtered,
-        names='ev_type',
+        names=ev_type_counts.index,
+        values=ev_type_counts.values,
         title=chart_title
     )
     
@@ -230,19 +284,18 @@ def viz_1_2(chart_title='EV Type Distribution'):
         marker=dict(colors=custom_colors) # Apply colors
     )
 
-    st.plotly_chart(fig_ev_type)
+    plotly_chart(fig_ev_type, 'viz_1_2')
 
 ## 1.3) Top 10 EV Manufacturers: EV Count and Average Electric Range
 def viz_1_3(chart_title='Top 10 EV Manufacturers: EV Count and Average Electric Range'):
 
-    top_manufacturers = ev_filtered['make'].value_counts().nlargest(10) # EV counts by maker within the districts
+    top_manufacturers = ev_query.counts('make', selected_districts).head(10) # EV counts by maker within the districts
     top_manufacturers_names = top_manufacturers.index # Top maker name
     top_manufacturers_counts = top_manufacturers.values # Top makers' ev counts
     
     # Calculate average electric range for every manufacturer from the original data
     # - Will be fixed values despite districts selection
-    cond = (ev['electric_range'] != 0.0) & (ev['electric_range'].isna() == False) # Exclude 0 and null
-    avg_electric_range = ev[cond].groupby('make')['electric_range'].mean()
+    avg_electric_range = ev_query.nonzero_mean_by('make', 'electric_range') # Exclude 0 and null
     
     # Extract avg electric range of filtered top makers that have avg electric range value
     cond = top_manufacturers_names.isin(avg_electric_range.index) # Get the names of filtered top makers (currently within selected districts)
@@ -316,7 +369,7 @@ def viz_1_3(chart_title='Top 10 EV Manufacturers: EV Count and Average Electric
         )
     )
 
-    st.plotly_chart(fig_manufacturers)
+    plotly_chart(fig_manufacturers, 'viz_1_3')
 
 # Plot side by side (Streamlit columns)
 col1, col2 = st.columns(2)
@@ -329,6 +382,88 @@ Observations:
 - Tesla leads as the dominant manufacturer, highlighting the state's strong preference for high-performance, long-range electric vehicles.
 """)
 
+## 1.4) EV Registrations by County, City and Census Tract (from the precomputed rollup, no scan of the EV table)
+TOP_AREAS = 20 # Bars shown in the area chart
+ROLLUP_COLUMNS = {'ev_count': 'EV Count', 'bev_share': 'BEV Share', 'cafv_eligible_share': 'CAFV Eligible Share',
+                  'avg_electric_range': 'Avg. Electric Range'}
+ROLLUP_FORMAT = {'EV Count': '{:,.0f}', 'BEV Share': '{:.1%}', 'CAFV Eligible Share': '{:.1%}', 'Avg. Electric Range': '{:.0f}'}
+
+def viz_1_4(chart_title, level):
+    areas = ev_rollup.view(level, 'legislative_district', selected_districts).head(TOP_AREAS).reset_index()
+    areas[level] = areas[level].astype(str)
+
+    fig_areas = px.bar(
+        areas,
+        x=level,
+        y='ev_count',
+        title=chart_title,
+        labels={level: LEVEL_LABELS[level], 'ev_count': 'EV Count'},
+        custom_data=['bev_share', 'avg_electric_range']
+    )
+    fig_areas.update_traces(
+        marker_color=highlight_color,
+        hovertemplate=f'{LEVEL_LABELS[level]}: %{{x}}<br>EV Count: %{{y:,}}<br>BEV Share: %{{customdata[0]:.1%}}<br>'
+                      'Avg. Electric Range: %{customdata[1]:.0f} mi<extra></extra>'
+    )
+    fig_areas.update_xaxes(type='category', title=LEVEL_LABELS[level])
+    fig_areas.update_yaxes(title='EV Count')
+
+    plotly_chart(fig_areas, 'viz_1_4')
+
+@st.fragment
+def section_1_4():
+    """Section 1.4 area level and drill-down; re-executes alone when a dropdown changes"""
+    with telemetry.timer('section/1.4'):
+        level = st.selectbox("Select Area Level", LEVELS[2:], format_func=LEVEL_LABELS.get, key='rollup_level')
+        render_chart(viz_1_4, f'Top {TOP_AREAS} Areas by EV Count ({LEVEL_LABELS[level]})', level)
+
+        # Drill-down: each dropdown lists the children of the area chosen to its left
+        st.markdown("**Drill Down: State > Legislative District > County > City > Census Tract**")
+        path = ()
+        columns = st.columns(len(LEVELS) - 1)
+        for column, drill_level in zip(columns, LEVELS):
+            options = ev_rollup.children(path).index.get_level_values(-1).tolist()
+            with column:
+                choice = st.selectbox(LEVEL_LABELS[drill_level], ['(All)'] + options, index=1 if drill_level == 'state' else 0,
+                                      key=f'drill_{drill_level}')
+            if choice == '(All)':
+                break
+            path += (choice,)
+        children = ev_rollup.children(path)
+        children.index = children.index.get_level_values(-1).rename(LEVEL_LABELS[LEVELS[len(path)]] if len(path) < len(LEVELS) else None)
+        st.dataframe(children[list(ROLLUP_COLUMNS)].rename(columns=ROLLUP_COLUMNS).style.format(ROLLUP_FORMAT),
+                     use_container_width=True)
+
+if ev_rollup is not None:
+    section_1_4()
+
+## 1.5) District Map (simplified, cached district polygons: a few tens of KB per map)
+MAP_METRICS = {'ev_count': ('EV Count', ',.0f'), 'charger_ev_ratio': ('Charger-to-EV Ratio', '.3f'),
+               'charger_density': ('Charger Density', '.2e')}
+
+def viz_1_5(chart_title, metric, detail):
+    label, value_format = MAP_METRICS[metric]
+    fig_map = district_map(district_geometry[detail], ev_merged['legislative_district'], ev_merged[metric],
+                           chart_title, label, value_format, selected=selected_districts)
+    plotly_chart(fig_map, 'viz_1_5')
+
+@st.fragment
+def section_1_5():
+    """Section 1.5 metric and detail controls; re-executes alone when a control changes"""
+    with telemetry.timer('section/1.5'):
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            metric = st.selectbox("Select Metric", list(MAP_METRICS), format_func=lambda m: MAP_METRICS[m][0], key='map_metric')
+        with col2:
+            detail = st.select_slider("Boundary Detail", list(DETAIL_KM), value=DEFAULT_DETAIL, key='map_detail',
+                                      help="Boundaries are simplified to about 1 km (Coarse), 250 m (Medium) or 50 m (Fine)")
+        render_chart(viz_1_5, f'{MAP_METRICS[metric][0]} by Legislative District', metric, detail)
+
+if district_geometry is not None:
+    section_1_5()
+else:
+    st.info(f"District map unavailable: add the legislative district boundaries (GeoJSON) as `data_processed/{GEOMETRY_FILE}`.")
+
 st.divider()
 
 # ================================== #
@@ -338,9 +473,7 @@ st.header("2. EV Adoption Trends")
 ## 2.1) EV Adoption by Model Year
 def viz_2_1(chart_title='EV Distribution by Model Year'):
     
-    # ev_by_year = ev_filtered['model_year'].value_counts().sort_index()
-    ev_by_year = ev_filtered['model_year'].value_counts().sort_index().reset_index()
-    ev_by_year.columns = ['model_year', 'ev_count']
+    ev_by_year = ev_query.counts_by(['model_year'], selected_districts).rename(columns={'count': 'ev_count'})
     
     fig_adoption = px.line(
         ev_by_year,
@@ -357,16 +490,16 @@ def viz_2_1(chart_title='EV Distribution by Model Year'):
         line=dict(color=highlight_color)
     )
 
-    st.plotly_chart(fig_adoption)
+    plotly_chart(fig_adoption, 'viz_2_1')
 
 ## 2.2) EV Type by Model Year (BEV vs. PHEV)
 def viz_2_2(chart_title='EV Type by Model Year (BEV vs. PHEV)'): 
 
     # Count EV by each model year and ev type
-    model_counts = ev_filtered.groupby(['model_year', 'ev_type']).size().reset_index(name='count')
+    model_counts = ev_query.counts_by(['model_year', 'ev_type'], selected_districts)
     
     # Sum total counts for each EV type
-    total_counts = model_counts.groupby('ev_type')['count'].sum().reset_index()
+    total_counts = model_counts.groupby('ev_type', observed=True)['count'].sum().reset_index()
     
     # Get the EV type with the largest count
     largest_ev_type = total_counts.loc[total_counts['count'].idxmax(), 'ev_type'] # EV type name
@@ -407,7 +540,7 @@ def viz_2_2(chart_title='EV Type by Model Year (BEV vs. PHEV)'):
     fig_type.update_xaxes(title='Model Year')
     fig_type.update_yaxes(title='EV Count')
 
-    st.plotly_chart(fig_type)
+    plotly_chart(fig_type, 'viz_2_2')
 
 # Plot side by side (Streamlit columns)
 col1, col2 = st.columns(2)
@@ -420,86 +553,72 @@ Observations:
 - The trend towards more recent model years could indicate growing consumer interest, improved technology, and increased availability of EVs (though it's not a perfect representation of new EV adoption rates).
 """)
 
+## 2.3) District Adoption Trajectories Across Registration Snapshots
+def viz_2_3(chart_title, metric):
+
+    # Monthly counts of the selected districts (statewide total when no district is selected)
+    with telemetry.timer('timeseries/query'):
+        counts = ev_snapshots.series(districts=selected_districts, by_district=bool(selected_districts))
+        if metric == "3-Month Rolling Mean":
+            values = rolling_mean(counts, 3)
+        elif metric == "Year-over-Year Change":
+            values = year_over_year(counts)
+        elif metric == "Annualized Growth (Trailing 3 Months)":
+            values = growth_rate(counts, 3)
+        else:
+            values = counts
+
+    trajectories = values.rename_axis('snapshot_month').reset_index().melt(
+        id_vars='snapshot_month', var_name='legislative_district', value_name='value'
+    )
+    fig_trajectory = px.line(
+        trajectories,
+        x='snapshot_month',
+        y='value',
+        color='legislative_district',
+        title=chart_title,
+        color_discrete_map={'Total': highlight_color}
+    )
+    is_rate = metric in ("Year-over-Year Change", "Annualized Growth (Trailing 3 Months)")
+    value_format = '%{y:.1%}' if is_rate else '%{y:,.0f}'
+    fig_trajectory.for_each_trace(lambda t: t.update(hovertemplate='Legislative District: ' + str(t.name) + '<br>Snapshot: %{x|%b %Y}<br>' + metric + ': ' + value_format))
+    fig_trajectory.update_layout(legend_title_text='', showlegend=bool(selected_districts))
+    fig_trajectory.update_xaxes(title='Registration Snapshot')
+    fig_trajectory.update_yaxes(title=metric, tickformat='.0%' if is_rate else None)
+
+    plotly_chart(fig_trajectory, 'viz_2_3')
+
+@st.fragment
+def section_2_3():
+    """Section 2.3 metric dropdown and chart; re-executes alone when the dropdown changes"""
+    with telemetry.timer('section/2.3'):
+        if ev_snapshots is None or ev_snapshots.n_snapshots < 2:
+            st.info("Adoption trajectories need at least two monthly registration snapshots. "
+                    "Add one per DOL export with `python -m utils.timeseries append YYYY-MM-DD --csv <export.csv>`.")
+            return
+
+        metric = st.selectbox(
+            "Select Metric",
+            ["EV Count", "3-Month Rolling Mean", "Year-over-Year Change", "Annualized Growth (Trailing 3 Months)"],
+            key='trajectory_metric'
+        )
+        render_chart(viz_2_3, 'EV Adoption Trajectory by Legislative District', metric)
+
+section_2_3()
+
 st.divider()
 
 # ================================== #
 ### 3. Economic Analysis
 st.header("3. Economic Indicator")
 
-# OLS regression for trendline
-def calculate_ols(df, x_col, y_col):
-    """OLS regression and get parameters"""
-    # Data preparation
-    X = sm.add_constant(df[x_col]) # Add constant term for intercept
-    y = df[y_col]
-    # Get OLS parameters
-    model = sm.OLS(y, X).fit()
-    slope = model.params[1]
-    intercept = model.params[0]
-    r_squared = model.rsquared
-    return slope, intercept, r_squared
-
 ## 3.1) EV Count vs. Median Household Income by Legislative District
-def viz_3(chart_title='EV Count vs. Median Household Income by Legislative District'):
-    # OLS regression for trendline
-    slope, intercept, r_squared = calculate_ols(ev_merged, 'median_household_income', 'ev_count')
-    
-    if selected_districts:
-        ev_merged['selected_highlight'] = np.where(
-            ev_merged['legislative_district'].isin(selected_districts),
-            'Selected',
-            'Unselected'
-        )
-        color_discrete_map = {'Selected': highlight_color, 'Unselected': unhighlight_color}
-        
-        fig_income = px.scatter(
-            ev_merged,
-            x='median_household_income',
-            y='ev_count',
-            title=chart_title,
-            color='selected_highlight',
-            color_discrete_map=color_discrete_map,
-            trendline='ols',
-            trendline_scope='overall',
-            trendline_color_override=unhighlight_color,
-            hover_data=['legislative_district', 'median_household_income', 'ev_count'],
-            hover_name='legislative_district',
-        )
-    else:
-        fig_income = px.scatter(
-            ev_merged.assign(group='Legislative District'), # Assign the same group 'Legislative District' to all data
-            x='median_household_income',
-            y='ev_count',
-            title=chart_title,
-            color='group', # Specify color group
-            color_discrete_map={'Legislative District': highlight_color}, # Set the designated color
-            trendline='ols',
-            trendline_scope='overall',
-            trendline_color_override=highlight_color,
-            hover_data=['legislative_district', 'median_household_income', 'ev_count'],
-            hover_name='legislative_district',
-        )
-    
-    # Customize hover template
-    # Add the OLS equation and R^2 to hovertemplate
-    ols_equation = f'<br>OLS trendline:<br>y = {slope:.2f}x + {intercept:.2f}<br>R² = {r_squared:.2f}'
-    
-    fig_income.update_traces(
-        hovertemplate=(
-            'Legislative District: %{hovertext}<br>'
-            'Median Household Income: $%{x:,.0f}<br>'
-            'EV Count: %{y}<br>'
-            f'{ols_equation}'
-        )
-    )
-    
-    fig_income.update_layout(legend_title_text='') # Hide the legend title
-    fig_income.update_xaxes(title='Median Household Income')
-    fig_income.update_yaxes(title='EV Count')
-    
-    st.plotly_chart(fig_income)
+def viz_3(chart_title=district_charts.INCOME_TITLE):
+    # Built once per dataset version; the selection is applied in the browser
+    figure_url = district_figure('income', chart_version, chart_title)
+    district_chart(figure_url, selected_districts, unhighlight_color, key='viz_3')
 
-render_chart(viz_3, 'EV Count vs. Median Household Income by Legislative District')
+render_chart(viz_3, district_charts.INCOME_TITLE)
 
 st.markdown("""
 Observations:
@@ -515,123 +634,29 @@ st.header("4. Charging Infrastructure Development")
 
 ## 4.1) EV Count vs. Charging Infrasturcture Variables
 
-# Create a dropdown for selecting visualization type
-viz_type = st.selectbox(
-    "Select Visualization", 
-    ["EV Count vs. Charger by Legislative District",
-     "EV Count vs. Charger-to-EV Ratio by Legislative District",
-     "EV Count vs. Charger-to-Area Ratio by Legislative District"
-    ]
-)
+def viz_4(chart_title, x_data, y_data):
+    figure_url = district_figure('charger', chart_version, chart_title, x_data, y_data)
+    district_chart(figure_url, selected_districts, unhighlight_color, key='viz_4')
+
+@st.fragment
+def section_4_1():
+    """Section 4.1 widgets and chart; re-executes alone when its dropdowns change"""
+    with telemetry.timer('section/4.1'):
+        # Create a dropdown for selecting visualization type
+        viz_type = st.selectbox(
+            "Select Visualization", 
+            list(dict.fromkeys(viz for viz, _ in district_charts.CHARGER_VARIANTS)) # Unique, in table order
+        )
 
-# Create a dropdown for selecting scaling option
-scaling_option = st.selectbox("Select Scaling Option", ["Raw", "Scaled"])
-
-# Choose the appropriate data based on the scaling option
-# -> Square root transformed
-if scaling_option == "Scaled":
-    if viz_type == "EV Count vs. Charger by Legislative District":
-        x_data = 'transformed_charger_count'
-        y_data = 'transformed_ev_count'
-        chart4_title = 'EV Count vs. Transformed Charger Count by Legislative District'
-    elif viz_type == "EV Count vs. Charger-to-EV Ratio by Legislative District":
-        x_data = 'transformed_charger_ev_ratio'
-        y_data = 'transformed_ev_count'
-        chart4_title = 'EV Count vs. Transformed Charger-to-EV Ratio by Legislative District'
-    else:
-        x_data = 'transformed_charger_density'
-        y_data = 'transformed_ev_count'
-        chart4_title = 'EV Count vs. Transformed Charger-to-Area Ratio by Legislative District'
-# Raw data
-else: 
-    if viz_type == "EV Count vs. Charger by Legislative District":
-        x_data = 'charger_count'
-        y_data = 'ev_count'
-        chart4_title = 'EV Count vs. Charger by Legislative District'
-    elif viz_type == "EV Count vs. Charger-to-EV Ratio by Legislative District":
-        x_data = 'charger_ev_ratio'
-        y_data = 'ev_count'
-        chart4_title = 'EV Count vs. Charger-to-EV Ratio by Legislative District'
-    else:
-        x_data = 'charger_density'
-        y_data = 'ev_count'
-        chart4_title = 'EV Count vs. Charger-to-Area Ratio by Legislative District'
+        # Create a dropdown for selecting scaling option
+        scaling_option = st.selectbox("Select Scaling Option", ["Raw", "Scaled"])
 
-def viz_4(chart_title):
+        # Columns and title of the chosen variant ("Scaled" -> square root transformed)
+        x_data, y_data, chart4_title = district_charts.CHARGER_VARIANTS[(viz_type, scaling_option)]
 
-    # OLS regression for trendline
-    slope, intercept, r_squared = calculate_ols(ev_merged, x_data, y_data)
-    
-    # Dictionary to label the x-axis based on selected data
-    x_labels = {
-        'transformed_charger_count': 'Scaled Charger Count',
-        'transformed_ev_count': 'Scaled EV Count',
-        'transformed_charger_ev_ratio': 'Scaled Charger-to-EV Ratio',
-        'transformed_charger_density': 'Scaled Charger Density',
-        'charger_count': 'Charger Count',
-        'ev_count': 'EV Count',
-        'charger_ev_ratio': 'Charger-to-EV Ratio',
-        'charger_density': 'Charger Density',
-        # 'median_household_income': 'Median Household Income'
-    }
-    
-    if selected_districts:
-        ev_merged['selected_highlight'] = np.where(
-            ev_merged['legislative_district'].isin(selected_districts),
-            'Selected', 
-            'Unselected'
-        )
-        color_discrete_map = {'Selected': highlight_color, 'Unselected': unhighlight_color}
-        
-        fig_charger = px.scatter(
-            ev_merged,
-            x=x_data,
-            y=y_data,
-            title=chart_title,
-            color='selected_highlight',
-            color_discrete_map=color_discrete_map,
-            trendline='ols',
-            trendline_scope='overall',
-            trendline_color_override=unhighlight_color,
-            hover_data=['legislative_district'],#, x_data, y_data],
-            hover_name='legislative_district',
-        )
-    
-    else:
-        fig_charger = px.scatter(
-            ev_merged.assign(group='Legislative District'), # Assign the same group 'Legislative District' to all data
-            x=x_data,
-            y=y_data,
-            title=chart_title,
-            color='group', # Specify color group
-            color_discrete_map={'Legislative District': highlight_color}, # Set the designated color
-            trendline='ols',
-            trendline_scope='overall',
-            trendline_color_override=highlight_color,
-            hover_data=['legislative_district'],#, x_data, y_data],
-            hover_name='legislative_district',
-        )
-    
-    # Custom dynamic hovertemplate based on x_data label
-    # Add the OLS equation and R^2 to hovertemplate
-    ols_equation = f'<br>OLS trendline:<br>y = {slope:.2f}x + {intercept:.2f}<br>R² = {r_squared:.2f}'
-    
-    fig_charger.update_traces(
-        hovertemplate=(
-            'Legislative District: %{hovertext}<br>'
-            f'{x_labels.get(x_data, "X Value")}: ' + '%{x}<br>'
-            'EV Count: %{y}<br>'
-            f'{ols_equation}'
-        )
-    )
-    
-    fig_charger.update_layout(legend_title_text='') # Hide the legend title
-    fig_charger.update_xaxes(title=x_labels.get(x_data, x_data))
-    fig_charger.update_yaxes(title=x_labels.get(y_data, y_data))
-    
-    st.plotly_chart(fig_charger)
+        render_chart(viz_4, chart4_title, x_data, y_data)
 
-render_chart(viz_4, chart4_title)
+section_4_1()
 
 st.markdown("""
 Observations:
@@ -641,299 +666,187 @@ Observations:
 """)
 # Investment in charging infrastructure is critical. While some districts have kept pace with EV adoption, others lag behind, highlighting the need for targeted infrastructure expansion to support growing demand.
 
-st.divider()
+## 4.2) Charger Coverage Gaps: Distance from Each EV to the Nearest Charger
+def viz_4_2(chart_title='Distance to the Nearest Charging Station by Legislative District'):
 
-# ================================== #
-### 5. Political Landscape
-st.header("5. Political Landscape")
-
-# Create a dropdown for selecting visualization type
-viz_type = st.selectbox(
-    "Select Visualization", 
-    ["EV Count by Legislative District", 
-     "Registered Voters by Legislative District", 
-     "EV Count vs. Median Household Income", 
-     "EV Count vs. Charging Infrastructure"
-    ]
-)
-
-party_colors = {'Democratic': '#0068C9', 'Republican': '#D32F2F'} # Material design red; modern UI
-# unhighlight_color = 'lightgray' # Color for unselected districts
+    # Sort districts by median distance (largest coverage gap first)
+    coverage_sorted = coverage_by_district.sort_values('median_km', ascending=False)
+    if selected_districts:
+        colors = np.where(coverage_sorted['legislative_district'].isin(selected_districts), highlight_color, unhighlight_color)
+    else:
+        colors = highlight_color
 
-## 5.1) EV Count by Legislative District and Political Party
-def viz_5_1(chart_title='EV Count by Legislative District and Political Party'):
-    
-    # Sort the dataframe by ev_count in descending order
-    # ev_merged_sorted = ev_merged_filtered.sort_values('ev_count', ascending=False)
-    ev_merged_sorted = ev_merged.sort_values('ev_count', ascending=False)
+    fig_coverage = go.Figure()
 
-    if selected_districts:
-        # Create a new column 'selected_highlight' based on whether the district is selected or not
-        ev_merged_sorted['selected_highlight'] = np.where(
-            ev_merged_sorted['legislative_district'].isin(selected_districts),
-            ev_merged_sorted['party_won'], 
-            'Unselected'
+    # Median distance bar
+    fig_coverage.add_trace(
+        go.Bar(
+            x=coverage_sorted['legislative_district'],
+            y=coverage_sorted['median_km'],
+            name='Median Distance',
+            marker_color=colors,
+            customdata=coverage_sorted[['ev_count', 'share_within_1km']],
+            hovertemplate='Legislative District: %{x}<br>Median Distance: %{y:.2f} km<br>'
+                          'EV Count: %{customdata[0]:,}<br>EVs within 1 km: %{customdata[1]:.1%}<extra></extra>'
+        )
+    )
+    # 90th percentile distance marker
+    fig_coverage.add_trace(
+        go.Scatter(
+            x=coverage_sorted['legislative_district'],
+            y=coverage_sorted['p90_km'],
+            mode='markers',
+            marker=dict(symbol='line-ew', size=14, line=dict(width=3, color=unhighlight_color)),
+            name='90th Percentile Distance',
+            hovertemplate='Legislative District: %{x}<br>90th Percentile Distance: %{y:.2f} km<extra></extra>'
         )
-        # Define the color map, with party_won for selected districts and gray for unselected
-        color_discrete_map = {**party_colors, 'Unselected': unhighlight_color}
-    else:
-        ev_merged_sorted['selected_highlight'] = ev_merged_sorted['party_won']
-        color_discrete_map = party_colors
-
-    fig_pp = px.bar(
-        ev_merged_sorted, 
-        x='legislative_district', 
-        y='ev_count', 
-        color='selected_highlight', 
-        title=chart_title,
-        color_discrete_map=color_discrete_map,
-        # reorder x axis legislative_district by ev_count (descending)
-        # category_orders={'legislative_district': ev_merged_sorted['legislative_district'].tolist()}
-    ).update_xaxes(
-        type='category', 
-        categoryorder='total descending' # or max descending
     )
 
-    # Customize hovertemplate
-    # Update hovertemplate for each trace
-    fig_pp.for_each_trace(lambda t: t.update(hovertemplate='Legislative District: %{x}<br>EV Count: %{y}<br>' + 'Party Won: ' + str(t.name)))
-
-    # fig.update_xaxes(tickangle=45)
-    fig_pp.update_layout(
+    fig_coverage.update_layout(
+        title=chart_title,
         xaxis_title='Legislative District',
-        yaxis_title='EV Count',
-        legend_title_text=''
+        yaxis_title='Distance to Nearest Charger (km)',
+        legend=dict(orientation='h', yanchor='bottom', y=1.00, xanchor='center', x=0.5, title=None)
     )
+    fig_coverage.update_xaxes(type='category')
 
-    st.plotly_chart(fig_pp)
+    plotly_chart(fig_coverage, 'viz_4_2')
 
-## 5.2) Registered Voters by Legislative District and Political Party
-def viz_5_2(chart_title='Registered Voters by Legislative District and Political Party'):
-    
-    # Sort the dataframe by ev_count in descending order
-    ev_merged_sorted = ev_merged.sort_values('ev_count', ascending=False)
-    # Use the same order for 'legislative_district' from the first chart
-    ld_order = ev_merged_sorted['legislative_district'].tolist()
+if coverage_by_district is not None:
+    render_chart(viz_4_2, 'Distance to the Nearest Charging Station by Legislative District')
 
-    if selected_districts:
-        ev_merged_sorted['selected_highlight'] = np.where(
-            ev_merged_sorted['legislative_district'].isin(selected_districts),
-            ev_merged_sorted['party_won'],
-            'Unselected'
-        )
-        color_discrete_map = {**party_colors, 'Unselected': unhighlight_color}
+    # Census tracts with the largest coverage gaps (within the selected districts, if any)
+    st.markdown("**Census Tracts with the Largest Coverage Gaps**")
+    if ev_rollup is not None: # Tracts under the selected districts, from the rollup
+        tracts = ev_rollup.view('2020_census_tract', 'legislative_district', selected_districts).index
     else:
-        ev_merged_sorted['selected_highlight'] = ev_merged_sorted['party_won']
-        color_discrete_map = party_colors
-    
-    fig_pp = px.bar(
-        ev_merged_sorted,
-        x='legislative_district',
-        y='registered_voters',
-        color='selected_highlight',
-        title=chart_title,
-        color_discrete_map=color_discrete_map,
-        category_orders={'legislative_district': ld_order}
-    ).update_xaxes(type='category')
-
-    # Customize hovertemplate
-    # Update hovertemplate for each trace
-    fig_pp.for_each_trace(lambda t: t.update(hovertemplate='Legislative District: %{x}<br>Registered Voters: %{y}<br>' + 'Party Won: ' + str(t.name))) 
-    
-    fig_pp.update_layout(
-        xaxis_title='Legislative District',
-        yaxis_title='Registered Voters',
-        legend_title_text=''
+        tracts = ev_query.distinct('2020_census_tract', selected_districts)
+    coverage_tracts = coverage_by_tract[coverage_by_tract['2020_census_tract'].astype(str).isin(tracts)]
+    st.dataframe(
+        coverage_tracts.nlargest(10, 'median_km')[['2020_census_tract', 'ev_count', 'median_km', 'p90_km', 'share_within_1km']],
+        hide_index=True
     )
 
-    st.plotly_chart(fig_pp)
-
-## 5.3) EV Count vs. Median Household Income by Legislative District
-def viz_5_3(chart_title='EV Count vs. Median Household Income by Legislative District and Political Party'):
-    
-    if selected_districts:
-        ev_merged['selected_highlight'] = np.where(
-            ev_merged['legislative_district'].isin(selected_districts),
-            ev_merged['party_won'],
-            'Unselected')
-        color_discrete_map = {**party_colors, 'Unselected': unhighlight_color}
-
-        fig_pp = px.scatter(
-            ev_merged,
-            x='median_household_income',
-            y='ev_count',
-            color='selected_highlight',
-            title=chart_title,
-            color_discrete_map=color_discrete_map,
-            hover_data=['legislative_district','selected_highlight'],
-            hover_name='legislative_district'
-        )
-
-        # Customize hovertemplate
-        # Update hovertemplate for each trace
-        fig_pp.for_each_trace(lambda t: t.update(
-            hovertemplate=(
-                'Legislative District: %{hovertext}<br>Party Won: ' + str(t.name) + '<br>Median Household Income: $%{x:,.0f}<br>EV Count: %{y}')
-        ))
-        
-        # fig_pp.update_traces(
-        #     hovertemplate=(
-        #         'Legislative District: %{hovertext}<br>'
-        #         'Median Household Income: $%{x:,.0f}<br>'
-        #         'EV Count: %{y}<br>'
-        #     )
-        # )
-    
+    st.markdown("""
+    Observations:
+    - Districts with a large median or 90th percentile distance have many EV owners far from public charging, pointing to where new stations would close the largest coverage gaps.
+    """)
+
+## 4.3) EV and Charger Density Map (binned on the server: the map gets bins, never individual vehicles)
+MAP_MAX_BINS = 5000 # The detail level is lowered until the view holds at most this many bins
+MAP_CENTER = {'lat': 47.4, 'lon': -120.7} # Washington State
+MAP_ZOOM = 5.6
+
+def bin_km(zoom, lat=MAP_CENTER['lat']):
+    """Bin width in km at a zoom level (Web Mercator, at the given latitude)"""
+    return 40075.0 * np.cos(np.radians(lat)) / (TILE_PIXELS * 2 ** zoom / BIN_PIXELS)
+
+def layer_label(layer):
+    """Dropdown label of a density layer"""
+    if layer == 'all':
+        return 'All EVs'
+    if layer == OTHER_MAKES:
+        return 'Other Makes'
+    kind, value = layer.split(':', 1)
+    return value.title() if kind == 'make' else value
+
+def viz_4_3(chart_title, layer, detail, show_chargers):
+    bounds = density_tiles.bounds_of(selected_districts) if selected_districts else None
+    zoom = density_tiles.finest_zoom(layer, bounds, MAP_MAX_BINS, zoom=detail)
+    ev_bins = density_tiles.bins(zoom, layer, bounds)
+
+    # Fit the map to the selected districts (bounds) or show the whole state
+    if bounds is not None:
+        center = {'lon': (bounds[0] + bounds[2]) / 2, 'lat': (bounds[1] + bounds[3]) / 2}
+        map_zoom = float(np.clip(np.log2(360 / max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1e-3)) - 0.5, MIN_ZOOM, MAX_ZOOM))
     else:
-        ev_merged['selected_highlight'] = ev_merged['party_won']
-        color_discrete_map = party_colors
-
-        # Calculate OLS params for each party_won(selected_highlight)
-        ols_params = {}
-        for party in ev_merged['party_won'].unique():
-            party_data = ev_merged[ev_merged['party_won'] == party]
-            slope, intercept, r_squared = calculate_ols(party_data, 'median_household_income', 'ev_count')
-            ols_params[party] = {'slope': slope, 'intercept': intercept, 'r_squared': r_squared}
-        
-        fig_pp = px.scatter(
-            ev_merged,
-            x='median_household_income',
-            y='ev_count',
-            color='selected_highlight',
-            title=chart_title,
-            color_discrete_map=color_discrete_map,
-            hover_data=['legislative_district','party_won'],
-            hover_name='legislative_district',
-            trendline='ols',
-            trendline_scope='trace' # 'trace' or 'overall'
-            # trendline_color_override=unhighlight_color
+        center, map_zoom = MAP_CENTER, MAP_ZOOM
+    marker_size = float(np.clip(BIN_PIXELS * 2 ** (map_zoom - zoom), 3, 18)) # One bin on screen at the initial map zoom
+
+    fig_density = go.Figure()
+    fig_density.add_trace(
+        go.Scattermapbox(
+            lon=ev_bins['lon'],
+            lat=ev_bins['lat'],
+            mode='markers',
+            marker=dict(size=marker_size, color=np.log10(ev_bins['count']), colorscale='Blues', opacity=0.75,
+                        colorbar=dict(title='EVs', tickvals=[0, 1, 2, 3, 4], ticktext=['1', '10', '100', '1k', '10k'])),
+            customdata=ev_bins['count'],
+            name=layer_label(layer),
+            hovertemplate='EVs: %{customdata:,}<extra></extra>'
+        )
+    )
+    if show_chargers:
+        station_bins = density_tiles.bins(zoom, 'chargers', bounds)
+        fig_density.add_trace(
+            go.Scattermapbox(
+                lon=station_bins['lon'],
+                lat=station_bins['lat'],
+                mode='markers',
+                marker=dict(size=max(marker_size / 2, 4), color=red_color),
+                customdata=station_bins['count'],
+                name='Charging Stations',
+                hovertemplate='Charging Stations: %{customdata:,}<extra></extra>'
+            )
         )
 
-        # Add the OLS equation and R^2 to hovertemplate
-        for trace in fig_pp.data:
-            party = trace.name  # 'selected_highlight' name (party_won)
-            
-            if party in ols_params:
-                slope = ols_params[party]['slope']
-                intercept = ols_params[party]['intercept']
-                r_squared = ols_params[party]['r_squared']
-                
-                # ols_equation = f"y = {slope:.2f}x + {intercept:.2f}"
-                ols_equation = f'<br>OLS trendline:<br>y = {slope:.2f}x + {intercept:.2f}<br>R² = {r_squared:.2f}'
-                
-                # Hovertemplate
-                trace.hovertemplate = (
-                    'Legislative District: %{hovertext}<br>'
-                    'Party Won: ' + party + '<br>'
-                    'Median Household Income: $%{x:,.0f}<br>'
-                    'EV Count: %{y}<br>'
-                    f'{ols_equation}<extra></extra>'
-                )
-
-    fig_pp.update_layout(legend_title_text='')
-    fig_pp.update_xaxes(title='Median Household Income')
-    fig_pp.update_yaxes(title='EV Count')
+    fig_density.update_layout(
+        title=chart_title,
+        mapbox=dict(style='open-street-map', center=center, zoom=map_zoom),
+        height=600,
+        margin=dict(l=0, r=0, t=40, b=0),
+        legend=dict(orientation='h', yanchor='bottom', y=1.00, xanchor='center', x=0.5, title=None)
+    )
 
-    st.plotly_chart(fig_pp)
+    plotly_chart(fig_density, 'viz_4_3')
+    st.caption(f"{ev_bins['count'].sum():,} EVs in {len(ev_bins):,} bins of about {bin_km(zoom, center['lat']):.1f} km"\
+               + (" (detail lowered to stay within the bin limit)" if zoom < detail else ""))
+
+@st.fragment
+def section_4_3():
+    """Section 4.3 layer and detail controls; re-executes alone when a control changes"""
+    with telemetry.timer('section/4.3'):
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            layer = st.selectbox("Select Vehicles", [l for l in density_tiles.layers if l != 'chargers'],
+                                 format_func=layer_label, key='density_layer')
+        with col2:
+            detail = st.select_slider("Map Detail", list(range(MIN_ZOOM, MAX_ZOOM + 1)), value=9,
+                                      format_func=lambda zoom: f"{bin_km(zoom):.1f} km", key='density_detail')
+        with col3:
+            show_chargers = st.checkbox("Show Charging Stations", value=True, key='density_chargers')
+        render_chart(viz_4_3, 'EV and Charging Station Density', layer, detail, show_chargers)
+
+if density_tiles is not None:
+    section_4_3()
+    st.markdown("""
+    Observations:
+    - EV registrations concentrate along the I-5 corridor around Seattle, Tacoma and Olympia, where charging stations are also densest; bins with many EVs and no nearby station mark candidate sites for new chargers.
+    """)
 
-## 5.4) EV Count vs. Charging Infrastructure by Legislative District
-def viz_5_4(chart_title='EV Count vs. Charging Infrastructure by Legislative District and Political Party'):
-    
-    if selected_districts:
-        ev_merged['selected_highlight'] = np.where(
-            ev_merged['legislative_district'].isin(selected_districts),
-            ev_merged['party_won'],
-            'Unselected'
-        )
-        color_discrete_map = {**party_colors, 'Unselected': unhighlight_color}
-
-        fig_pp = px.scatter(
-            ev_merged,
-            x='charger_count',
-            y='ev_count',
-            color='selected_highlight',
-            title=chart_title,
-            color_discrete_map=color_discrete_map,
-            hover_data=['legislative_district','selected_highlight'],
-            hover_name='legislative_district'
-        )
+st.divider()
 
-        # Customize hovertemplate
-        # Update hovertemplate for each trace
-        fig_pp.for_each_trace(lambda t: t.update(
-            hovertemplate=(
-                'Legislative District: %{hovertext}<br>Party Won: ' + str(t.name) + '<br>Number of Charging Stations: %{x}<br>EV Count: %{y}')
-        ))
-    
-        # fig_pp.update_traces(
-        #     hovertemplate=(
-        #         'Legislative District: %{hovertext}<br>'
-        #         'Number of Charging Stations: %{x}<br>'
-        #         'EV Count: %{y}<br>'
-        #     )
-        # )
-    
-    else:
-        ev_merged['selected_highlight'] = ev_merged['party_won']
-        color_discrete_map = party_colors
-
-        # Calculate OLS params for each party_won(selected_highlight)
-        ols_params = {}
-        for party in ev_merged['party_won'].unique():
-            party_data = ev_merged[ev_merged['party_won'] == party]
-            slope, intercept, r_squared = calculate_ols(party_data, 'charger_count', 'ev_count')
-            ols_params[party] = {'slope': slope, 'intercept': intercept, 'r_squared': r_squared}
-        
-        fig_pp = px.scatter(
-            ev_merged,
-            x='charger_count',
-            y='ev_count',
-            color='selected_highlight',
-            title=chart_title,
-            color_discrete_map=color_discrete_map,
-            hover_data=['legislative_district','party_won'],
-            hover_name='legislative_district',
-            trendline='ols',
-            trendline_scope='trace'
-            # trendline_color_override=unhighlight_color
-        )
+# ================================== #
+### 5. Political Landscape
+st.header("5. Political Landscape")
 
-        # Add the OLS equation and R^2 to hovertemplate
-        for trace in fig_pp.data:
-            party = trace.name  # 'selected_highlight' name (party_won)
-            
-            if party in ols_params:
-                slope = ols_params[party]['slope']
-                intercept = ols_params[party]['intercept']
-                r_squared = ols_params[party]['r_squared']
-                
-                # ols_equation = f"y = {slope:.2f}x + {intercept:.2f}"
-                ols_equation = f'<br>OLS trendline:<br>y = {slope:.2f}x + {intercept:.2f}<br>R² = {r_squared:.2f}'
-                
-                # Hovertemplate
-                trace.hovertemplate = (
-                    'Legislative District: %{hovertext}<br>'
-                    'Party Won: ' + party + '<br>'
-                    'Number of Charging Stations: %{x}<br>'
-                    'EV Count: %{y}<br>'
-                    f'{ols_equation}<extra></extra>'
-                )
+## 5.1) - 5.4) District charts by political party (variants: district_charts.PARTY_VARIANTS)
+def viz_5(chart_title, key, chart, *args):
+    figure_url = district_figure(chart, chart_version, chart_title, *args)
+    district_chart(figure_url, selected_districts, unhighlight_color, key=key)
 
-    fig_pp.update_layout(legend_title_text='')
-    fig_pp.update_xaxes(title='Number of Charging Stations')
-    fig_pp.update_yaxes(title='EV Count')
+@st.fragment
+def section_5():
+    """Section 5 dropdown and chart; re-executes alone when the dropdown changes"""
+    with telemetry.timer('section/5'):
+        # Create a dropdown for selecting visualization type
+        viz_type = st.selectbox("Select Visualization", list(district_charts.PARTY_VARIANTS))
 
-    st.plotly_chart(fig_pp)
+        # Plot based on the selection
+        key, chart, chart_title, args = district_charts.PARTY_VARIANTS[viz_type]
+        render_chart(viz_5, chart_title, key, chart, *args)
 
-# Plot based on the selection
-if viz_type == "EV Count by Legislative District":
-    render_chart(viz_5_1, 'EV Count by Legislative District and Political Party')
-elif viz_type == "Registered Voters by Legislative District":
-    render_chart(viz_5_2, 'Registered Voters by Legislative District and Political Party')
-elif viz_type == "EV Count vs. Median Household Income":
-    render_chart(viz_5_3, 'EV Count vs. Median Household Income by Legislative District and Political Party')
-else:
-    render_chart(viz_5_4, 'EV Count vs. Charging Infrastructure by Legislative District and Political Party')
+section_5()
     
 st.markdown("""
 Observations:
@@ -944,8 +857,66 @@ Observations:
 st.divider()
 
 # ================================== #
-# 6. Conclusion and Recommendations
-st.header("6. Conclusion and Recommendations")
+### 6. Feature Relationships
+st.header("6. Feature Relationships Across Districts")
+
+## 6.1) Correlation Matrix of District Features
+def viz_6(chart_title, method, party, columns):
+    # Matrices are memoized per (districts, party, method, variables): reruns with the same selection are lookups
+    corr = correlations.matrix(method, districts=selected_districts, party=party, columns=columns)
+    if corr is None:
+        st.info("Not enough districts in this selection for a correlation matrix"\
+                f"{' (partial correlations need more districts than variables)' if method == 'Partial' else ''}.")
+        return
+    
+    fig_corr = go.Figure(go.Heatmap(
+        z=corr.to_numpy(),
+        x=corr.columns,
+        y=corr.index,
+        zmin=-1, zmax=1,
+        colorscale='RdBu', # Red: negative, blue: positive
+        text=corr.round(2).to_numpy(),
+        texttemplate='%{text}',
+        hovertemplate='%{y}<br>%{x}<br>Correlation: %{z:.3f}<extra></extra>'
+    ))
+    fig_corr.update_layout(title=chart_title, height=max(450, 45 * len(columns)), yaxis_autorange='reversed')
+    
+    plotly_chart(fig_corr, 'viz_6')
+
+@st.fragment
+def section_6():
+    """Section 6 controls and heatmap; re-executes alone when a control changes"""
+    with telemetry.timer('section/6'):
+        col1, col2 = st.columns(2)
+        with col1:
+            method = st.selectbox("Select Correlation Method", METHODS,
+                                  help="Partial: correlation of each pair after controlling for all other selected variables")
+        with col2:
+            party = st.selectbox("Select Districts by Winning Party", ['All', 'Democratic', 'Republican'])
+        columns = st.multiselect("Select Variables", correlations.columns, default=KEY_FEATURES)
+        
+        if len(columns) < 2:
+            st.info("Select at least two variables.")
+            return
+        scope = f"{len(selected_districts)} Selected Districts" if selected_districts else "All Districts"
+        render_chart(viz_6, f'{method} Correlations ({scope}{", " + party if party != "All" else ""})',
+                     method, None if party == 'All' else party, columns)
+
+if correlations is None:
+    st.info("Feature correlations are not available.")
+else:
+    section_6()
+
+st.markdown("""
+Observations:
+- Spearman (rank) correlations are less sensitive to a few extreme districts; partial correlations show which relationships remain once the other selected variables are held fixed.
+""")
+
+st.divider()
+
+# ================================== #
+# 7. Conclusion and Recommendations
+st.header("7. Conclusion and Recommendations")
 st.markdown("""
 Based on the analysis, I can draw the following conclusions and make these recommendations:
 
@@ -996,10 +967,13 @@ st.sidebar.markdown("""
 - [3. Economic Indicator](#3-economic-indicator)
 - [4. Charging Infrastructure Development](#4-charging-infrastructure-development)
 - [5. Political Landscape](#5-political-landscape)
-- [6. Conclusion and Recommendations](#6-conclusion-and-recommendations)
+- [6. Feature Relationships Across Districts](#6-feature-relationships-across-districts)
+- [7. Conclusion and Recommendations](#7-conclusion-and-recommendations)
 """)
 
 st.sidebar.header("About This Dashboard")
 st.sidebar.info("This dashboard provides an in-depth analysis of electric vehicle adoption in Washington State, examining factors such as economic indicators, infrastructure development, and political trends. The goal is to inform policy decisions and industry strategies to promote sustainable transportation.")
 
 # ================================== #
+# Record whole-page render time
+telemetry.record('page/EV Analysis', (time.perf_counter() - page_start) * 1000)
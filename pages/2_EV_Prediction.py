@@ -23,7 +23,9 @@ SOFTWARE.
 """
 import pandas as pd
 import numpy as np
+import os
 import pickle
+import time
 
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import GradientBoostingRegressor
@@ -31,8 +33,21 @@ from sklearn.ensemble import GradientBoostingRegressor
 import shap
 import altair as alt
 import streamlit as st
-from streamlit.components.v1 import html
 import matplotlib.pyplot as plt
+
+from utils import coalesce, telemetry
+from utils.data import data_path, data_version
+from utils.shap_plot import force_plot_chart
+from utils.goal_seek import GOAL_FEATURES, GoalSeeker
+from utils.sensitivity import CONFIDENCE, load_sensitivity
+from utils.batch_shap import iter_shap_values, load_engine
+from utils.surrogate import COMPACT_FILE, MODEL_FILE
+from utils.figures import plotly_chart
+from utils.geometry import DEFAULT_DETAIL, district_map
+from utils.forecast import GRID_END_YEAR, TARGET_SHARE
+from utils.features import FeatureStore
+page_start = time.perf_counter() # Whole-page render time (telemetry)
+
 # ================================== #
 # Global setting
 
@@ -64,6 +79,7 @@ st.markdown("""
     }
     </style>
 """, unsafe_allow_html=True)
+telemetry.hide_diagnostics_link() # Diagnostics stays reachable by URL only
 
 st.sidebar.markdown("""
     <style>
@@ -102,16 +118,62 @@ if 'data_loaded' in st.session_state and st.session_state['data_loaded']:
     ev = st.session_state['ev']
     ev_merged = st.session_state['ev_merged']
     ev_state = st.session_state['ev_state']
+    feature_store = st.session_state.get('feature_store') or FeatureStore.from_frame(ev_merged)
 else:
     st.warning("Data has not been loaded. Please load the data on the main page.")
     st.stop()
 
-# Load model and scaler
-with open('data_processed/final_model.pkl', 'rb') as f:
-    loaded_model = pickle.load(f)
-    model = loaded_model['model']
-    scaler = loaded_model['scaler']
-    selected_features = loaded_model['selected_features']
+# Load model and scaler (once per model file, shared across sessions and reruns)
+@st.cache_resource(show_spinner=False)
+def load_model(model_file, version):
+    """Unpickle a trained model bundle (model, scaler, selected features)"""
+    with telemetry.timer('prediction/unpickle'), open(data_path(model_file), 'rb') as f:
+        return pickle.load(f)
+
+@st.cache_resource(show_spinner=False)
+def load_explainer(model_file, version):
+    """SHAP explainer for the trained model"""
+    loaded_model = load_model(model_file, version)
+    return shap.Explainer(loaded_model['model'], feature_names=loaded_model['selected_features'])
+
+@st.cache_resource(show_spinner=False)
+def load_goal_seeker(_ev_merged, model_file, version):
+    """Goal seeker over all districts (prediction curves are memoized inside, per input)"""
+    loaded_model = load_model(model_file, version[0])
+    return GoalSeeker(loaded_model['model'], loaded_model['scaler'], loaded_model['selected_features'], _ev_merged)
+
+@st.cache_resource(show_spinner=False)
+def load_shap_engine(model_file, version):
+    """Batch TreeSHAP engine (cell tables are built once per model file and saved)"""
+    return load_engine(load_model(model_file, version)['model'], version)
+
+@st.cache_data(show_spinner="Computing Sobol sensitivity indices...")
+def load_sobol(_ev_merged, model_file, version):
+    """Sobol indices of the prediction (saved per model artifact and dataset version)"""
+    return load_sensitivity(_ev_merged, model_file=model_file)
+
+def model_label(model_file, version):
+    """Selector label of a model artifact (the compact model states its size and fidelity)"""
+    report = load_model(model_file, version).get('surrogate')
+    if report is None:
+        return f"Full model ({model_file})"
+    # Measured deviation on the build's validation points, and the bound that holds for any input
+    return f"Compact model: {report['trees_kept']} of {report['trees']} trees, "\
+           f"±{report['max_deviation']:.2f} EVs measured (at most ±{report['worst_case_bound']:.2f})"
+
+# Model artifact: the compact surrogate (python -m utils.surrogate) is offered when it has been built
+model_files = [MODEL_FILE] + ([COMPACT_FILE] if os.path.exists(data_path(COMPACT_FILE)) else [])
+st.sidebar.header("Prediction Model")
+model_file = st.sidebar.selectbox("Model artifact", model_files, format_func=lambda f: model_label(f, data_version(f)),
+                                  key='model_file', help="The compact model is faster. Its predictions differ from the full model's by at most the "\
+                                  "measured amount on every district and the validation grid used to build it, and never by "\
+                                  "more than the stated bound for any input",
+                                  disabled=len(model_files) == 1)
+model_version = data_version(model_file)
+loaded_model = load_model(model_file, model_version)
+model = loaded_model['model']
+scaler = loaded_model['scaler']
+selected_features = loaded_model['selected_features']
 
 # ================================== #
 # User input setting
@@ -119,40 +181,50 @@ with open('data_processed/final_model.pkl', 'rb') as f:
 # User input (new test data)
 st.sidebar.header("Choose Values for Input Variables")
 
+# Slider ranges and defaults come from the feature store (statistics are computed once per feature set, not per rerun)
+stats = feature_store.statistics()
+district_options = ['State average'] + sorted(feature_store.districts[feature_store.resolve()], key=int)
+start_district = st.sidebar.selectbox("Start from district", district_options, key='start_district',
+                                      help="Set the sliders to the features of one legislative district")
+if start_district == 'State average':
+    defaults = stats.loc['mean']
+else:
+    defaults = pd.Series(feature_store.vector(start_district, selected_features), index=selected_features)
+
 income = st.sidebar.slider(
     "Median Household Income", # Label for input slider
-    float(ev_merged['median_household_income'].min()), # Minimum value for slider
-    float(ev_merged['median_household_income'].max()), # Maximum value for slider
-    float(ev_merged['median_household_income'].mean()), # Default value (mean)
+    float(stats.at['min', 'median_household_income']), # Minimum value for slider
+    float(stats.at['max', 'median_household_income']), # Maximum value for slider
+    float(defaults['median_household_income']), # Default value (mean, or the chosen district)
     step=1.0, # Step size for slider
     help="Select the median household income range"
 )
 dem_votes = st.sidebar.slider(
     "Democratic Party Support (Votes)",
-    float(ev_merged['dem_votes'].min()),
-    float(ev_merged['dem_votes'].max()),
-    float(ev_merged['dem_votes'].mean()),
+    float(stats.at['min', 'dem_votes']),
+    float(stats.at['max', 'dem_votes']),
+    float(defaults['dem_votes']),
     step=1.0,
     help="Select the Democratic support range"
 )
 rep_votes = st.sidebar.slider(
     "Republican Party Support (Votes)",
-    float(ev_merged['rep_votes'].min()),
-    float(ev_merged['rep_votes'].max()),
-    float(ev_merged['rep_votes'].mean()),
+    float(stats.at['min', 'rep_votes']),
+    float(stats.at['max', 'rep_votes']),
+    float(defaults['rep_votes']),
     step=1.0,
     help="Select the Republican support range"
 )
 charger_density_scaled = st.sidebar.slider(
     "Charger Density (scaled, x10⁹)",
-    float(ev_merged['charger_density'].min() * 1e9), # Minimum value, scaled
-    float(ev_merged['charger_density'].max() * 1e9), # Maximum value, scaled
-    float(ev_merged['charger_density'].mean() * 1e9), # Default value (mean), scaled
+    float(stats.at['min', 'charger_density'] * 1e9), # Minimum value, scaled
+    float(stats.at['max', 'charger_density'] * 1e9), # Maximum value, scaled
+    float(defaults['charger_density'] * 1e9), # Default value, scaled
     step=0.1,
     help="Select the charger density range"
 )
 charger_density = charger_density_scaled / 1e9 # Convert scaled input back to original unit
-margin_error = ev_merged['margin_error'].mean() # Use the mean value for margin error (fixed/constant for simplicity)
+margin_error = defaults['margin_error'] # Fixed margin error: the mean (or the chosen district's), not a slider
 
 # Create input data
 original_input = pd.DataFrame({
@@ -166,11 +238,19 @@ original_input = pd.DataFrame({
 # Verify selected variables
 assert list(original_input.columns) == selected_features, "Feature names do not match expected names!"
 
+# Rapid slider drags queue a rerun per value. The tracker counts runs superseded by a newer value, and
+# checkpoints between the stages below stop a superseded run early, so only the latest value is computed.
+tracker = coalesce.session_tracker('prediction')
+tracker.begin()
+
 col1, col2 = st.columns(2)
 with col1:
     # 1) EV count prediction
-    scaled_input = scaler.transform(original_input[selected_features])
-    original_prediction = model.predict(scaled_input)[0] # ev_count (original value)
+    with telemetry.timer('prediction/scale'):
+        scaled_input = scaler.transform(original_input[selected_features])
+    with telemetry.timer('prediction/predict'):
+        original_prediction = model.predict(scaled_input)[0] # ev_count (original value)
+    coalesce.checkpoint()
     
     # Prediction
     st.write("### Predicted Electric Vehicle Count")
@@ -243,11 +323,14 @@ with col2:
 # ---
 # 2) SHAP
 
-# SHAP Explainer Initialization
-explainer = shap.Explainer(model, feature_names=selected_features)
+coalesce.checkpoint()
+with telemetry.timer('prediction/shap'):
+    # SHAP Explainer Initialization (cached per model file)
+    explainer = load_explainer(model_file, model_version)
 
-# Compute SHAP values for the scaled input
-shap_values = explainer(scaled_input)
+    # Compute SHAP values for the scaled input
+    shap_values = explainer(scaled_input)
+coalesce.checkpoint()
 
 # Display SHAP results in two columns
 col1, col2 = st.columns(2)
@@ -268,19 +351,19 @@ with col1:
 with col2:
     # Generate SHAP force plot (interactive visualization)
     st.write("### Variable Impact Direction (SHAP Force Plot)")
-    force_plot_html = shap.force_plot(
-        explainer.expected_value,
-        shap_values.values[0],
-        feature_names=selected_features,
-        matplotlib=False, # Render as HTML
-        plot_cmap=[red_color, highlight_color]
-    )
-    # Embed/wrap the SHAP force plot in Streamlit using an CSS/iframe
-    # - Rendering shap.force_plot as an HTML plot in Streamlit requires wrapping it in an iframe. 
-    # - Streamlit doesn't natively support direct HTML rendering for SHAP visualizations.
-    # - Need to save the force plot as an interactive HTML snippet and embed it using st.components.v1.html.
-    shap_html = f"<head>{shap.getjs()}</head><body>{force_plot_html.html()}</body>"
-    html(shap_html, height=160)
+    with telemetry.timer('prediction/force_plot_html'):
+        force_plot = shap.force_plot(
+            explainer.expected_value,
+            shap_values.values[0],
+            feature_names=selected_features,
+            matplotlib=False, # Render as HTML
+            plot_cmap=[red_color, highlight_color]
+        )
+        # Render the interactive force plot in a Streamlit component
+        # - The SHAP JavaScript bundle is served once as a static file (cached by the browser)
+        #   instead of being inlined with shap.getjs() into a new st.components.v1.html iframe on every rerun.
+        # - Per slider change only the force-plot data (base value and attributions) is sent.
+        force_plot_chart(force_plot, key='force_plot')
 
     # fig = shap.force_plot(
     #     explainer.expected_value,
@@ -297,6 +380,10 @@ with col2:
 # st.write("### SHAP Waterfall Plot")
 # shap.waterfall_plot(shap_values[0], feature_names=selected_features)
 
+tracker.finish() # Latest slider state fully rendered
+# The sections below do not depend on the sliders, but a full rerun still executes them: a checkpoint
+# before each one stops a superseded run there instead of after the whole page.
+
 # ================================== #
 # SHAP explanation
 st.markdown(
@@ -341,6 +428,330 @@ with col2:
         - **`margin_error`** also has a significant bar length, indicating its notable impact despite being in the blue region.
     """
     )
+# ================================== #
+# Global SHAP summary (every district explained at once)
+st.divider()
+st.markdown("### Global SHAP Summary (All Districts)")
+st.write("The force plot above explains one input combination. Here every legislative district is explained with its own inputs: "\
+         "the bar chart ranks the variables by average impact, and each dot is one district, colored by how high its input value is.")
+
+@st.cache_data(show_spinner=False)
+def shap_summary_charts(_ev_merged, model_file, version):
+    """Vega-Lite specs of the mean |SHAP| ranking and the per-district SHAP strip plot"""
+    features = load_model(model_file, version[0])['selected_features']
+    scaled = load_model(model_file, version[0])['scaler'].transform(_ev_merged[features])
+    values = load_shap_engine(model_file, version[0]).explain(scaled)
+
+    ranking = pd.DataFrame({'Feature': features, 'Mean |SHAP|': np.abs(values).mean(axis=0)})
+    ranking_chart = alt.Chart(ranking).mark_bar(color=highlight_color).encode(
+        x=alt.X('Mean |SHAP|:Q', title='Mean |SHAP Value| (EV Count)'),
+        y=alt.Y('Feature:N', sort='-x', title='Feature'),
+        tooltip=['Feature', alt.Tooltip('Mean |SHAP|:Q', format=',.1f')]
+    ).properties(height=220)
+
+    strip = pd.DataFrame({
+        'District': np.repeat(_ev_merged['legislative_district'].astype(str).to_numpy(), len(features)),
+        'Feature': np.tile(features, len(scaled)),
+        'SHAP Value': values.ravel(),
+        'Input Value': _ev_merged[features].to_numpy().ravel(),
+        'Input Percentile': _ev_merged[features].rank(pct=True).to_numpy().ravel(), # Color scale comparable across inputs
+        'Jitter': np.random.default_rng(0).uniform(-1, 1, values.size)
+    })
+    strip_chart = alt.Chart(strip).mark_circle(size=45, opacity=0.8).encode(
+        x=alt.X('SHAP Value:Q', title='SHAP Value (EV Count)'),
+        y=alt.Y('Feature:N', sort=ranking.sort_values('Mean |SHAP|', ascending=False)['Feature'].tolist(), title='Feature'),
+        yOffset=alt.YOffset('Jitter:Q', scale=alt.Scale(domain=[-3, 3])),
+        color=alt.Color('Input Percentile:Q', scale=alt.Scale(range=[highlight_color, red_color]), title='Input (percentile)'),
+        tooltip=['District', 'Feature', alt.Tooltip('Input Value:Q', format=',.4g'), alt.Tooltip('SHAP Value:Q', format=',.1f')]
+    ).properties(height=220)
+    return ranking_chart.to_dict(), strip_chart.to_dict()
+
+coalesce.checkpoint()
+with telemetry.timer('batch_shap/summary'):
+    ranking_spec, strip_spec = shap_summary_charts(ev_merged, model_file, (model_version, data_version('ev_merged.pickle')))
+    col1, col2 = st.columns(2)
+    with col1:
+        st.vega_lite_chart(ranking_spec, use_container_width=True)
+    with col2:
+        st.vega_lite_chart(strip_spec, use_container_width=True)
+
+# Predicted EV count of every district on the district map (simplified polygons, see utils/geometry.py)
+@st.cache_data(show_spinner=False)
+def district_predictions(_ev_merged, model_file, version):
+    """Predicted EV count of every district (once per model and dataset version, not per slider change)"""
+    loaded_model = load_model(model_file, version[0])
+    return loaded_model['model'].predict(loaded_model['scaler'].transform(_ev_merged[loaded_model['selected_features']]))
+
+coalesce.checkpoint()
+district_geometry = st.session_state.get('district_geometry')
+if district_geometry is not None:
+    predicted = district_predictions(ev_merged, model_file, (model_version, data_version('ev_merged.pickle')))
+    fig_predicted = district_map(district_geometry[DEFAULT_DETAIL], ev_merged['legislative_district'], predicted,
+                                 'Predicted EV Count by Legislative District', 'Predicted EVs',
+                                 customdata=ev_merged['ev_count'], hover_extra='<br>Actual EVs: %{customdata:,}')
+    plotly_chart(fig_predicted, 'prediction_map')
+
+# Scenario files: predictions and SHAP values for every row of an uploaded CSV
+st.markdown("#### Explain a Scenario File")
+st.write(f"Upload a CSV with the columns {', '.join(f'`{f}`' for f in selected_features)} (in original units, as on the sliders). "\
+         "Every row gets a predicted EV count and its SHAP values; large files are explained in chunks, in parallel where CPUs allow.")
+
+@st.fragment
+def scenario_file():
+    """Batch predictions and SHAP values for an uploaded scenario CSV (computed once per upload)"""
+    uploaded = st.file_uploader("Scenario CSV", type='csv', key='scenario_file')
+    if uploaded is None:
+        return
+
+    result = st.session_state.get('scenario_result')
+    if result is None or (result['file_id'], result['model_version']) != (uploaded.file_id, model_version):
+        scenarios = pd.read_csv(uploaded)
+        missing_columns = [f for f in selected_features if f not in scenarios.columns]
+        if missing_columns:
+            st.error(f"Missing columns: {', '.join(missing_columns)}")
+            return
+        inputs = scenarios[selected_features].apply(pd.to_numeric, errors='coerce')
+        complete = inputs.notna().all(axis=1).to_numpy() # The model does not take missing values
+        scenarios, inputs = scenarios[complete].reset_index(drop=True), inputs[complete]
+        if not len(inputs): # Nothing to explain (the scaler and model reject empty input)
+            st.warning(f"No rows to explain: no row has all inputs numeric (rows skipped: {int((~complete).sum()):,}).")
+            return
+
+        with telemetry.timer('batch_shap/scenarios'):
+            scaled = scaler.transform(inputs)
+            values = np.empty(scaled.shape)
+            progress = st.progress(0.0, text=f"Explaining {len(scaled):,} rows...")
+            for start, chunk in iter_shap_values(scaled, model, model_version):
+                values[start:start + len(chunk)] = chunk
+                progress.progress((start + len(chunk)) / len(scaled), text=f"Explained {start + len(chunk):,} of {len(scaled):,} rows")
+            progress.empty()
+            explained = scenarios.assign(predicted_ev_count=model.predict(scaled))
+            explained[[f'shap_{f}' for f in selected_features]] = values
+        result = {'file_id': uploaded.file_id, 'model_version': model_version, 'explained': explained, 'skipped': int((~complete).sum()),
+                  'csv': explained.to_csv(index=False).encode()}
+        st.session_state['scenario_result'] = result
+
+    explained = result['explained']
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Scenarios Explained", f"{len(explained):,}")
+    col2.metric("Rows Skipped (Missing Values)", f"{result['skipped']:,}")
+    col3.metric("Mean Predicted EV Count", f"{explained['predicted_ev_count'].mean():,.0f}" if len(explained) else "-")
+    if len(explained):
+        ranking = pd.DataFrame({'Feature': selected_features,
+                                'Mean |SHAP|': explained[[f'shap_{f}' for f in selected_features]].abs().mean().to_numpy()})
+        st.altair_chart(alt.Chart(ranking).mark_bar(color=highlight_color).encode(
+            x=alt.X('Mean |SHAP|:Q', title='Mean |SHAP Value| (EV Count)'),
+            y=alt.Y('Feature:N', sort='-x', title='Feature'),
+            tooltip=['Feature', alt.Tooltip('Mean |SHAP|:Q', format=',.1f')]
+        ).properties(height=200), use_container_width=True)
+        st.dataframe(explained.head(1000), hide_index=True, use_container_width=True) # Preview; the download has every row
+    st.download_button("Download predictions and SHAP values", result['csv'], file_name='scenario_shap.csv', mime='text/csv')
+
+coalesce.checkpoint()
+scenario_file()
+
+# ================================== #
+# Global sensitivity (Sobol indices over realistic input ranges, not just the slider position)
+st.divider()
+st.markdown("### Global Sensitivity of the Prediction (Sobol Indices)")
+st.write("SHAP explains one prediction. Sobol indices show how much of the variation in predicted EV counts each input "\
+         "accounts for when all inputs vary together over distributions fitted to the 49 districts. "\
+         "The **first-order** index is the share an input explains on its own; the **total** index adds its interactions with the other inputs.")
+
+@st.cache_data(show_spinner=False)
+def sensitivity_charts(_sobol, version):
+    """Vega-Lite specs of the Sobol charts, built once per analysis (the data only changes with the model or dataset)"""
+    # First-order and total index per input, with bootstrap confidence intervals
+    indices = _sobol['indices']
+    bars = pd.concat([
+        pd.DataFrame({'Feature': indices['feature'], 'Index': 'First-order', 'Value': indices['first_order'],
+                      'Low': indices['first_order_low'], 'High': indices['first_order_high']}),
+        pd.DataFrame({'Feature': indices['feature'], 'Index': 'Total', 'Value': indices['total'],
+                      'Low': indices['total_low'], 'High': indices['total_high']})
+    ])
+    base = alt.Chart(bars).encode(
+        y=alt.Y('Feature:N', sort=alt.EncodingSortField('Value', op='max', order='descending'), title='Feature'),
+        yOffset='Index:N'
+    )
+    sobol_chart = base.mark_bar().encode(
+        x=alt.X('Value:Q', title='Sobol Index'),
+        color=alt.Color('Index:N', scale=alt.Scale(domain=['First-order', 'Total'], range=[highlight_color, unhighlight_color])),
+        tooltip=['Feature', 'Index', alt.Tooltip('Value:Q', format='.3f'), alt.Tooltip('Low:Q', format='.3f'), alt.Tooltip('High:Q', format='.3f')]
+    ) + base.mark_rule().encode(x='Low:Q', x2='High:Q')
+
+    # Convergence: the indices should settle as the sample size grows
+    convergence_chart = alt.Chart(_sobol['convergence']).mark_line(point=True).encode(
+        x=alt.X('samples:Q', scale=alt.Scale(type='log', base=2), title='Base Samples (N)'),
+        y=alt.Y('total:Q', title='Total Sobol Index'),
+        color=alt.Color('feature:N', title='Feature'),
+        tooltip=['feature', 'samples', alt.Tooltip('first_order:Q', format='.3f'), alt.Tooltip('total:Q', format='.3f')]
+    ).properties(title='Convergence of the Total Index')
+    return sobol_chart.properties(height=260).to_dict(), convergence_chart.properties(height=260).to_dict()
+
+coalesce.checkpoint()
+sensitivity_version = data_version(model_file, 'ev_merged.pickle')
+with telemetry.timer('sensitivity/load'):
+    sobol = load_sobol(ev_merged, model_file, sensitivity_version)
+
+with telemetry.timer('sensitivity/render'):
+    sobol_spec, convergence_spec = sensitivity_charts(sobol, sensitivity_version)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.vega_lite_chart(sobol_spec, use_container_width=True)
+        st.caption(f"{sobol['evaluations']:,} model evaluations (Saltelli design, N = {sobol['samples']:,}); "\
+                   f"error bars are {CONFIDENCE:.0%} bootstrap intervals. Input distributions: "\
+                   + ", ".join(f"{feature} ({name})" for feature, name in sobol['distributions'].items()) + ".")
+    with col2:
+        st.vega_lite_chart(convergence_spec, use_container_width=True)
+
+# ================================== #
+# Goal seeking (the prediction run backwards: input needed for a target EV count)
+st.divider()
+st.markdown("### Goal Seek: Input Needed to Reach a Target EV Count")
+st.write("For every legislative district, find the smallest value of one input, raised from the district's current value "\
+         "with all other inputs kept as they are, at which the model predicts the target EV count. "\
+         "The model only changes its prediction at its split points, so the answer is exact, not a slider scan.")
+
+@st.fragment
+def goal_seek():
+    """Needed input value per district for a target EV count"""
+    seeker = load_goal_seeker(ev_merged, model_file, (model_version, data_version('ev_merged.pickle')))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        feature = st.selectbox("Input to raise", list(GOAL_FEATURES), format_func=lambda f: GOAL_FEATURES[f][0], key='goal_feature')
+    with col2:
+        target = st.number_input("Target EV count", min_value=0.0, step=100.0, key='goal_target',
+                                 value=float(np.ceil(ev_merged['ev_count'].quantile(0.75) / 100) * 100))
+    label, display_scale = GOAL_FEATURES[feature]
+
+    with telemetry.timer('goal_seek/solve'):
+        result = seeker.solve(feature, target)
+
+    with telemetry.timer('goal_seek/render'):
+        already = (result['change'] == 0).sum()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Districts Already at Target", f"{already} of {len(result)}")
+        col2.metric("Reachable by Raising the Input", f"{result['reachable'].sum() - already}")
+        col3.metric("Not Reachable", f"{(~result['reachable']).sum()}")
+
+        # Needed increase for the districts that have to move
+        moving = result[result['reachable'] & (result['change'] > 0)]
+        if len(moving):
+            chart = alt.Chart(moving.assign(increase=moving['change'] * display_scale)).mark_bar(color=highlight_color).encode(
+                x=alt.X('increase:Q', title=f'Increase Needed ({label})'),
+                y=alt.Y('legislative_district:N', sort='-x', title='Legislative District'),
+                tooltip=['legislative_district', alt.Tooltip('increase:Q', format=',.2f')]
+            ).properties(height=max(160, 22 * len(moving)))
+            st.altair_chart(chart, use_container_width=True)
+
+        st.dataframe(
+            result.assign(**{c: result[c] * display_scale for c in ['current_value', 'needed_value', 'change']})
+            .sort_values(['reachable', 'change'], ascending=[False, True])
+            .rename(columns={
+                'legislative_district': 'District', 'current_value': f'Current {label}', 'current_prediction': 'Predicted EVs (Current)',
+                'needed_value': f'Needed {label}', 'change': 'Increase Needed', 'predicted_at_needed': 'Predicted EVs (Needed)',
+                'best_prediction': 'Best Reachable Prediction', 'reachable': 'Reachable'
+            }).style.format(precision=2, thousands=','),
+            hide_index=True, use_container_width=True
+        )
+
+coalesce.checkpoint()
+goal_seek()
+
+# ================================== #
+# 2030 adoption outlook (fitted once per data version on the main page, so this section only looks up results)
+st.divider()
+st.markdown("### 2030 Adoption Outlook by Legislative District")
+st.write("Cumulative EV counts by model year are fitted with logistic and Bass diffusion curves for every district; "\
+         "the better-fitting curve projects each district to 2030. "\
+         f"The target below is {TARGET_SHARE:.0%} of each district's fitted saturation level (a modeling threshold, "\
+         "not the state's 2030 sales goal); the gap is how many years after 2030 a district is projected to reach it.")
+
+NOT_REACHED = f"Not reached by {GRID_END_YEAR}"
+
+def format_year(value, spec):
+    """Target year or gap for display (NaN: the curve stays below the target through GRID_END_YEAR)"""
+    return NOT_REACHED if pd.isna(value) else format(value, spec)
+
+@st.fragment
+def adoption_outlook():
+    """Projected 2030 EV count, target gap and adoption curve for the selected district"""
+    forecast = st.session_state.get('district_forecast')
+    if forecast is None:
+        st.info("Adoption forecasts are not available for the current data.")
+        return
+    curves = st.session_state['forecast_curves']
+    history = st.session_state['adoption_history']
+
+    with telemetry.timer('forecast/render'):
+        districts = sorted(forecast['legislative_district'], key=int)
+        district = st.selectbox("Legislative District", ['All districts'] + districts, key='forecast_district')
+
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            if district == 'All districts':
+                latest = forecast['ev_count_latest'].sum()
+                projected = forecast['projected_2030'].sum()
+                on_track = (forecast['target_gap_years'] <= 0).sum()
+                st.metric("Projected EVs in 2030", f"{projected:,.0f}", delta=f"{projected - latest:+,.0f} vs. today")
+                st.metric("Share of Saturation by 2030", f"{projected / forecast['saturation'].sum():.0%}")
+                st.metric(f"Districts at {TARGET_SHARE:.0%} of Saturation by 2030", f"{on_track} of {len(forecast)}")
+                observed, projected_curve = history.sum(axis=1), curves.sum(axis=1)
+            else:
+                row = forecast.set_index('legislative_district').loc[district]
+                gap = row['target_gap_years']
+                st.metric("Projected EVs in 2030", f"{row['projected_2030']:,.0f}",
+                          delta=f"{row['projected_2030'] - row['ev_count_latest']:+,.0f} vs. today")
+                st.metric("Share of Saturation by 2030", f"{row['share_of_saturation_2030']:.0%}")
+                if pd.isna(gap):
+                    st.metric(f"Gap to {TARGET_SHARE:.0%} of Saturation", NOT_REACHED)
+                else:
+                    st.metric(f"Gap to {TARGET_SHARE:.0%} of Saturation", "On track" if gap <= 0 else f"{gap:.1f} years behind",
+                              delta=None if gap <= 0 else f"reached around {row['target_reached_year']:.0f}",
+                              delta_color='off')
+                st.caption(f"{row['model']} curve, R² = {row['r_squared']:.3f}")
+                if row['saturation_at_bound']:
+                    st.caption("Adoption is still growing exponentially here, so the saturation level "\
+                               "and target year are lower bounds.")
+                observed, projected_curve = history[district], curves[district]
+
+        with col2:
+            chart_data = pd.concat([
+                pd.DataFrame({'Year': observed.index, 'EV Count': observed.to_numpy(), 'Series': 'Observed'}),
+                pd.DataFrame({'Year': projected_curve.index, 'EV Count': projected_curve.to_numpy(), 'Series': 'Projected'})
+            ])
+            lines = alt.Chart(chart_data).mark_line(point=True).encode(
+                x=alt.X('Year:O', title='Model Year'),
+                y=alt.Y('EV Count:Q', title='Cumulative EV Count'),
+                color=alt.Color('Series:N', scale=alt.Scale(domain=['Observed', 'Projected'], range=[highlight_color, red_color])),
+                strokeDash=alt.condition(alt.datum.Series == 'Projected', alt.value([4, 3]), alt.value([1, 0])),
+                tooltip=['Year', 'Series', alt.Tooltip('EV Count:Q', format=',.0f')]
+            )
+            target = alt.Chart(pd.DataFrame({'Year': [2030]})).mark_rule(color='gray', strokeDash=[2, 2]).encode(x='Year:O')
+            st.altair_chart((lines + target).properties(height=350), use_container_width=True)
+
+        with st.expander(f"All districts, sorted by gap to {TARGET_SHARE:.0%} of saturation"):
+            st.dataframe(
+                forecast.sort_values('target_gap_years', ascending=False, na_position='first')[[
+                    'legislative_district', 'model', 'ev_count_latest', 'projected_2030',
+                    'share_of_saturation_2030', 'target_reached_year', 'target_gap_years', 'r_squared'
+                ]].rename(columns={
+                    'legislative_district': 'District', 'model': 'Curve', 'ev_count_latest': 'EV Count (Today)',
+                    'projected_2030': 'Projected 2030', 'share_of_saturation_2030': 'Share of Saturation 2030',
+                    'target_reached_year': f'{TARGET_SHARE:.0%} of Saturation Reached', 'target_gap_years': 'Gap (Years)',
+                    'r_squared': 'R²'
+                }).style.format({
+                    'EV Count (Today)': '{:,.0f}', 'Projected 2030': '{:,.0f}', 'Share of Saturation 2030': '{:.0%}',
+                    f'{TARGET_SHARE:.0%} of Saturation Reached': lambda v: format_year(v, '.0f'),
+                    'Gap (Years)': lambda v: format_year(v, '+.1f'), 'R²': '{:.3f}'
+                }),
+                hide_index=True, use_container_width=True
+            )
+
+coalesce.checkpoint()
+adoption_outlook()
+
 # ================================== #
 # Add a sidebar for additional information or controls
 st.sidebar.header("Usage Guide")
@@ -348,6 +759,10 @@ st.sidebar.markdown("""
 - Use sliders to adjust key input variables.
 - Observe real-time EV count predictions.
 - Examine SHAP values to understand feature impacts.
+- See SHAP values for every district, or upload a CSV of scenarios to explain them all.
+- Compare global (Sobol) sensitivity of the prediction to each input.
+- Goal-seek the charger density or income each district needs for a target EV count.
+- Check each district's projected 2030 adoption and when it reaches 90% of its fitted saturation level.
 - Experiment with different scenarios to explore potential EV adoption trends.
 """)
 
@@ -372,3 +787,7 @@ with col1:
 with col2:
     st.markdown("### License")
     st.write("MIT")
+
+# ================================== #
+# Record whole-page render time
+telemetry.record('page/EV Prediction', (time.perf_counter() - page_start) * 1000)
@@ -0,0 +1,146 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import json
+
+import pandas as pd
+import streamlit as st
+import plotly.express as px
+
+from utils import telemetry
+
+# ================================== #
+# Global setting
+
+# Set page config
+st.set_page_config(page_title="Washington EV Adoption Insights", page_icon=":battery:", layout="wide")
+# emoji: https://streamlit-emoji-shortcodes-streamlit-app-gwckff.streamlit.app/
+
+# Adjust sizes
+st.markdown("""
+    <style>
+    /* Adjust the body font size */
+    /* Reduces font size to 80% of default */
+    html, body, [data-testid="stAppViewContainer"] {
+        font-size: 80%;
+    }
+
+    /* Reduces the heading size */
+    /* 
+    h1, h2, h3, h4, h5, h6 {
+        font-size: 100%;
+    }
+    */
+
+    /* Scale down Plotly charts */
+    /* 
+    [data-testid="stPlotlyChart"] {
+        transform: scale(0.8); 
+    */
+    }
+    </style>
+""", unsafe_allow_html=True)
+telemetry.hide_diagnostics_link() # Diagnostics stays reachable by URL only
+
+highlight_color = '#0068C9'
+unhighlight_color = 'lightgray'
+
+# ================================== #
+# Render telemetry (hidden page: reachable at /Diagnostics, not listed in the navigation)
+st.title("Diagnostics")
+st.markdown("### Render Telemetry")
+st.write("Per-chart and per-stage timings collected by this server process since it started.")
+
+snapshot = telemetry.snapshot()
+histograms = snapshot['histograms']
+
+if not histograms:
+    st.info("No timings recorded yet. Open the EV Analysis or EV Prediction page first.")
+else:
+    # Summary table, slowest (by total time) first
+    metrics = pd.DataFrame([
+        {'metric': name, **{k: v for k, v in summary.items() if k != 'buckets'}}
+        for name, summary in histograms.items()
+    ]).sort_values('total', ascending=False)
+    st.dataframe(metrics.style.format(precision=2), hide_index=True)
+
+    # p50/p90 per metric
+    fig_percentiles = px.bar(
+        metrics[metrics['unit'] == 'ms'].melt(id_vars='metric', value_vars=['p50', 'p90'], var_name='percentile', value_name='ms'),
+        x='ms',
+        y='metric',
+        color='percentile',
+        barmode='group',
+        orientation='h',
+        title='Median and 90th Percentile Time by Metric (ms)',
+        color_discrete_map={'p50': highlight_color, 'p90': 'lightgray'}
+    )
+    fig_percentiles.update_layout(yaxis_title='', legend_title_text='', height=max(300, 30 * len(metrics)))
+    st.plotly_chart(fig_percentiles)
+
+    # Bucket histogram for one metric
+    selected_metric = st.selectbox("Histogram for metric", list(histograms))
+    buckets = histograms[selected_metric]['buckets']
+    fig_buckets = px.bar(
+        x=list(buckets.keys()),
+        y=list(buckets.values()),
+        title=f"Distribution of '{selected_metric}' ({histograms[selected_metric]['unit']})",
+        labels={'x': 'Bucket (upper bound)', 'y': 'Count'}
+    )
+    fig_buckets.update_traces(marker_color=highlight_color)
+    st.plotly_chart(fig_buckets)
+
+if snapshot['counters']:
+    st.markdown("### Counters")
+    st.dataframe(pd.Series(snapshot['counters'], name='count').rename_axis('counter').reset_index(), hide_index=True)
+
+if 'prediction/latency' in histograms:
+    # Slider drags on the prediction page: superseded reruns vs. runs that rendered, and how long the user waited
+    st.markdown("### Prediction Rerun Coalescing")
+    latency = histograms['prediction/latency']
+    counters = snapshot['counters']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Completed Runs", f"{counters.get('prediction/completed_runs', 0):,}")
+    col2.metric("Dropped Reruns", f"{counters.get('prediction/dropped_reruns', 0):,}")
+    col3.metric("Latency p50 (ms)", f"{latency['p50']:.1f}")
+    col4.metric("Latency p99 (ms)", f"{latency['p99']:.1f}")
+
+if 'ev_memory_report' in st.session_state:
+    st.markdown("### EV Table Memory Footprint")
+    st.dataframe(st.session_state['ev_memory_report'].style.format(precision=2), hide_index=True)
+
+# Machine-readable dump
+st.markdown("### Raw Dump")
+col1, col2 = st.columns([1, 1])
+with col1:
+    st.download_button("Download telemetry JSON", json.dumps(snapshot, indent=2), file_name='telemetry.json', mime='application/json')
+with col2:
+    # Metrics are shared by every session of this process, so resetting them is off unless the operator enables it
+    if telemetry.RESET_ENABLED:
+        if st.button("Reset telemetry"):
+            telemetry.reset()
+            st.rerun()
+    else:
+        st.caption("Reset is disabled (set `EV_TELEMETRY_RESET=1` to enable it).")
+with st.expander("JSON"):
+    st.json(snapshot)
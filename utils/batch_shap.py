@@ -0,0 +1,195 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.data import cache_path
+from utils.goal_seek import interval_of, interval_points
+
+# ================================== #
+# Batch TreeSHAP for many rows (all districts, uploaded scenario files)
+# shap's path-dependent TreeSHAP walks every tree for every row (~250 us per row for the 500-tree model).
+# A tree's SHAP vector only depends on which side of each of its splits a row falls, so each depth-3 tree has
+# at most 2^7 distinct answers: one per cell of the grid its own thresholds cut. Each cell is explained once
+# with shap's own C routine (a representative point per cell), and a row is then explained by looking up its
+# cell in every tree. Rows with missing values go through the C routine directly.
+# The tables are written once per model version as .npy files; worker processes memory-map them read-only
+# and explain chunks of rows, which are streamed back in order.
+
+TREE_ARRAYS = ['children_left', 'children_right', 'children_default', 'features', 'thresholds', 'values', 'node_sample_weight']
+ENGINE_ARRAYS = ['thresholds', 'cell_map', 'cell_table'] + [f'tree_{name}' for name in TREE_ARRAYS]
+CHUNK_ROWS = 2 ** 14 # Rows per task
+
+def tree_shap(tree, X, tree_slice=slice(None), base_offset=0.0):
+    """shap's C TreeSHAP over the given trees; returns (n, d + 1) with the expected value in the last column"""
+    # Imported here: workers only look up cell tables, and importing shap would dominate their start-up
+    from shap.explainers._tree import _cext, feature_perturbation_codes, output_transform_codes
+    X = np.ascontiguousarray(X, dtype=np.float32) # As shap casts rows for sklearn models
+    arrays = [np.ascontiguousarray(tree[name][tree_slice]) for name in TREE_ARRAYS]
+    phi = np.zeros((len(X), X.shape[1] + 1, 1))
+    _cext.dense_tree_shap(*arrays, int(tree['max_depth']), X, np.isnan(X), None, None, None, len(arrays[0]),
+                          np.atleast_1d(np.float64(base_offset)), phi,
+                          feature_perturbation_codes['tree_path_dependent'], # What shap.Explainer(model) uses without background data
+                          output_transform_codes['identity'], False)
+    return phi[:, :, 0]
+
+class BatchTreeShap:
+    """Path-dependent TreeSHAP values (same as shap.Explainer(model)) for many rows, from per-tree cell tables"""
+    def __init__(self, arrays, meta):
+        self.thresholds = arrays['thresholds'] # (d, max thresholds) per input, padded with inf
+        self.cell_map = arrays['cell_map'] # (trees, d, intervals): global interval -> offset of the tree's cell
+        self.cell_table = arrays['cell_table'] # (trees, cells, d + 1): SHAP vector per cell
+        self.tree = {name: arrays[f'tree_{name}'] for name in TREE_ARRAYS}
+        self.tree['max_depth'] = meta['max_depth']
+        self.expected_value = meta['expected_value']
+        self.base_offset = meta['base_offset']
+        self.used = np.array(meta['used'], dtype=bool) # (trees, d): inputs split on in each tree
+
+    @classmethod
+    def build(cls, model):
+        """Flatten the model with shap and explain every cell of every tree"""
+        import shap
+        tree_model = shap.TreeExplainer(model).model
+        tree = {name: getattr(tree_model, name) for name in TREE_ARRAYS}
+        tree['max_depth'] = tree_model.max_depth
+        n_trees, d = tree['features'].shape[0], model.n_features_in_
+        internal = tree['children_left'] >= 0
+
+        # Global thresholds per input (union over trees), padded so every input has the same length
+        per_input = [np.unique(tree['thresholds'][internal & (tree['features'] == f)]) for f in range(d)]
+        thresholds = np.full((d, max(len(t) for t in per_input)), np.inf)
+        for f, values in enumerate(per_input):
+            thresholds[f, :len(values)] = values
+
+        local = [[np.unique(tree['thresholds'][t][internal[t] & (tree['features'][t] == f)]) for f in range(d)] for t in range(n_trees)]
+        used = np.array([[len(local[t][f]) > 0 for f in range(d)] for t in range(n_trees)])
+        max_cells = max(int(np.prod([len(values) + 1 for values in local[t]])) for t in range(n_trees))
+        cell_map = np.zeros((n_trees, d, thresholds.shape[1] + 1), dtype=np.int32)
+        cell_table = np.zeros((n_trees, max_cells, d + 1))
+        for t in range(n_trees):
+            # Cells of tree t: every combination of intervals of its own thresholds, in mixed-radix order
+            sizes = [len(values) + 1 for values in local[t]]
+            strides = np.cumprod([1] + sizes[:-1])
+            for f in range(d):
+                points = interval_points(thresholds[f, :len(per_input[f])]) if len(per_input[f]) else np.zeros(1)
+                cell_map[t, f, :len(points)] = interval_of(points, local[t][f]) * strides[f]
+            grid = np.array(list(itertools.product(*[
+                interval_points(values) if len(values) else np.zeros(1) for values in reversed(local[t])
+            ])))[:, ::-1] # Last input varies slowest, matching the strides
+            cell_table[t, :len(grid)] = tree_shap(tree, grid, slice(t, t + 1))
+
+        base_offset = float(np.ravel(tree_model.base_offset)[0])
+        arrays = {'thresholds': thresholds, 'cell_map': cell_map, 'cell_table': cell_table,
+                  **{f'tree_{name}': tree[name] for name in TREE_ARRAYS}}
+        meta = {'max_depth': int(tree['max_depth']), 'base_offset': base_offset,
+                'expected_value': base_offset + float(cell_table[:, 0, d].sum()), 'used': used.tolist()}
+        return cls(arrays, meta)
+
+    def save(self, folder):
+        """Write the arrays as .npy files (memory-mapped by the workers) and the metadata as JSON"""
+        os.makedirs(folder, exist_ok=True)
+        arrays = {'thresholds': self.thresholds, 'cell_map': self.cell_map, 'cell_table': self.cell_table,
+                  **{f'tree_{name}': self.tree[name] for name in TREE_ARRAYS}}
+        for name, array in arrays.items():
+            np.save(os.path.join(folder, f'{name}.npy'), array)
+        meta = {'max_depth': self.tree['max_depth'], 'base_offset': self.base_offset,
+                'expected_value': self.expected_value, 'used': self.used.tolist()}
+        # Metadata last and atomically: a folder without it is incomplete and gets rebuilt
+        with open(os.path.join(folder, 'meta.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(folder, 'meta.tmp'), os.path.join(folder, 'meta.json'))
+
+    @classmethod
+    def load(cls, folder):
+        """Engine with its arrays memory-mapped read-only from a saved folder"""
+        with open(os.path.join(folder, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r') for name in ENGINE_ARRAYS}
+        return cls(arrays, meta)
+
+    def explain(self, X):
+        """SHAP values (n, d) for scaled input rows"""
+        X = np.asarray(X, dtype=float)
+        intervals = np.column_stack([interval_of(X[:, f], self.thresholds[f]) for f in range(X.shape[1])])
+        phi = np.zeros((len(X), X.shape[1] + 1))
+        for t, used in enumerate(self.used):
+            cell = 0
+            for f in np.flatnonzero(used):
+                cell = cell + self.cell_map[t, f][intervals[:, f]]
+            phi += self.cell_table[t][cell]
+        missing = np.isnan(X).any(axis=1)
+        if missing.any():
+            phi[missing] = tree_shap(self.tree, X[missing]) # Missing values follow each node's default branch
+        return phi[:, :-1]
+
+# ================================== #
+# Process-pool explanation
+
+_engine = None # Engine of a pool worker process only (never set in the app server, which serves several models)
+
+def _load_worker(folder):
+    """Pool initializer: memory-map the engine arrays once per worker"""
+    global _engine
+    _engine = BatchTreeShap.load(folder)
+
+def _explain_chunk(task):
+    """Explain one chunk of rows (runs in a worker)"""
+    start, rows = task
+    return start, _engine.explain(rows)
+
+def engine_folder(version):
+    """Cache folder of the engine arrays for one model version"""
+    return os.path.dirname(cache_path('batch_shap', version, 'meta.json'))
+
+def load_engine(model, version):
+    """Engine for this model version, built and saved on the first use"""
+    folder = engine_folder(version)
+    if not os.path.exists(os.path.join(folder, 'meta.json')):
+        BatchTreeShap.build(model).save(folder)
+    return BatchTreeShap.load(folder)
+
+def iter_shap_values(X, model, version, workers=None, chunk_rows=CHUNK_ROWS):
+    """Yield (first row, SHAP values) chunk by chunk, in row order, as soon as each chunk is explained"""
+    X = np.asarray(X, dtype=float)
+    tasks = [(start, X[start:start + chunk_rows]) for start in range(0, len(X), chunk_rows)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    engine = load_engine(model, version) # Rebuilt if cache/ was cleared; workers map the same folder
+    if workers <= 1:
+        # In-process: a local engine, so concurrent sessions explaining other model versions cannot swap it
+        for start, rows in tasks:
+            yield start, engine.explain(rows)
+        return
+    # Spawned (not forked) workers: the app server is multi-threaded, and a forked worker could inherit a held lock
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker, initargs=(engine_folder(version),),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        yield from pool.map(_explain_chunk, tasks)
+
+def shap_values(X, model, version, workers=None):
+    """SHAP values (n, d) for all rows"""
+    return np.concatenate([values for _, values in iter_shap_values(X, model, version, workers)]) if len(X) else np.zeros((0, np.shape(X)[1]))
@@ -0,0 +1,80 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import time
+
+import streamlit as st
+
+from utils import telemetry
+
+STALE_SECONDS = 5.0 # A run in flight for longer than this was abandoned (e.g. the user left the page), not superseded
+
+# ================================== #
+# Rerun coalescing (prediction page)
+# Each slider change queues a rerun. Streamlit stops a running script for the newer rerun, but only at
+# yield points: st.* calls and session-state access. The expensive prediction stages make no st.* calls,
+# so checkpoint() adds an explicit yield point between them. A superseded run then stops at the next
+# stage boundary, and only the latest slider state is computed to the end.
+# RunTracker keeps an in-flight flag per session. A run that starts while the flag is still set means
+# the previous run was interrupted, so it is counted as dropped. Latency is measured from the first
+# input of a burst, because that is how long the user waited for a result.
+
+class RunTracker:
+    """In-flight flag, dropped-run counter and latency of one pipeline, kept in a per-session dict"""
+    def __init__(self, state, name):
+        self.state = state
+        self.name = name
+        state.setdefault('in_flight', False)
+        state.setdefault('dropped', 0) # Runs superseded before they finished
+        state.setdefault('completed', 0)
+
+    def begin(self):
+        """Start a run; a run still in flight was superseded by this one"""
+        now = time.perf_counter()
+        if self.state['in_flight'] and now - self.state['run_start'] < STALE_SECONDS:
+            self.state['dropped'] += 1
+            telemetry.count(f'{self.name}/dropped_reruns')
+        else:
+            self.state['burst_start'] = now # First input of a new burst
+        self.state['in_flight'] = True
+        self.state['run_start'] = now
+
+    def finish(self):
+        """Mark the run complete and record its latency (ms): compute time and time since the burst began"""
+        now = time.perf_counter()
+        telemetry.record(f'{self.name}/compute', (now - self.state['run_start']) * 1000)
+        telemetry.record(f'{self.name}/latency', (now - self.state['burst_start']) * 1000)
+        telemetry.count(f'{self.name}/completed_runs')
+        self.state['in_flight'] = False
+        self.state['completed'] += 1
+
+def session_tracker(name):
+    """RunTracker stored in this session's state"""
+    key = f'_coalesce/{name}'
+    if key not in st.session_state:
+        st.session_state[key] = {}
+    return RunTracker(st.session_state[key], name)
+
+def checkpoint():
+    """Yield point: if a newer rerun is already queued, Streamlit stops this run here"""
+    return '_coalesce' in st.session_state # Session-state access is a yield point
@@ -0,0 +1,91 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import shutil
+import hashlib
+
+import plotly
+import streamlit.components.v1 as components
+
+from utils import telemetry
+from utils.data import CACHE_DIR
+from utils.figures import figure_json
+
+# ================================== #
+# District highlight component
+# Each figure is written once as a static JSON file served next to the component page;
+# on a selection change only the selected district ids travel to the browser, where the
+# figure is restyled in place (see utils/frontend/district_highlight.html).
+
+FRONTEND_HTML = os.path.join(os.path.dirname(__file__), 'frontend', 'district_highlight.html')
+COMPONENT_DIR = os.path.abspath(os.path.join(CACHE_DIR, 'components', 'district_highlight')) # Served as static files
+FIGURE_DIR = 'figures' # Figure JSON files, relative to COMPONENT_DIR
+
+def build_component_dir():
+    """Assemble the static folder: component page, Plotly.js bundle and figure folder"""
+    os.makedirs(os.path.join(COMPONENT_DIR, FIGURE_DIR), exist_ok=True)
+
+    # Versioned bundle name, so a Plotly upgrade is never served from a stale browser cache
+    plotly_js = f'plotly-{plotly.__version__}.min.js'
+    if not os.path.exists(os.path.join(COMPONENT_DIR, plotly_js)):
+        shutil.copyfile(os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js'),
+                        os.path.join(COMPONENT_DIR, plotly_js))
+
+    with open(FRONTEND_HTML, encoding='utf-8') as f:
+        page = f.read().replace('__PLOTLY_JS__', plotly_js)
+    with open(os.path.join(COMPONENT_DIR, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(page)
+
+build_component_dir()
+_district_highlight = components.declare_component('district_highlight', path=COMPONENT_DIR)
+
+def save_figure(fig, folder=None):
+    """Write a figure as a static file (named by its content hash, optionally in a subfolder) and return its URL"""
+    payload = figure_json(fig, template=False) # Styled by the component to match the app theme
+
+    name = hashlib.sha1(payload.encode()).hexdigest()[:16] + '.json'
+    if folder:
+        name = f'{folder}/{name}'
+        os.makedirs(os.path.join(COMPONENT_DIR, FIGURE_DIR, folder), exist_ok=True)
+    path = os.path.join(COMPONENT_DIR, FIGURE_DIR, name)
+    if not os.path.exists(path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    return f'{FIGURE_DIR}/{name}'
+
+def district_chart(figure_url, selected_districts, unhighlight_color='lightgray', key=None):
+    """Show a saved district figure with the selected districts highlighted"""
+    args = {
+        'figure_url': figure_url,
+        'selected': [str(d) for d in selected_districts],
+        'unhighlight_color': unhighlight_color
+    }
+    if telemetry.PAYLOADS:
+        # Per rerun only the args travel; the figure file is fetched once per figure version
+        telemetry.record(f'payload/{key}', len(json.dumps(args)), unit='B')
+        telemetry.record(f'payload/{key}/figure', os.path.getsize(os.path.join(COMPONENT_DIR, figure_url)), unit='B')
+    return _district_highlight(**args, key=key, default=None)
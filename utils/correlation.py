@@ -0,0 +1,124 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# ================================== #
+# Correlations between district features (ev_merged)
+# Pearson, Spearman and partial correlations for any district subset. Several subsets are computed in one
+# batched pass: each subset is a row of a 0/1 mask, and means, covariances and within-subset ranks are
+# einsum contractions over that mask. Results are memoized per (subset, party, method).
+
+METHODS = ['Pearson', 'Spearman', 'Partial']
+MIN_DISTRICTS = 3 # Fewer districts give no meaningful correlation
+# Default heatmap variables (the remaining numeric columns can be added in the page)
+KEY_FEATURES = [
+    'ev_count', 'median_household_income', 'charger_count', 'charger_ev_ratio', 'registered_voters',
+    '%_turnout', 'dem_votes', 'rep_votes', 'voters_18_24', 'voters_over_65'
+]
+
+def numeric_columns(ev_merged):
+    """Numeric feature columns of ev_merged"""
+    return ev_merged.select_dtypes('number').columns.tolist()
+
+def batch_pearson(values, masks):
+    """Pearson correlation matrices (k, p, p) within each row of masks (k, n); values is (n, p) or per subset (k, n, p)"""
+    values = np.broadcast_to(values, (len(masks),) + values.shape[-2:])
+    means = np.einsum('kn,knp->kp', masks, values) / masks.sum(axis=1)[:, None]
+    centered = values - means[:, None, :]
+    cov = np.einsum('kn,kni,knj->kij', masks, centered, centered)
+    std = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / (std[:, :, None] * std[:, None, :])
+    return np.clip(corr, -1, 1) # Constant columns stay NaN
+
+def batch_ranks(values, masks):
+    """Average ranks (ties share the mean rank) of each column within each subset, shape (k, n, p)"""
+    # Pairwise comparisons once for all subsets: below[i, j, c] = values[j, c] < values[i, c]
+    below = (values[None, :, :] < values[:, None, :]).astype(float)
+    ties = (values[None, :, :] == values[:, None, :]).astype(float)
+    rank_below = np.einsum('kj,ijc->kic', masks, below)
+    tied = np.einsum('kj,ijc->kic', masks, ties) # Includes the value itself
+    return rank_below + (tied + 1) / 2 # Rows outside a subset are ignored through the mask
+
+def partial_from_pearson(corr):
+    """Partial correlations (each pair controlling for all other variables) from the precision matrices"""
+    precision = np.linalg.pinv(np.nan_to_num(corr), hermitian=True)
+    scale = np.sqrt(np.abs(np.diagonal(precision, axis1=1, axis2=2)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        partial = -precision / (scale[:, :, None] * scale[:, None, :])
+    idx = np.arange(corr.shape[-1])
+    partial[:, idx, idx] = 1.0
+    return np.clip(partial, -1, 1)
+
+def batch_correlations(values, masks, method='Pearson'):
+    """Correlation matrices (k, p, p) of values (n, p) for every subset mask (k, n)"""
+    masks = np.atleast_2d(masks).astype(float)
+    if method == 'Spearman':
+        return batch_pearson(batch_ranks(values, masks), masks)
+    corr = batch_pearson(values, masks)
+    return partial_from_pearson(corr) if method == 'Partial' else corr
+
+# ================================== #
+# Memoized service used by the pages
+
+class CorrelationService:
+    """Correlation matrices of ev_merged's numeric columns, memoized per (districts, party, method, columns)"""
+    def __init__(self, ev_merged, columns=None):
+        self.columns = columns or numeric_columns(ev_merged)
+        self.districts = ev_merged['legislative_district'].astype(str).to_numpy()
+        self.parties = ev_merged['party_won'].astype(str).to_numpy()
+        self.values = ev_merged[self.columns].to_numpy(float)
+        self._matrices = lru_cache(maxsize=256)(self._compute)
+
+    def mask(self, districts=None, party=None):
+        """Row mask for a district subset and/or winning party (None = all)"""
+        mask = np.ones(len(self.districts), bool)
+        if districts:
+            mask &= np.isin(self.districts, [str(d) for d in districts])
+        if party:
+            mask &= self.parties == party
+        return mask
+
+    def _compute(self, districts, party, method, columns):
+        positions = [self.columns.index(c) for c in columns]
+        mask = self.mask(districts, party)
+        if mask.sum() < max(MIN_DISTRICTS, len(columns) + 2 if method == 'Partial' else 0):
+            return None # Too few districts (partial correlations need more districts than variables)
+        return batch_correlations(self.values[:, positions], mask, method)[0]
+
+    def matrix(self, method='Pearson', districts=None, party=None, columns=None):
+        """Correlation matrix as a DataFrame (None when the subset has too few districts)"""
+        columns = tuple(columns or self.columns)
+        key = tuple(sorted(str(d) for d in districts)) if districts else None
+        corr = self._matrices(key, party or None, method, columns)
+        return None if corr is None else pd.DataFrame(corr, index=list(columns), columns=list(columns))
+
+    def matrices(self, subsets, method='Pearson', columns=None):
+        """Matrices for several district subsets in one batched pass, shape (k, p, p)"""
+        positions = [self.columns.index(c) for c in (columns or self.columns)]
+        masks = np.stack([self.mask(districts) for districts in subsets])
+        return batch_correlations(self.values[:, positions], masks, method)
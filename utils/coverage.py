@@ -0,0 +1,134 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from utils.data import data_path, cache_path, data_version, load_pickle, save_pickle
+
+# ================================== #
+# Nearest-charger coverage for every registered EV
+
+EARTH_RADIUS_KM = 6371.0088 # Mean Earth radius
+COVERAGE_RADIUS_KM = 5.0 # Radius used for the "chargers nearby" count
+CHUNK_SIZE = 100_000 # EVs queried per KD-tree chunk (bounds temporary memory)
+CACHE_FORMAT = 1 # Bump when the cached coverage columns change, so older pickles in cache/ are not reused
+
+def parse_points(points):
+    """Parse WKT 'POINT (lon lat)' strings into an (n, 2) lon/lat float array (NaN if missing)"""
+    pattern = r'POINT \(\s*([-+\d.eE]+)\s+([-+\d.eE]+)\s*\)'
+    if isinstance(points.dtype, pd.CategoricalDtype):
+        # Parse each distinct location once, then broadcast through the category codes
+        categories = pd.Series(points.cat.categories, dtype='string')
+        coords = categories.str.extract(pattern).astype(float).to_numpy()
+        coords = np.vstack([coords, [np.nan, np.nan]]) # Code -1 (missing) maps to the last row
+        return coords[points.cat.codes.to_numpy()]
+    return points.astype('string').str.extract(pattern).astype(float).to_numpy()
+
+def to_unit_xyz(lon, lat):
+    """Convert lon/lat degrees to 3D unit vectors, so Euclidean KD-tree distances map to great-circle ones"""
+    lon, lat = np.radians(lon), np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+def chord_to_km(chord):
+    """Chord length on the unit sphere -> great-circle distance in km"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+def km_to_chord(km):
+    """Great-circle distance in km -> chord length on the unit sphere"""
+    return 2 * np.sin(km / (2 * EARTH_RADIUS_KM))
+
+def compute_charger_coverage(ev, charger, radius_km=COVERAGE_RADIUS_KM, chunk_size=CHUNK_SIZE):
+    """Nearest charger and chargers within radius_km for every EV (derived columns aligned to ev.index)"""
+    # KD-tree over charger stations
+    stations = charger.dropna(subset=['latitude', 'longitude'])
+    tree = cKDTree(to_unit_xyz(stations['longitude'].to_numpy(), stations['latitude'].to_numpy()))
+    station_ids = stations['id'].to_numpy()
+
+    # EV coordinates (rows without a location keep NaN / -1)
+    lon_lat = parse_points(ev['vehicle_location'])
+    valid = np.flatnonzero(~np.isnan(lon_lat).any(axis=1))
+
+    nearest_km = np.full(len(ev), np.nan, dtype=np.float32)
+    nearest_id = np.full(len(ev), -1, dtype=np.int64)
+    nearby_count = np.zeros(len(ev), dtype=np.int32)
+    radius_chord = km_to_chord(radius_km)
+
+    # Query in chunks so only one chunk of 3D points is materialized at a time
+    for start in range(0, len(valid), chunk_size):
+        rows = valid[start:start + chunk_size]
+        xyz = to_unit_xyz(lon_lat[rows, 0], lon_lat[rows, 1])
+        chord, idx = tree.query(xyz, k=1, workers=-1)
+        nearest_km[rows] = chord_to_km(chord)
+        nearest_id[rows] = station_ids[idx]
+        nearby_count[rows] = tree.query_ball_point(xyz, r=radius_chord, return_length=True, workers=-1)
+
+    return pd.DataFrame({
+        'nearest_charger_km': nearest_km,
+        'nearest_charger_id': nearest_id,
+        f'chargers_within_{radius_km:g}km': nearby_count
+    }, index=ev.index)
+
+def summarize_coverage(ev, coverage, by='legislative_district'):
+    """Distance distribution to the nearest charger per group (district, census tract, ...)"""
+    nearby_col = [col for col in coverage.columns if col.startswith('chargers_within_')][0]
+    df = coverage.assign(
+        group=ev[by].to_numpy(),
+        within_1km=coverage['nearest_charger_km'] <= 1.0
+    ).dropna(subset=['nearest_charger_km'])
+    grouped = df.groupby('group', observed=True)
+
+    summary = pd.DataFrame({
+        'ev_count': grouped.size(),
+        'mean_km': grouped['nearest_charger_km'].mean(),
+        'median_km': grouped['nearest_charger_km'].median(),
+        'p90_km': grouped['nearest_charger_km'].quantile(0.9),
+        'max_km': grouped['nearest_charger_km'].max(),
+        'share_within_1km': grouped['within_1km'].mean(),
+        f'avg_{nearby_col}': grouped[nearby_col].mean()
+    })
+    summary.index.name = by
+    return summary.reset_index()
+
+# ================================== #
+# Cached derived column set
+
+def coverage_version(ev_file='ev.pickle'):
+    """Cache key of the coverage columns: EV and charger data versions plus the cache format"""
+    return f"{data_version(ev_file, 'charger.pickle')}_v{CACHE_FORMAT}"
+
+def load_coverage(ev, ev_file='ev.pickle'):
+    """Load the persisted coverage columns for this data version, computing and saving them on a miss"""
+    path = cache_path(f'ev_coverage_{coverage_version(ev_file)}.pickle')
+    try:
+        coverage = load_pickle(path)
+        if coverage.index.equals(ev.index):
+            return coverage
+    except (FileNotFoundError, EOFError):
+        pass
+    charger = load_pickle(data_path('charger.pickle'))
+    coverage = compute_charger_coverage(ev, charger)
+    save_pickle(coverage, path)
+    return coverage
@@ -0,0 +1,65 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import pickle
+import hashlib
+
+# ================================== #
+# Paths and data versioning
+
+DATA_DIR = 'data_processed' # Processed datasets and model artifacts
+CACHE_DIR = 'cache' # Derived artifacts; safe to delete, rebuilt on demand
+
+def data_path(name):
+    """Path of a file in the processed data folder"""
+    return os.path.join(DATA_DIR, name)
+
+def cache_path(*parts):
+    """Path inside the cache folder, creating parent folders as needed"""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def data_version(*names):
+    """Short fingerprint (size and mtime) of data files, used to key derived caches"""
+    digest = hashlib.sha1()
+    for name in names:
+        try:
+            stat = os.stat(data_path(name))
+            digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+        except FileNotFoundError:
+            digest.update(f'{name}:missing;'.encode()) # Missing files still produce a stable key
+    return digest.hexdigest()[:12]
+
+def load_pickle(path):
+    """Load a pickled object"""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def save_pickle(obj, path):
+    """Pickle an object atomically (write to a temp file, then rename)"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
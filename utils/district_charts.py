@@ -0,0 +1,259 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import statsmodels.api as sm
+import plotly.express as px
+
+# ================================== #
+# District charts (EV Analysis sections 3-5)
+# Built once per dataset version in their no-selection state; district selection is
+# applied in the browser by the highlight component (utils/components.py), which reads
+# the 'highlight' / 'trendline' metadata attached to each trace below.
+
+HIGHLIGHT_COLOR = '#0068C9'
+UNHIGHLIGHT_COLOR = 'lightgray'
+PARTY_COLORS = {'Democratic': '#0068C9', 'Republican': '#D32F2F'} # Material design red; modern UI
+
+# Axis labels for the Section 4 charger variables
+X_LABELS = {
+    'transformed_charger_count': 'Scaled Charger Count',
+    'transformed_ev_count': 'Scaled EV Count',
+    'transformed_charger_ev_ratio': 'Scaled Charger-to-EV Ratio',
+    'transformed_charger_density': 'Scaled Charger Density',
+    'charger_count': 'Charger Count',
+    'ev_count': 'EV Count',
+    'charger_ev_ratio': 'Charger-to-EV Ratio',
+    'charger_density': 'Charger Density',
+}
+
+# OLS regression for trendline
+def calculate_ols(df, x_col, y_col):
+    """OLS regression and get parameters"""
+    # Data preparation
+    X = sm.add_constant(df[x_col]) # Add constant term for intercept
+    y = df[y_col]
+    # Get OLS parameters
+    model = sm.OLS(y, X).fit()
+    slope = model.params.iloc[1]
+    intercept = model.params.iloc[0]
+    r_squared = model.rsquared
+    return slope, intercept, r_squared
+
+def ols_text(df, x_col, y_col):
+    """OLS equation and R^2 for the hovertemplate"""
+    slope, intercept, r_squared = calculate_ols(df, x_col, y_col)
+    return f'<br>OLS trendline:<br>y = {slope:.2f}x + {intercept:.2f}<br>R² = {r_squared:.2f}'
+
+def mark_highlight(fig, hide_trendlines=False):
+    """Attach per-district colors and trendline colors so the browser can restyle a selection"""
+    for trace in fig.data:
+        if trace.type == 'scatter' and trace.mode == 'lines':
+            # OLS trendline: grayed out (or hidden) while districts are selected
+            color = trace.line.color or trace.marker.color # Per-trace trendlines take the marker color
+            trace.line.color = color
+            trace.meta = {'trendline': {'color': color, 'hide_on_selection': hide_trendlines}}
+        else:
+            # Points / bars: one color per district, grayed out when not selected
+            districts = list(trace.hovertext) if trace.hovertext is not None else list(trace.x)
+            colors = [trace.marker.color] * len(districts)
+            trace.marker.color = colors
+            trace.meta = {'highlight': {'districts': [str(d) for d in districts], 'colors': colors}}
+    return fig
+
+## 3.1) EV Count vs. Median Household Income by Legislative District
+def income_scatter(ev_merged, chart_title):
+    """EV count vs. median household income (viz_3)"""
+    fig_income = px.scatter(
+        ev_merged.assign(group='Legislative District'), # Assign the same group 'Legislative District' to all data
+        x='median_household_income',
+        y='ev_count',
+        title=chart_title,
+        color='group', # Specify color group
+        color_discrete_map={'Legislative District': HIGHLIGHT_COLOR}, # Set the designated color
+        trendline='ols',
+        trendline_scope='overall',
+        trendline_color_override=HIGHLIGHT_COLOR,
+        hover_data=['legislative_district', 'median_household_income', 'ev_count'],
+        hover_name='legislative_district',
+    )
+
+    # Add the OLS equation and R^2 to hovertemplate
+    ols_equation = ols_text(ev_merged, 'median_household_income', 'ev_count')
+    fig_income.update_traces(
+        hovertemplate=(
+            'Legislative District: %{hovertext}<br>'
+            'Median Household Income: $%{x:,.0f}<br>'
+            'EV Count: %{y}<br>'
+            f'{ols_equation}'
+        )
+    )
+
+    fig_income.update_layout(legend_title_text='') # Hide the legend title
+    fig_income.update_xaxes(title='Median Household Income')
+    fig_income.update_yaxes(title='EV Count')
+    return mark_highlight(fig_income)
+
+## 4.1) EV Count vs. Charging Infrasturcture Variables
+def charger_scatter(ev_merged, chart_title, x_data, y_data):
+    """EV count vs. a charging infrastructure variable (viz_4)"""
+    fig_charger = px.scatter(
+        ev_merged.assign(group='Legislative District'),
+        x=x_data,
+        y=y_data,
+        title=chart_title,
+        color='group',
+        color_discrete_map={'Legislative District': HIGHLIGHT_COLOR},
+        trendline='ols',
+        trendline_scope='overall',
+        trendline_color_override=HIGHLIGHT_COLOR,
+        hover_data=['legislative_district'],
+        hover_name='legislative_district',
+    )
+
+    # Custom dynamic hovertemplate based on x_data label
+    ols_equation = ols_text(ev_merged, x_data, y_data)
+    fig_charger.update_traces(
+        hovertemplate=(
+            'Legislative District: %{hovertext}<br>'
+            f'{X_LABELS.get(x_data, "X Value")}: ' + '%{x}<br>'
+            'EV Count: %{y}<br>'
+            f'{ols_equation}'
+        )
+    )
+
+    fig_charger.update_layout(legend_title_text='')
+    fig_charger.update_xaxes(title=X_LABELS.get(x_data, x_data))
+    fig_charger.update_yaxes(title=X_LABELS.get(y_data, y_data))
+    return mark_highlight(fig_charger)
+
+## 5.1) / 5.2) District bars colored by political party
+def party_bar(ev_merged, chart_title, y_col, y_label):
+    """District bars (ordered by EV count) colored by the winning party (viz_5_1, viz_5_2)"""
+    # Sort the dataframe by ev_count in descending order and keep that district order
+    ev_merged_sorted = ev_merged.sort_values('ev_count', ascending=False)
+    ld_order = ev_merged_sorted['legislative_district'].tolist()
+
+    fig_pp = px.bar(
+        ev_merged_sorted,
+        x='legislative_district',
+        y=y_col,
+        color='party_won',
+        title=chart_title,
+        color_discrete_map=PARTY_COLORS,
+        category_orders={'legislative_district': ld_order}
+    ).update_xaxes(type='category')
+
+    # Update hovertemplate for each trace
+    fig_pp.for_each_trace(lambda t: t.update(hovertemplate=f'Legislative District: %{{x}}<br>{y_label}: %{{y}}<br>Party Won: {t.name}'))
+
+    fig_pp.update_layout(
+        xaxis_title='Legislative District',
+        yaxis_title=y_label,
+        legend_title_text=''
+    )
+    return mark_highlight(fig_pp)
+
+## 5.3) / 5.4) EV Count vs. an indicator, with one OLS trendline per party
+def party_scatter(ev_merged, chart_title, x_col, x_label, x_format='%{x}'):
+    """EV count vs. an indicator colored by the winning party, with per-party trendlines (viz_5_3, viz_5_4)"""
+    fig_pp = px.scatter(
+        ev_merged,
+        x=x_col,
+        y='ev_count',
+        color='party_won',
+        title=chart_title,
+        color_discrete_map=PARTY_COLORS,
+        hover_data=['legislative_district', 'party_won'],
+        hover_name='legislative_district',
+        trendline='ols',
+        trendline_scope='trace' # 'trace' or 'overall'
+    )
+
+    # Add the OLS equation and R^2 of each party to its hovertemplate
+    for trace in fig_pp.data:
+        party = trace.name # party_won
+        ols_equation = ols_text(ev_merged[ev_merged['party_won'] == party], x_col, 'ev_count')
+        trace.hovertemplate = (
+            'Legislative District: %{hovertext}<br>'
+            'Party Won: ' + party + '<br>'
+            f'{x_label}: {x_format}<br>'
+            'EV Count: %{y}<br>'
+            f'{ols_equation}<extra></extra>'
+        )
+
+    fig_pp.update_layout(legend_title_text='')
+    fig_pp.update_xaxes(title=x_label)
+    fig_pp.update_yaxes(title='EV Count')
+    return mark_highlight(fig_pp, hide_trendlines=True) # Per-party trendlines are only shown without a selection
+
+# ================================== #
+# Chart variants
+# Every district chart the page can show, by name and builder arguments. The page and the
+# deploy-time warm-up (utils/warmup.py) both read these tables, so precomputed figures always
+# match what the page asks for.
+
+BUILDERS = {
+    'income': income_scatter,
+    'charger': charger_scatter,
+    'party_bar': party_bar,
+    'party_scatter': party_scatter,
+}
+
+INCOME_TITLE = 'EV Count vs. Median Household Income by Legislative District'
+
+# Section 4.1: (visualization, scaling option) -> (x column, y column, title); "Scaled" = square-root transformed
+CHARGER_VARIANTS = {
+    ('EV Count vs. Charger by Legislative District', 'Raw'):
+        ('charger_count', 'ev_count', 'EV Count vs. Charger by Legislative District'),
+    ('EV Count vs. Charger-to-EV Ratio by Legislative District', 'Raw'):
+        ('charger_ev_ratio', 'ev_count', 'EV Count vs. Charger-to-EV Ratio by Legislative District'),
+    ('EV Count vs. Charger-to-Area Ratio by Legislative District', 'Raw'):
+        ('charger_density', 'ev_count', 'EV Count vs. Charger-to-Area Ratio by Legislative District'),
+    ('EV Count vs. Charger by Legislative District', 'Scaled'):
+        ('transformed_charger_count', 'transformed_ev_count', 'EV Count vs. Transformed Charger Count by Legislative District'),
+    ('EV Count vs. Charger-to-EV Ratio by Legislative District', 'Scaled'):
+        ('transformed_charger_ev_ratio', 'transformed_ev_count', 'EV Count vs. Transformed Charger-to-EV Ratio by Legislative District'),
+    ('EV Count vs. Charger-to-Area Ratio by Legislative District', 'Scaled'):
+        ('transformed_charger_density', 'transformed_ev_count', 'EV Count vs. Transformed Charger-to-Area Ratio by Legislative District'),
+}
+
+# Section 5: visualization -> (chart key, builder, title, builder arguments after the title)
+PARTY_VARIANTS = {
+    'EV Count by Legislative District':
+        ('viz_5_1', 'party_bar', 'EV Count by Legislative District and Political Party', ('ev_count', 'EV Count')),
+    'Registered Voters by Legislative District':
+        ('viz_5_2', 'party_bar', 'Registered Voters by Legislative District and Political Party', ('registered_voters', 'Registered Voters')),
+    'EV Count vs. Median Household Income':
+        ('viz_5_3', 'party_scatter', 'EV Count vs. Median Household Income by Legislative District and Political Party',
+         ('median_household_income', 'Median Household Income', '$%{x:,.0f}')),
+    'EV Count vs. Charging Infrastructure':
+        ('viz_5_4', 'party_scatter', 'EV Count vs. Charging Infrastructure by Legislative District and Political Party',
+         ('charger_count', 'Number of Charging Stations')),
+}
+
+def all_variants():
+    """(builder name, arguments) of every district chart in Sections 3-5"""
+    variants = [('income', (INCOME_TITLE,))]
+    variants += [('charger', (title, x_data, y_data)) for x_data, y_data, title in CHARGER_VARIANTS.values()]
+    variants += [(chart, (title, *args)) for _, chart, title, args in PARTY_VARIANTS.values()]
+    return variants
@@ -0,0 +1,75 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import pandas as pd
+
+# ================================== #
+# Compact in-memory representation of the EV registration table
+
+CATEGORY_MAX_RATIO = 0.5 # Text columns with fewer unique values than this share of rows become categoricals
+EV_ID_COLUMNS = ['dol_vehicle_id'] # Numeric identifiers exported as text
+
+def memory_mb(series):
+    """Deep memory usage of a column in MB"""
+    return series.memory_usage(deep=True, index=False) / 1e6
+
+def compact_column(series, numeric_text=False):
+    """Narrowest dtype for a single column"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.remove_unused_categories()
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if len(values) and np.array_equal(values, np.round(values)):
+            # Whole numbers stored as float (because of NaN) -> smallest nullable integer type
+            narrow = pd.to_numeric(values.astype('int64'), downcast='integer').dtype
+            return series.astype(pd.api.types.pandas_dtype(narrow.name.capitalize()))
+        return series
+    # Text columns
+    if numeric_text:
+        return pd.to_numeric(series, errors='coerce').astype('Int64')
+    if series.nunique(dropna=True) < len(series) * CATEGORY_MAX_RATIO:
+        return series.astype('category')
+    return series
+
+def compact_frame(df, numeric_text_columns=EV_ID_COLUMNS):
+    """Convert text columns to categoricals and numbers to the narrowest dtypes, with a memory report"""
+    columns, rows = {}, []
+    for col in df.columns:
+        before = df[col]
+        after = compact_column(before, numeric_text=col in numeric_text_columns)
+        columns[col] = after
+        rows.append({
+            'column': col,
+            'dtype_before': str(before.dtype),
+            'dtype_after': str(after.dtype),
+            'mb_before': memory_mb(before),
+            'mb_after': memory_mb(after)
+        })
+    report = pd.DataFrame(rows)
+    report.loc[len(report)] = ['(total)', '', '', report['mb_before'].sum(), report['mb_after'].sum()]
+    return pd.DataFrame(columns, index=df.index), report
@@ -0,0 +1,233 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import bisect
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data import data_path, load_pickle
+from utils.dtypes import compact_column
+
+# ================================== #
+# Point-in-time feature store of district features
+# Layout: data_processed/feature_store/as_of=YYYY-MM-DD.parquet, one zstd-compressed file per feature set with one
+# row per legislative district and its numeric features (narrowest dtypes); each file records the source dataset
+# of every column in its metadata, since the features have different vintages (2022 election, ACS 2022 income,
+# charging stations, voter demographics). Feature sets are only ever added. Loaded, the store is one dense matrix
+# with a (district, as_of_date) -> row index, plus per-feature statistics computed once per feature set:
+# - serving: vector(district) is a dict lookup of the latest feature set (or the one in effect at a date)
+# - training: training_frame(labels) joins each labeled (district, date) to the features known at that date
+# Usage (from the repository root):
+#   python -m utils.features add 2024-10-03   # feature set of the current data_processed/ev_merged.pickle
+#   python -m utils.features list
+
+STORE_DIR = 'feature_store' # Inside data_processed/
+KEY_COLUMN = 'legislative_district'
+DATE_COLUMN = 'as_of_date'
+CURRENT_AS_OF = '2024-10-03' # Date of the DOL export and charger data behind ev_merged.pickle
+STATISTICS = ['min', 'max', 'mean', 'std']
+# Source dataset of each column (README, Data Sources), by column name prefix; derived columns list every input
+FEATURE_SOURCES = {
+    'ev_count': ['EV Population'], 'transformed_ev_count': ['EV Population'],
+    'registered_voters': ['2022 Election'], 'ballots_cast': ['2022 Election'], '%_turnout': ['2022 Election'],
+    'dem_votes': ['2022 Election'], 'rep_votes': ['2022 Election'],
+    'median_household_income': ['ACS 2022 Income'], 'margin_error': ['ACS 2022 Income'],
+    'shape_': ['Districts 2022 (Geospatial)'],
+    'voters_': ['Voter Demographics'], 'total_active_voters': ['Voter Demographics'],
+    'charger_count': ['Charging Stations'], 'transformed_charger_count': ['Charging Stations'],
+    'charger_density': ['Charging Stations', 'Districts 2022 (Geospatial)'],
+    'transformed_charger_density': ['Charging Stations', 'Districts 2022 (Geospatial)'],
+    'charger_per_voter_': ['Charging Stations', 'Voter Demographics'],
+    'charger_ev_ratio': ['Charging Stations', 'EV Population'], 'transformed_charger_ev_ratio': ['Charging Stations', 'EV Population']
+}
+
+def feature_sources(column):
+    """Source datasets of a column (longest matching name prefix)"""
+    prefixes = [prefix for prefix in FEATURE_SOURCES if column.startswith(prefix)]
+    return FEATURE_SOURCES[max(prefixes, key=len)] if prefixes else []
+
+def store_path(store_dir=None):
+    """Folder holding the feature set files"""
+    return store_dir or data_path(STORE_DIR)
+
+def feature_files(store_dir=None):
+    """Feature set files in the store, oldest first"""
+    path = store_path(store_dir)
+    if not os.path.isdir(path):
+        return []
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.startswith('as_of=') and name.endswith('.parquet'))
+
+def store_version(store_dir=None):
+    """Fingerprint of the feature set files (changes whenever a feature set is added)"""
+    digest = hashlib.sha1()
+    for path in feature_files(store_dir):
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:12]
+
+# ================================== #
+# Writing feature sets
+
+def add_features(frame, as_of, store_dir=None):
+    """Add the numeric features of one district table as the feature set in effect from as_of (never rewritten)"""
+    as_of = pd.Timestamp(as_of).normalize()
+    path = os.path.join(store_path(store_dir), f'as_of={as_of:%Y-%m-%d}.parquet')
+    if os.path.exists(path):
+        raise FileExistsError(f'Feature set {as_of:%Y-%m-%d} is already in the store')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    columns = [col for col in frame.columns if col != KEY_COLUMN and pd.api.types.is_numeric_dtype(frame[col])]
+    features = pd.DataFrame({KEY_COLUMN: frame[KEY_COLUMN].astype(str).to_numpy()})
+    for col in columns:
+        features[col] = compact_column(frame[col]).to_numpy()
+    table = pa.Table.from_pandas(features, preserve_index=False)
+    sources = {col: feature_sources(col) for col in columns}
+    table = table.replace_schema_metadata({**table.schema.metadata, b'feature_sources': json.dumps(sources).encode()})
+    tmp_path = f'{path}.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+# ================================== #
+# Reading and lookup
+
+class FeatureStore:
+    """Feature vectors by (district, as_of_date): dense matrix, row index and per-feature-set statistics"""
+    def __init__(self, table, sources=None):
+        # table: one row per (as_of_date, district) with the feature columns (missing in older sets -> NaN)
+        table = table.sort_values(DATE_COLUMN, kind='stable', ignore_index=True) # Districts keep their source order
+        self.columns = [col for col in table.columns if col not in (DATE_COLUMN, KEY_COLUMN)]
+        self.column_index = {col: i for i, col in enumerate(self.columns)}
+        self.values = table[self.columns].to_numpy(dtype=np.float64)
+        self.sources = sources or {col: feature_sources(col) for col in self.columns}
+
+        dates = table[DATE_COLUMN].to_numpy()
+        self.as_of_dates = list(pd.DatetimeIndex(np.unique(dates)))
+        self.rows = {(district, pd.Timestamp(date)): row for row, (district, date) in enumerate(zip(table[KEY_COLUMN], dates))}
+        # Row ranges and statistics of each feature set (computed once here; lookups never scan the matrix)
+        starts = np.searchsorted(dates, np.array(self.as_of_dates, dtype=dates.dtype))
+        self.ranges = dict(zip(self.as_of_dates, zip(starts, np.append(starts[1:], len(table)))))
+        self.districts = {date: table[KEY_COLUMN].iloc[start:end].tolist() for date, (start, end) in self.ranges.items()}
+        self.statistics_by_date = {date: self.summarize(pd.DataFrame(self.values[start:end], columns=self.columns))
+                                   for date, (start, end) in self.ranges.items()}
+
+    @staticmethod
+    def summarize(features):
+        """min / max / mean / std (rows) of every feature (one vectorized reduction each, not one per column)"""
+        return pd.DataFrame([getattr(features, stat)() for stat in STATISTICS], index=STATISTICS)
+
+    @classmethod
+    def from_frame(cls, frame, as_of=CURRENT_AS_OF):
+        """Store holding one district table as a single feature set (no files)"""
+        columns = [col for col in frame.columns if col != KEY_COLUMN and pd.api.types.is_numeric_dtype(frame[col])]
+        table = frame[[KEY_COLUMN] + columns].assign(**{KEY_COLUMN: frame[KEY_COLUMN].astype(str)})
+        table.insert(0, DATE_COLUMN, pd.Timestamp(as_of).normalize())
+        return cls(table)
+
+    @classmethod
+    def load(cls, store_dir=None):
+        """Every feature set in the store; None when the store is empty"""
+        files = feature_files(store_dir)
+        if not files:
+            return None
+        tables, sources = [], {}
+        for path in files: # Read one by one: dtypes may differ between sets
+            table = pq.read_table(path)
+            sources.update(json.loads((table.schema.metadata or {}).get(b'feature_sources', b'{}')))
+            frame = table.to_pandas()
+            frame.insert(0, DATE_COLUMN, pd.Timestamp(os.path.basename(path)[len('as_of='):-len('.parquet')]))
+            tables.append(frame)
+        return cls(pd.concat(tables, ignore_index=True), sources)
+
+    def resolve(self, as_of=None):
+        """Feature set in effect at a date: the latest one added on or before it (the newest without a date)"""
+        if as_of is None:
+            return self.as_of_dates[-1]
+        position = bisect.bisect_right(self.as_of_dates, pd.Timestamp(as_of)) - 1
+        if position < 0:
+            raise KeyError(f'No feature set in effect on {pd.Timestamp(as_of):%Y-%m-%d}')
+        return self.as_of_dates[position]
+
+    def vector(self, district, columns, as_of=None):
+        """Feature values of one district, in the order of columns"""
+        row = self.rows[(str(district), self.resolve(as_of))]
+        return self.values[row, [self.column_index[col] for col in columns]]
+
+    def frame(self, columns=None, as_of=None):
+        """Features of every district (index: district) from one feature set"""
+        date = self.resolve(as_of)
+        start, end = self.ranges[date]
+        columns = columns or self.columns
+        return pd.DataFrame(self.values[start:end, [self.column_index[col] for col in columns]], columns=columns,
+                            index=pd.Index(self.districts[date], name=KEY_COLUMN))
+
+    def statistics(self, as_of=None):
+        """min / max / mean / std of every feature (rows) over the districts of one feature set"""
+        return self.statistics_by_date[self.resolve(as_of)]
+
+    def training_frame(self, labels, columns=None, date_column='date'):
+        """Point-in-time join: each labeled (district, date) row gets the features of the set in effect on that date,
+        never a later one (rows dated before the first feature set are dropped)"""
+        columns = columns or self.columns
+        dates = pd.to_datetime(labels[date_column]).to_numpy()
+        positions = np.searchsorted(np.array(self.as_of_dates, dtype='datetime64[ns]'), dates, side='right') - 1
+        rows = np.array([self.rows.get((str(district), self.as_of_dates[p]), -1) if p >= 0 else -1
+                         for district, p in zip(labels[KEY_COLUMN], positions)], dtype=np.int64)
+        known = rows >= 0
+        result = labels[known].reset_index(drop=True)
+        features = pd.DataFrame(self.values[rows[known]][:, [self.column_index[col] for col in columns]], columns=columns)
+        result[DATE_COLUMN] = np.array(self.as_of_dates, dtype='datetime64[ns]')[positions[known]]
+        return pd.concat([result, features], axis=1)
+
+def load_feature_store(ev_merged=None, store_dir=None):
+    """Feature store from its files, or (store empty) the current ev_merged table as a single feature set"""
+    store = FeatureStore.load(store_dir)
+    if store is None and ev_merged is not None:
+        store = FeatureStore.from_frame(ev_merged)
+    return store
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Point-in-time feature store of district features')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='Add a feature set from a district table')
+    add.add_argument('as_of', help='Date from which the feature set is in effect (YYYY-MM-DD)')
+    add.add_argument('--table', default=data_path('ev_merged.pickle'), help='Pickled district table (default: ev_merged.pickle)')
+    commands.add_parser('list', help='List the feature sets in the store')
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        path = add_features(load_pickle(args.table), args.as_of)
+        print(f'Wrote {path} ({os.path.getsize(path) / 1e3:.1f} KB)')
+    else:
+        store = FeatureStore.load()
+        for date in (store.as_of_dates if store is not None else []):
+            print(f'{date:%Y-%m-%d}: {len(store.districts[date])} districts')
+        if store is not None:
+            print(f'{len(store.columns)} features')
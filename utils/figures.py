@@ -0,0 +1,112 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import base64
+
+import numpy as np
+import plotly.io as pio
+import plotly.graph_objects as go
+import streamlit as st
+
+from utils import telemetry
+
+# ================================== #
+# Figure serialization: what actually travels to the browser for each chart
+# - hover columns that no hovertemplate references are dropped
+# - the Plotly template keeps only the trace types and subplots the figure uses
+# - numeric data arrays are sent as base64 typed arrays ({'dtype', 'bdata'}), decoded by plotly.js
+
+TYPED_ARRAY_MIN_LENGTH = 16 # Shorter arrays stay plain JSON lists
+TYPED_ARRAY_DTYPES = {'float64': 'f8', 'float32': 'f4', 'int32': 'i4', 'int16': 'i2', 'int8': 'i1',
+                      'uint32': 'u4', 'uint16': 'u2', 'uint8': 'u1'}
+SUBPLOT_TEMPLATES = ('geo', 'mapbox', 'polar', 'scene', 'ternary') # Template layout parts only needed by these subplots
+
+def compact_figure(fig):
+    """Drop unused hover data and template parts from a figure (in place)"""
+    for trace in fig.data:
+        template = getattr(trace, 'hovertemplate', None)
+        if not isinstance(template, str):
+            continue
+        # px copies every hover_data column into customdata; keep only what the hovertemplate shows
+        for field in ('customdata', 'hovertext'):
+            if getattr(trace, field, None) is not None and field not in template:
+                trace[field] = None
+    return fig
+
+def prune_template(figure):
+    """Keep only the template entries for the trace types and subplots in a figure dict"""
+    template = figure.get('layout', {}).get('template')
+    if not template:
+        return figure
+    trace_types = {trace.get('type', 'scatter') for trace in figure.get('data', [])}
+    template['data'] = {name: value for name, value in template.get('data', {}).items() if name in trace_types}
+    # Streamlit merges its theme into template.layout, so the layout part always stays
+    template['layout'] = {name: value for name, value in template.get('layout', {}).items()
+                          if name not in SUBPLOT_TEMPLATES or name in figure['layout']}
+    return figure
+
+def typed_array(values):
+    """Typed-array spec for a 1-D numeric array, or None to keep it as a JSON list"""
+    if not isinstance(values, np.ndarray) or values.ndim != 1 or len(values) < TYPED_ARRAY_MIN_LENGTH:
+        return None
+    if values.dtype.kind in 'iu' and values.dtype.itemsize == 8:
+        # plotly.js has no 64-bit integer arrays
+        info = np.iinfo(np.int32)
+        values = values.astype(np.int32) if values.min() >= info.min and values.max() <= info.max else values.astype(np.float64)
+    dtype = TYPED_ARRAY_DTYPES.get(values.dtype.name)
+    if dtype is None:
+        return None
+    return {'dtype': dtype, 'bdata': base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')}
+
+def encode_typed_arrays(value):
+    """Replace numeric arrays inside trace data with typed-array specs"""
+    if isinstance(value, dict):
+        return {key: encode_typed_arrays(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_typed_arrays(item) for item in value]
+    if isinstance(value, np.ndarray):
+        spec = typed_array(value)
+        return spec if spec is not None else value
+    return value
+
+def figure_dict(fig, template=True):
+    """Minimized figure as a plain dict (template=False strips the template entirely)"""
+    figure = compact_figure(fig).to_plotly_json()
+    if template:
+        prune_template(figure)
+    else:
+        figure['layout'].pop('template', None)
+    figure['data'] = encode_typed_arrays(figure['data']) # Data arrays only; layout arrays are not typed-array aware
+    return figure
+
+def figure_json(fig, template=True):
+    """Minimized figure as JSON text"""
+    return pio.json.to_json_plotly(figure_dict(fig, template))
+
+def plotly_chart(fig, name, **kwargs):
+    """st.plotly_chart with the minimized figure; records the payload size as payload/<name> (bytes) if enabled"""
+    figure = figure_dict(fig)
+    if telemetry.PAYLOADS:
+        telemetry.record(f'payload/{name}', len(pio.json.to_json_plotly(figure)), unit='B')
+    # The figure was validated when it was built; skip re-validation so the typed arrays pass through
+    st.plotly_chart(go.Figure(figure, _validate=False), **kwargs)
@@ -0,0 +1,192 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.data import cache_path, data_version, load_pickle, save_pickle
+
+# ================================== #
+# District adoption forecasts (logistic and Bass diffusion curves)
+# History: cumulative registrations by model year of the current fleet (vehicles no longer registered are
+# not observed, so this is a lower bound of past adoption). Every district is fitted at once: the saturation
+# level (logistic) or the innovation/imitation pair (Bass) is searched on a grid over all districts in one
+# array operation, the remaining parameters are solved in closed form, and the best fit per district is kept.
+
+FIT_START_YEAR = 2011 # First model year of mass-market EVs (Nissan Leaf, Chevrolet Volt)
+TARGET_YEAR = 2030 # Washington: 100% of new light-duty vehicle sales electric by 2030
+HORIZON_YEAR = 2040 # Last year of the projected curves
+GRID_END_YEAR = 2100 # Districts that reach TARGET_SHARE later than this are reported as not reached (NaN)
+TARGET_SHARE = 0.9 # A district "reaches" its adoption target at 90% of its fitted saturation level (not a policy goal)
+SATURATION_MULTIPLIERS = np.geomspace(1.02, 100, 400) # Logistic saturation candidates, relative to the latest count
+BASS_P = np.geomspace(1e-4, 0.05, 48) # Bass innovation coefficients
+BASS_Q = np.linspace(0.05, 1.2, 48) # Bass imitation coefficients
+REFINE_STEPS = 20 # Gauss-Newton steps polishing the logistic grid fit
+CACHE_FORMAT = 2 # Bump when the fit or its output changes, so older pickles in cache/ are not reused
+
+def adoption_history(ev, by='legislative_district'):
+    """Cumulative EV count by model year (rows) and district (columns) from FIT_START_YEAR on"""
+    # One bincount over (district code, model year) instead of a groupby: no per-row int64 keys on large tables
+    district = ev[by].astype('category') # No-op for the compacted table
+    known = district.cat.codes.to_numpy() >= 0
+    codes = district.cat.codes.to_numpy()[known].astype(np.int32)
+    years = ev['model_year'].to_numpy()[known]
+    first, last = int(years.min()), int(years.max())
+    n_years = last - first + 1
+    counts = np.bincount(codes * n_years + (years - first), minlength=len(district.cat.categories) * n_years)
+    counts = pd.DataFrame(counts.reshape(-1, n_years).T, index=pd.RangeIndex(first, last + 1, name='model_year'),
+                          columns=district.cat.categories.astype(str))
+    counts = counts.loc[:, counts.sum() > 0] # Categories without registrations
+    # The newest model year is still being sold, so it is left out of the fit
+    cumulative = counts.cumsum().iloc[:-1]
+    return cumulative.loc[FIT_START_YEAR:]
+
+# ================================== #
+# Curves
+
+def logistic_curve(t, saturation, rate, midpoint):
+    """Logistic cumulative adoption"""
+    return saturation / (1 + np.exp(-rate * (t - midpoint)))
+
+def bass_curve(t, saturation, p, q):
+    """Bass diffusion cumulative adoption (t in years since launch)"""
+    decay = np.exp(-(p + q) * np.maximum(t, 0))
+    return saturation * (1 - decay) / (1 + q / p * decay)
+
+# ================================== #
+# Batched fits; y is (years, districts), t is years since launch
+
+def fit_logistic(t, y):
+    """Least-squares logistic fit of every district at once: (saturation, rate, midpoint, sse)"""
+    saturation = y[-1] * SATURATION_MULTIPLIERS[:, None] # (candidates, districts)
+    share = np.clip(y[None] / saturation[:, None], 1e-9, 1 - 1e-9) # (candidates, years, districts)
+    logit = np.log(share / (1 - share))
+    weight = y[None] * (1 - share) # ~ inverse variance of the logit; empty years get no weight
+
+    # Weighted linear regression logit = a + b t, solved in closed form for every (candidate, district)
+    tt = t[None, :, None]
+    sw, st, stt = weight.sum(1), (weight * tt).sum(1), (weight * tt ** 2).sum(1)
+    sz, stz = (weight * logit).sum(1), (weight * tt * logit).sum(1)
+    rate = (sw * stz - st * sz) / np.maximum(sw * stt - st ** 2, 1e-12)
+    midpoint = (rate * st - sz) / np.maximum(rate * sw, 1e-12)
+
+    sse = ((y[None] - logistic_curve(tt, saturation[:, None], rate[:, None], midpoint[:, None])) ** 2).sum(1)
+    best = np.nanargmin(np.where(np.isfinite(sse), sse, np.nan), axis=0)
+    columns = np.arange(y.shape[1])
+    params = np.stack([saturation[best, columns], rate[best, columns], midpoint[best, columns]], axis=1) # (districts, 3)
+    params = refine_logistic(t, y, params)
+    return params, ((y - logistic_curve(t[:, None], *params.T)) ** 2).sum(0)
+
+def refine_logistic(t, y, params):
+    """Batched Gauss-Newton polish of the logistic parameters (a step is kept only where it lowers the error)"""
+    tt = t[:, None]
+    for _ in range(REFINE_STEPS):
+        saturation, rate, midpoint = params.T
+        sigmoid = 1 / (1 + np.exp(-rate * (tt - midpoint)))
+        residual = y - saturation * sigmoid
+        # Jacobian of the curve with respect to (saturation, rate, midpoint): (years, districts, 3)
+        jacobian = np.stack([sigmoid,
+                             saturation * sigmoid * (1 - sigmoid) * (tt - midpoint),
+                             -saturation * sigmoid * (1 - sigmoid) * rate], axis=2)
+        jtj = np.einsum('tdi,tdj->dij', jacobian, jacobian) + 1e-9 * np.eye(3)
+        jtr = np.einsum('tdi,td->di', jacobian, residual)
+        step = np.linalg.solve(jtj, jtr[..., None])[..., 0]
+
+        candidate = params + step
+        candidate[:, 0] = np.maximum(candidate[:, 0], y[-1]) # Saturation never below the latest count
+        old_sse = (residual ** 2).sum(0)
+        new_sse = ((y - logistic_curve(tt, *candidate.T)) ** 2).sum(0)
+        improved = np.isfinite(new_sse) & (new_sse < old_sse)
+        params = np.where(improved[:, None], candidate, params)
+    return params
+
+def fit_bass(t, y):
+    """Least-squares Bass fit of every district at once: (saturation, p, q, sse)"""
+    p, q = np.meshgrid(BASS_P, BASS_Q, indexing='ij')
+    p, q = p.ravel(), q.ravel() # (pairs,)
+    shape = bass_curve(t[None, :], 1.0, p[:, None], q[:, None]) # Unit curve per (p, q): (pairs, years)
+
+    # Saturation in closed form for every (pair, district), kept at or above the latest count
+    saturation = np.maximum(shape @ y / (shape ** 2).sum(1, keepdims=True), y[-1][None]) # (pairs, districts)
+    sse = (y ** 2).sum(0)[None] - 2 * saturation * (shape @ y) + saturation ** 2 * (shape ** 2).sum(1, keepdims=True)
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(y.shape[1])
+    params = np.stack([saturation[best, columns], p[best], q[best]], axis=1)
+    return params, sse[best, columns]
+
+# ================================== #
+# Forecast table
+
+def forecast_districts(ev, target_year=TARGET_YEAR, horizon_year=HORIZON_YEAR):
+    """Fit every district and return (forecast table, projected curves by year, observed history)"""
+    history = adoption_history(ev)
+    years = history.index.to_numpy()
+    y = history.to_numpy(dtype=float)
+    t = (years - (FIT_START_YEAR - 1)).astype(float) # Years since launch
+
+    logistic, logistic_sse = fit_logistic(t, y)
+    bass, bass_sse = fit_bass(t, y)
+    use_bass = bass_sse < logistic_sse
+
+    # Projected curves on a fine grid (0.1 year) to locate the year each district reaches its target
+    grid = np.arange(FIT_START_YEAR, GRID_END_YEAR + 0.05, 0.1)
+    tg = (grid - (FIT_START_YEAR - 1))[:, None]
+    curves = np.where(use_bass, bass_curve(tg, *bass.T), logistic_curve(tg, *logistic.T)) # (grid, districts)
+    saturation = np.where(use_bass, bass[:, 0], logistic[:, 0])
+    reached = curves >= TARGET_SHARE * saturation
+    target_reached_year = np.where(reached.any(0), grid[reached.argmax(0)], np.nan)
+
+    projected = curves[np.abs(grid - target_year).argmin()]
+    sse = np.where(use_bass, bass_sse, logistic_sse)
+    sst = ((y - y.mean(0)) ** 2).sum(0)
+    forecast = pd.DataFrame({
+        'legislative_district': history.columns,
+        'model': np.where(use_bass, 'Bass', 'Logistic'),
+        'ev_count_latest': y[-1],
+        f'projected_{target_year}': projected,
+        'saturation': saturation,
+        f'share_of_saturation_{target_year}': projected / saturation,
+        'target_reached_year': target_reached_year,
+        'target_gap_years': target_reached_year - target_year, # <= 0: on track, NaN: not reached by GRID_END_YEAR
+        'r_squared': 1 - sse / np.where(sst > 0, sst, np.nan),
+        # Still-exponential growth: the saturation level sits at the search bound and the target year is a floor estimate
+        'saturation_at_bound': ~use_bass & (logistic[:, 0] >= 0.99 * SATURATION_MULTIPLIERS[-1] * y[-1])
+    })
+
+    annual = (np.arange(len(grid)) % 10 == 0) & (grid <= horizon_year + 0.05) # Whole years on the 0.1-year grid
+    projected_curves = pd.DataFrame(curves[annual], index=np.rint(grid[annual]).astype(int), columns=history.columns)
+    return forecast, projected_curves, history
+
+def forecast_version(ev_file='ev.pickle'):
+    """Cache key of the forecasts: EV data version plus the cache format"""
+    return f'{data_version(ev_file)}_v{CACHE_FORMAT}'
+
+def load_forecast(ev, ev_file='ev.pickle'):
+    """Load the persisted forecasts for this data version, fitting and saving them on a miss"""
+    path = cache_path(f'district_forecast_{forecast_version(ev_file)}.pickle')
+    try:
+        return load_pickle(path)
+    except (FileNotFoundError, EOFError):
+        result = forecast_districts(ev)
+        save_pickle(result, path)
+        return result
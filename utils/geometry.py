@@ -0,0 +1,319 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from utils.data import cache_path, data_path, data_version
+
+# ================================== #
+# Legislative district geometry for choropleth maps
+# The district polygons (GeoJSON, lon/lat) are converted once per source file into a TopoJSON-style topology:
+# - coordinates are quantized to an integer grid over the bounding box, which also snaps neighboring boundaries together
+# - rings are cut into arcs at junctions (points where the neighboring districts change); a boundary shared by two
+#   districts is stored once and referenced by both (~index when traversed backwards)
+# - arcs are simplified with Douglas-Peucker at several tolerances: shared arcs are simplified once, so neighbors
+#   never drift apart (no gaps or overlaps), and each level is saved delta-encoded
+# Maps decode one level to GeoJSON with as many decimals as its tolerance needs.
+# Usage (from the repository root, optional; built on first use otherwise):
+#   python -m utils.geometry
+
+GEOMETRY_FILE = 'legislative_districts.geojson' # Optional source in data_processed (WA legislative districts, lon/lat)
+DISTRICT_PROPERTIES = ['legislative_district', 'DISTRICTN', 'DISTRICT', 'LEGDIST', 'ID'] # Feature property naming the district
+QUANTIZATION = 100000 # Grid steps across the bounding box (about 5 m over Washington)
+DETAIL_KM = {'Coarse': 1.0, 'Medium': 0.25, 'Fine': 0.05} # Simplification tolerance of each saved level
+DEFAULT_DETAIL = 'Coarse'
+KM_PER_DEGREE = 111.32 # Along a meridian
+
+def district_id(value):
+    """District key as in ev_merged ('01' and 1 -> '1')"""
+    value = str(value).strip()
+    return str(int(value)) if value.isdigit() else value
+
+def read_districts(path):
+    """{district: [polygon: [ring: (n, 2) lon/lat array]]} from a GeoJSON FeatureCollection"""
+    with open(path) as f:
+        features = json.load(f)['features']
+    districts = {}
+    for feature in features:
+        properties = feature.get('properties') or {}
+        key = next((name for name in DISTRICT_PROPERTIES if properties.get(name) is not None), None)
+        if key is None:
+            raise ValueError(f"District features need one of the properties {', '.join(DISTRICT_PROPERTIES)}")
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        districts.setdefault(district_id(properties[key]), []).extend(
+            [np.asarray(ring, dtype=float)[:, :2] for ring in polygon] for polygon in polygons)
+    return districts
+
+# ================================== #
+# Topology: quantized rings cut into shared arcs
+
+def quantize(districts):
+    """TopoJSON transform and the rings as integer (x, y) arrays (closing point and repeated points dropped)"""
+    points = np.concatenate([ring for polygons in districts.values() for polygon in polygons for ring in polygon])
+    translate = points.min(axis=0)
+    scale = np.maximum(points.max(axis=0) - translate, 1e-9) / (QUANTIZATION - 1)
+    rings = {}
+    for district, polygons in districts.items():
+        rings[district] = []
+        for polygon in polygons:
+            quantized = []
+            for ring in polygon:
+                q = np.rint((ring - translate) / scale).astype(np.int64)
+                q = q[np.any(q != np.roll(q, 1, axis=0), axis=1)] # Also drops the closing point (equal to the first)
+                if len(q) >= 3:
+                    quantized.append(q)
+                elif not quantized:
+                    break # Exterior ring collapsed to a point: drop the polygon with its holes
+            if quantized:
+                rings[district].append(quantized)
+    return {'scale': scale.tolist(), 'translate': translate.tolist()}, rings
+
+def point_keys(q):
+    """One int64 per quantized point (x in the high 32 bits)"""
+    return (q[:, 0] << 32) | q[:, 1]
+
+def junctions(rings):
+    """Points where the neighboring rings change: the same point seen with different neighbors (in either direction)"""
+    keys, low, high = [], [], []
+    for polygons in rings.values():
+        for polygon in polygons:
+            for q in polygon:
+                k = point_keys(q)
+                before, after = np.roll(k, 1), np.roll(k, -1)
+                keys.append(k)
+                low.append(np.minimum(before, after))
+                high.append(np.maximum(before, after))
+    seen = pd.DataFrame({'key': np.concatenate(keys), 'low': np.concatenate(low), 'high': np.concatenate(high)}).drop_duplicates()
+    counts = seen['key'].value_counts()
+    return counts.index[counts > 1].to_numpy()
+
+def build_topology(rings, junction_keys):
+    """Distinct arcs (quantized points, both ends included) and each ring as a list of arc references"""
+    arcs, index, topology = [], {}, {}
+
+    def reference(arc, k):
+        """Arc index (~index if already stored the other way round), storing a new arc on first sight"""
+        forward, backward = tuple(k), tuple(k[::-1])
+        if forward in index:
+            return index[forward]
+        if backward in index:
+            return ~index[backward]
+        index[forward] = len(arcs)
+        arcs.append(arc)
+        return len(arcs) - 1
+
+    for district, polygons in rings.items():
+        topology[district] = []
+        for polygon in polygons:
+            refs = []
+            for q in polygon:
+                k = point_keys(q)
+                cuts = np.flatnonzero(np.isin(k, junction_keys))
+                if len(cuts) == 0:
+                    # Ring without junctions (coast-only or fully enclosed): one closed arc starting at its smallest point,
+                    # so the same ring seen from both sides (island and hole) gives the same arc, reversed
+                    closed = np.roll(q, -int(np.argmin(k)), axis=0)
+                    closed = np.vstack([closed, closed[:1]])
+                    refs.append([reference(closed, point_keys(closed))])
+                    continue
+                # Start at the first junction; each arc runs from one junction to the next (the last one back to the start)
+                q, k = np.roll(q, -cuts[0], axis=0), np.roll(k, -cuts[0])
+                cuts = np.append(cuts - cuts[0], len(q))
+                q, k = np.vstack([q, q[:1]]), np.append(k, k[0])
+                refs.append([reference(q[a:b + 1], k[a:b + 1]) for a, b in zip(cuts[:-1], cuts[1:])])
+            topology[district].append(refs)
+    return arcs, topology
+
+# ================================== #
+# Simplification
+
+def to_km(q, transform, lat0):
+    """Quantized points as local planar km (equirectangular at latitude lat0)"""
+    lon_lat = q * transform['scale'] + transform['translate']
+    return np.column_stack([lon_lat[:, 0] * KM_PER_DEGREE * np.cos(np.radians(lat0)), lon_lat[:, 1] * KM_PER_DEGREE])
+
+def importance(arcs):
+    """Douglas-Peucker importance of each arc point (km): kept at tolerance t exactly when importance >= t
+    All arcs are processed together, one recursion level (every open segment of every arc) per round."""
+    points = np.concatenate(arcs)
+    ends = np.cumsum([len(arc) for arc in arcs])
+    first, last, cap = ends - [len(arc) for arc in arcs], ends - 1, np.full(len(arcs), np.inf)
+    ranks = np.zeros(len(points))
+    ranks[first] = ranks[last] = np.inf # Arc ends (junctions) always stay
+    while True:
+        open_ = last - first >= 2
+        first, last, cap = first[open_], last[open_], cap[open_]
+        if len(first) == 0:
+            break
+        # Distance of every interior point to its segment's chord (to the start for closed arcs)
+        lengths = last - first - 1
+        segment = np.repeat(np.arange(len(first)), lengths)
+        interior = np.arange(len(segment)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + first[segment] + 1 # Point positions
+        start, direction = points[first], points[last] - points[first]
+        offsets = points[interior] - start[segment]
+        chord = np.hypot(direction[:, 0], direction[:, 1])[segment]
+        cross = np.abs(direction[segment, 0] * offsets[:, 1] - direction[segment, 1] * offsets[:, 0])
+        distances = np.where(chord > 0, cross / np.where(chord > 0, chord, 1), np.hypot(offsets[:, 0], offsets[:, 1]))
+        # Farthest point of each segment (the first one on ties)
+        farthest = np.maximum.reduceat(distances, np.cumsum(lengths) - lengths)
+        candidates = np.flatnonzero(distances == farthest[segment])
+        _, first_candidate = np.unique(segment[candidates], return_index=True)
+        split = interior[candidates[first_candidate]]
+        # A point is only considered once its parent is kept, so its importance never exceeds the parent's
+        ranks[split] = np.minimum(farthest, cap)
+        first, last, cap = np.concatenate([first, split]), np.concatenate([split, last]), np.tile(ranks[split], 2)
+    # Keep rings valid at any tolerance: one interior point per arc (two for closed arcs)
+    for arc, end in zip(arcs, ends):
+        interior = ranks[end - len(arc) + 1:end - 1]
+        keep = 2 if np.array_equal(arc[0], arc[-1]) else 1
+        interior[np.argsort(-interior)[:keep]] = np.inf
+    return np.split(ranks, ends[:-1])
+
+def ring_area(points):
+    """Absolute area of a closed ring (shoelace)"""
+    x, y = points[:, 0], points[:, 1]
+    return abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+def ring_points(refs, arcs):
+    """Closed ring from its arc references"""
+    parts = [arcs[ref] if ref >= 0 else arcs[~ref][::-1] for ref in refs]
+    return np.vstack([parts[0]] + [part[1:] for part in parts[1:]])
+
+def simplify(arcs, ranks, topology, tolerance, cell_km2):
+    """Arcs simplified to a tolerance (km), and the topology without rings smaller than tolerance² km²"""
+    simplified = [arc[rank >= tolerance] for arc, rank in zip(arcs, ranks)]
+    min_area = tolerance ** 2 / cell_km2 # In quantized grid cells
+    kept = {}
+    for district, polygons in topology.items():
+        areas = [ring_area(ring_points(polygon[0], simplified)) for polygon in polygons]
+        largest = int(np.argmax(areas))
+        kept[district] = [
+            [polygon[0]] + [refs for refs in polygon[1:] if ring_area(ring_points(refs, simplified)) >= min_area]
+            for i, polygon in enumerate(polygons) if i == largest or areas[i] >= min_area # Every district keeps its main polygon
+        ]
+    return simplified, kept
+
+def encode(arcs, topology, transform, tolerance):
+    """TopoJSON topology with the used arcs delta-encoded (renumbered in order of use)"""
+    used = sorted({ref if ref >= 0 else ~ref for polygons in topology.values() for polygon in polygons for refs in polygon for ref in refs})
+    number = {old: new for new, old in enumerate(used)}
+    renumber = lambda ref: number[ref] if ref >= 0 else ~number[~ref]
+    return {
+        'type': 'Topology',
+        'transform': transform,
+        'tolerance_km': tolerance,
+        'arcs': [np.vstack([arcs[i][:1], np.diff(arcs[i], axis=0)]).tolist() for i in used],
+        'objects': {'districts': {'type': 'GeometryCollection', 'geometries': [
+            {'type': 'MultiPolygon', 'id': district, 'arcs': [[[renumber(ref) for ref in refs] for refs in polygon] for polygon in polygons]}
+            for district, polygons in topology.items()
+        ]}}
+    }
+
+def to_geojson(topology):
+    """GeoJSON FeatureCollection (feature id = district) with coordinates rounded to the level's tolerance"""
+    scale, translate = np.array(topology['transform']['scale']), np.array(topology['transform']['translate'])
+    decimals = int(np.ceil(-np.log10(topology['tolerance_km'] / KM_PER_DEGREE / 4))) # Rounding stays well under the tolerance
+    arcs = [np.round(np.cumsum(np.array(arc), axis=0) * scale + translate, decimals) for arc in topology['arcs']]
+    features = [
+        {'type': 'Feature', 'id': geometry['id'], 'properties': {},
+         'geometry': {'type': 'MultiPolygon', 'coordinates': [[ring_points(refs, arcs).tolist() for refs in polygon]
+                                                              for polygon in geometry['arcs']]}}
+        for geometry in topology['objects']['districts']['geometries']
+    ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+# ================================== #
+# Build and cache
+
+def build_geometry(path=None):
+    """{detail: topology} from the district GeoJSON, one simplification level per DETAIL_KM entry"""
+    transform, rings = quantize(read_districts(path or data_path(GEOMETRY_FILE)))
+    arcs, topology = build_topology(rings, junctions(rings))
+    lat0 = transform['translate'][1] + transform['scale'][1] * QUANTIZATION / 2 # Middle of the bounding box
+    ranks = importance([to_km(arc, transform, lat0) for arc in arcs])
+    cell_km2 = np.prod(to_km(np.array([[1, 1]]), {'scale': transform['scale'], 'translate': [0, 0]}, lat0))
+    return {detail: encode(*simplify(arcs, ranks, topology, tolerance, cell_km2), transform, tolerance)
+            for detail, tolerance in DETAIL_KM.items()}
+
+def geometry_version():
+    """Cache key of the geometry source file"""
+    return data_version(GEOMETRY_FILE)
+
+def load_geometry():
+    """{detail: GeoJSON} for the district maps (levels saved per source version), or None without a source file"""
+    if not os.path.exists(data_path(GEOMETRY_FILE)):
+        return None
+    paths = {detail: cache_path('district_geometry', geometry_version(), f'{detail.lower()}.topojson') for detail in DETAIL_KM}
+    if not all(os.path.exists(path) for path in paths.values()):
+        for detail, topology in build_geometry().items():
+            tmp_path = f'{paths[detail]}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(topology, f, separators=(',', ':'))
+            os.replace(tmp_path, paths[detail])
+    geometry = {}
+    for detail, path in paths.items():
+        with open(path) as f:
+            geometry[detail] = to_geojson(json.load(f))
+    return geometry
+
+# ================================== #
+# Choropleth
+
+def district_map(geojson, districts, values, chart_title, value_label, value_format=',.0f', selected=None,
+                 colorscale='Blues', customdata=None, hover_extra=''):
+    """Choropleth of one value per legislative district (selected districts outlined)"""
+    districts = [str(d) for d in districts]
+    selected = set(map(str, selected or []))
+    fig = go.Figure(
+        go.Choroplethmapbox(
+            geojson=geojson,
+            locations=districts,
+            z=np.asarray(values, dtype=float),
+            colorscale=colorscale,
+            marker=dict(opacity=0.8, line=dict(color='#262730', width=[2.5 if d in selected else 0.5 for d in districts])),
+            colorbar=dict(title=value_label),
+            customdata=customdata,
+            hovertemplate=f'District %{{location}}<br>{value_label}: %{{z:{value_format}}}{hover_extra}<extra></extra>'
+        )
+    )
+    fig.update_layout(
+        title=chart_title,
+        mapbox=dict(style='carto-positron', center={'lat': 47.4, 'lon': -120.7}, zoom=5.6),
+        height=550,
+        margin=dict(l=0, r=0, t=40, b=0)
+    )
+    return fig
+
+if __name__ == '__main__':
+    geometry = load_geometry()
+    if geometry is None:
+        print(f"No district geometry: save the legislative district boundaries as data_processed/{GEOMETRY_FILE}")
+    for detail, geojson in (geometry or {}).items():
+        points = sum(len(ring) for feature in geojson['features'] for polygon in feature['geometry']['coordinates'] for ring in polygon)
+        print(f"{detail}: {points:,} points, {len(json.dumps(geojson, separators=(',', ':'))) / 1e3:,.1f} KB as GeoJSON")
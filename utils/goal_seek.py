@@ -0,0 +1,113 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# ================================== #
+# Goal seeking: the input a district needs to reach a target EV count
+# The gradient boosting model is piecewise constant in each input: with the other inputs fixed, its prediction only
+# changes where the input crosses one of the trees' split thresholds. Evaluating one point per interval between
+# consecutive thresholds therefore gives the exact prediction curve, for all 49 districts in one batched predict.
+# Curves are memoized per input; solving for a target is then a vectorized scan over the intervals.
+
+# Inputs that can be solved for: (label, display scale) as on the prediction page sliders
+GOAL_FEATURES = {
+    'charger_density': ('Charger Density (scaled, x10⁹)', 1e9),
+    'median_household_income': ('Median Household Income', 1.0)
+}
+
+def split_thresholds(model, position):
+    """Sorted unique split thresholds on one (scaled) input across all trees"""
+    return np.unique(np.concatenate([
+        tree.tree_.threshold[tree.tree_.feature == position] for tree in model.estimators_.ravel()
+    ]))
+
+def interval_points(thresholds):
+    """Smallest value in each interval between thresholds (the first interval gets a value below all of them)
+    Tree nodes send x <= threshold left after casting x to float32, so interval k is (t[k-1], t[k]] and
+    its smallest value is the first float32 above t[k-1]."""
+    lower = thresholds.astype(np.float32)
+    lower = np.where(lower > thresholds, lower, np.nextafter(lower, np.float32(np.inf))).astype(float)
+    return np.concatenate([[thresholds[0] - 1.0], lower])
+
+def interval_of(values, thresholds):
+    """Interval index of each (scaled) value, with the trees' float32 comparison"""
+    return np.searchsorted(thresholds, values.astype(np.float32).astype(float), side='left')
+
+class GoalSeeker:
+    """Minimum input value each district needs to reach a target EV count, solved exactly on the model's split thresholds"""
+    def __init__(self, model, scaler, features, ev_merged):
+        self.model = model
+        self.scaler = scaler
+        self.features = list(features)
+        self.districts = ev_merged['legislative_district'].astype(str).to_numpy()
+        self.scaled = scaler.transform(ev_merged[self.features]) # One row per district
+        self._curves = lru_cache(maxsize=None)(self._curve)
+
+    def _curve(self, feature):
+        """Thresholds, interval points and predictions (districts x intervals) for one input"""
+        position = self.features.index(feature)
+        thresholds = split_thresholds(self.model, position)
+        points = interval_points(thresholds)
+        grid = np.repeat(self.scaled, len(points), axis=0)
+        grid[:, position] = np.tile(points, len(self.scaled))
+        predictions = self.model.predict(grid).reshape(len(self.scaled), len(points))
+        return thresholds, points, predictions
+
+    def unscale(self, feature, values):
+        """Scaled input values back in original units"""
+        position = self.features.index(feature)
+        return values * self.scaler.scale_[position] + self.scaler.mean_[position]
+
+    def solve(self, feature, target):
+        """Per district: current value and prediction, the smallest value at or above the current one that reaches
+        the target (NaN when no value does) and the best prediction reachable by raising the input"""
+        thresholds, points, predictions = self._curves(feature)
+        position = self.features.index(feature)
+        rows = np.arange(len(self.scaled))
+        current = self.scaled[:, position]
+        current_interval = interval_of(current, thresholds)
+
+        # Only intervals at or above the current value: the input is raised, never lowered
+        ahead = np.arange(len(points))[None, :] >= current_interval[:, None]
+        reached = ahead & (predictions >= target)
+        reachable = reached.any(axis=1)
+        first = reached.argmax(axis=1)
+        needed = np.where(first == current_interval, current, points[first]) # Already there: keep the current value
+        best = np.where(ahead, predictions, -np.inf).max(axis=1)
+
+        current_value = self.unscale(feature, current)
+        needed_value = np.where(reachable, self.unscale(feature, needed), np.nan)
+        return pd.DataFrame({
+            'legislative_district': self.districts,
+            'current_value': current_value,
+            'current_prediction': predictions[rows, current_interval],
+            'needed_value': needed_value,
+            'change': needed_value - current_value,
+            'predicted_at_needed': np.where(reachable, predictions[rows, first], np.nan),
+            'best_prediction': best,
+            'reachable': reachable
+        })
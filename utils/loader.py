@@ -0,0 +1,179 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data import data_path
+
+# ================================== #
+# Schema of the raw Electric Vehicle Population export
+
+RAW_CSV = './data/Electric_Vehicle_Population_Data_20241003.csv'
+EV_PARQUET = 'ev.parquet' # Columnar store written to data_processed/
+CHUNK_SIZE = 50_000 # Rows parsed per chunk
+
+# Read everything as text/float first; the typed schema is applied after cleaning each chunk
+RAW_DTYPES = {
+    'Postal Code': 'object',
+    'Legislative District': 'object',
+    'DOL Vehicle ID': 'object',
+    '2020 Census Tract': 'object'
+}
+RENAME_COLUMNS = {
+    'vin_(1-10)': 'vin',
+    'electric_vehicle_type': 'ev_type',
+    'clean_alternative_fuel_vehicle_(cafv)_eligibility': 'cafv_eligibility'
+}
+# Low-cardinality text columns stored as categoricals (categories are fixed by the first pass)
+CATEGORICAL_COLUMNS = [
+    'vin', 'county', 'city', 'state', 'postal_code', 'make', 'model', 'ev_type', 'cafv_eligibility',
+    'legislative_district', 'vehicle_location', 'electric_utility', '2020_census_tract'
+]
+# Compact numeric types (nullable where the raw export can be empty)
+NUMERIC_DTYPES = {
+    'model_year': 'int16',
+    'electric_range': 'Int16',
+    'base_msrp': 'Int32',
+    'dol_vehicle_id': 'Int64'
+}
+# Columns whose categories below RARE_THRESHOLD of all rows are replaced with 'Other'
+RARE_COLUMNS = ['ev_type', 'cafv_eligibility', 'electric_utility']
+RARE_THRESHOLD = 0.01
+# Columns read by the cleaning rules (clean_chunk)
+CLEAN_COLUMNS = ['county', 'city', 'postal_code', 'electric_utility', '2020_census_tract',
+                 'legislative_district', 'make', 'model', 'model_year', 'electric_range', 'base_msrp']
+
+def normalize_columns(df):
+    """Lower-case, underscore-join and rename raw column names (same rule as the data prep notebook)"""
+    df.columns = ['_'.join(col.strip().lower().split()) for col in df.columns]
+    return df.rename(columns=RENAME_COLUMNS)
+
+# ================================== #
+# Cleaning rules (applied chunk by chunk)
+
+def clean_chunk(ev):
+    """Apply the notebook's missing-value rules to one chunk"""
+    # county, city, postal code, electric_utility, 2020_census_tract -> remove rows where all are null
+    ev = ev.dropna(subset=['county', 'city', 'postal_code', 'electric_utility', '2020_census_tract'], how='all')
+
+    # legislative_district -> drop null
+    ev = ev.dropna(subset=['legislative_district'])
+
+    # model -> impute
+    cond = (ev['make'] == 'GMC') & ev['model'].isna()
+    ev.loc[cond, 'model'] = 'HUMMER EV PICKUP'
+
+    # electric_range, base_msrp -> impute
+    cond = (ev['model_year'] == 2024) & (ev['make'] == 'MERCEDES-BENZ') & (ev['model'] == 'S-CLASS')
+    ev.loc[cond & ev['electric_range'].isna(), 'electric_range'] = 46
+    ev.loc[cond & ev['base_msrp'].isna(), 'base_msrp'] = 0
+    return ev
+
+def raw_usecols(path, columns):
+    """Raw CSV header names of the given normalized column names"""
+    header = pd.read_csv(path, nrows=0).columns
+    raw_cols = dict(zip(normalize_columns(pd.DataFrame(columns=header)).columns, header)) # Normalized -> raw name
+    return [raw_cols[col] for col in dict.fromkeys(columns)]
+
+def iter_clean_chunks(path, chunk_size=CHUNK_SIZE, usecols=None):
+    """Stream the raw CSV as cleaned chunks with normalized column names"""
+    reader = pd.read_csv(path, dtype=RAW_DTYPES, chunksize=chunk_size, usecols=usecols)
+    for chunk in reader:
+        yield clean_chunk(normalize_columns(chunk))
+
+# ================================== #
+# Two-pass streaming conversion
+
+def scan_categories(path, chunk_size=CHUNK_SIZE):
+    """First pass: count category values of the cleaned data (only categorical columns are materialized)"""
+    usecols = raw_usecols(path, CATEGORICAL_COLUMNS + CLEAN_COLUMNS)
+
+    counts = {col: pd.Series(dtype='int64') for col in CATEGORICAL_COLUMNS}
+    n_rows = 0
+    for chunk in iter_clean_chunks(path, chunk_size, usecols=usecols):
+        n_rows += len(chunk)
+        for col in CATEGORICAL_COLUMNS:
+            counts[col] = counts[col].add(chunk[col].value_counts(), fill_value=0)
+    return counts, n_rows
+
+def build_schema(counts, n_rows, rare_threshold=RARE_THRESHOLD):
+    """Fixed categorical dtypes and rare-category maps derived from the first pass"""
+    rare_maps, dtypes = {}, dict(NUMERIC_DTYPES)
+    for col, value_counts in counts.items():
+        categories = value_counts.index
+        if col in RARE_COLUMNS:
+            rare = value_counts[value_counts < n_rows * rare_threshold].index
+            rare_maps[col] = dict.fromkeys(rare, 'Other')
+            categories = categories.difference(rare)
+            if len(rare):
+                categories = categories.append(pd.Index(['Other']))
+        dtypes[col] = pd.CategoricalDtype(sorted(categories))
+    return dtypes, rare_maps
+
+def apply_schema(ev, dtypes, rare_maps):
+    """Replace rare categories and cast a cleaned chunk to the compact schema"""
+    for col, rare_map in rare_maps.items():
+        if rare_map:
+            ev[col] = ev[col].replace(rare_map)
+    ev['dol_vehicle_id'] = pd.to_numeric(ev['dol_vehicle_id'], errors='coerce')
+    return ev.astype(dtypes).reset_index(drop=True)
+
+def convert_csv_to_parquet(path=RAW_CSV, out_path=None, chunk_size=CHUNK_SIZE):
+    """Stream the raw CSV through cleaning and the typed schema into a Parquet columnar store"""
+    out_path = out_path or data_path(EV_PARQUET)
+    counts, n_rows = scan_categories(path, chunk_size)
+    dtypes, rare_maps = build_schema(counts, n_rows)
+
+    tmp_path = f'{out_path}.tmp'
+    writer = None
+    try:
+        for chunk in iter_clean_chunks(path, chunk_size):
+            table = pa.Table.from_pandas(apply_schema(chunk, dtypes, rare_maps), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression='zstd')
+            writer.write_table(table) # One row group per chunk
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, out_path)
+    return out_path, n_rows
+
+def load_ev(path=None, columns=None):
+    """Load the EV registration table from the columnar store (categoricals are restored)"""
+    return pd.read_parquet(path or data_path(EV_PARQUET), columns=columns)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the raw EV population CSV into the columnar store')
+    parser.add_argument('csv', nargs='?', default=RAW_CSV, help='Raw Electric Vehicle Population CSV')
+    parser.add_argument('--out', default=None, help='Output Parquet path (default: data_processed/ev.parquet)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per chunk')
+    args = parser.parse_args()
+
+    out_path, n_rows = convert_csv_to_parquet(args.csv, args.out, args.chunk_size)
+    print(f'Wrote {n_rows:,} rows to {out_path} ({os.path.getsize(out_path) / 1e6:.1f} MB)')
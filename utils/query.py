@@ -0,0 +1,178 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb # Optional: embedded SQL engine (pip install duckdb); pandas is used without it
+except ImportError:
+    duckdb = None
+
+from utils import telemetry
+from utils.data import cache_path, data_version
+
+# ================================== #
+# Query backends for the EV Analysis aggregations
+# The page asks for counts, per-group means and distinct values, optionally within some legislative districts,
+# and never filters the EV table itself. Two interchangeable backends answer these:
+# - DuckDBBackend: SQL over a Parquet copy of the queried columns on an embedded, multi-threaded engine (only the
+#   columns a query reads are scanned; nothing but the small result is materialized in pandas). The copy is sorted
+#   by district in small row groups, so district filters skip the row groups of other districts (min/max statistics).
+# - PandasBackend: the same results from the in-memory table (used when duckdb is not installed)
+# Both return identical frames: counts ordered by count (descending) then value, groups ordered by key.
+
+BACKEND = os.environ.get('EV_QUERY_BACKEND', 'duckdb') # Set EV_QUERY_BACKEND=pandas to force the pandas backend
+DISTRICT_COLUMN = 'legislative_district'
+ROW_GROUP_ROWS = 100_000 # Parquet row group size of the query copy (granularity of district pruning)
+QUERY_COLUMNS = [DISTRICT_COLUMN, 'ev_type', 'make', 'model', 'model_year', 'electric_range', 'county', 'city', '2020_census_tract']
+
+def plain(values):
+    """Categorical result keys as their plain values (ordered by value, like SQL, not by category order)"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.dtype.categories.dtype)
+    return values
+
+class PandasBackend:
+    """Aggregations on the in-memory EV table (column masks, no filtered copy of the table)"""
+    name = 'pandas'
+
+    def __init__(self, ev):
+        self.ev = ev
+
+    def rows(self, districts):
+        """Row mask of the districts (None: every row)"""
+        if not districts:
+            return None
+        return self.ev[DISTRICT_COLUMN].isin(districts).to_numpy()
+
+    def column(self, name, districts=None):
+        """One column, restricted to the districts"""
+        mask = self.rows(districts)
+        return self.ev[name] if mask is None else self.ev[name][mask]
+
+    def counts(self, column, districts=None):
+        """Rows per value of a column (values with rows only), largest first"""
+        with telemetry.timer(f'query/{self.name}/counts'):
+            counts = self.column(column, districts).value_counts()
+            counts = counts[counts > 0] # Categorical counts include absent values
+            counts.index = plain(counts.index)
+            order = np.lexsort((counts.index.to_numpy(), -counts.to_numpy()))
+            return counts.iloc[order].rename('count').rename_axis(column)
+
+    def counts_by(self, columns, districts=None):
+        """Rows per combination of column values, ordered by the columns"""
+        with telemetry.timer(f'query/{self.name}/counts_by'):
+            mask = self.rows(districts)
+            frame = self.ev[columns] if mask is None else self.ev.loc[mask, columns]
+            counts = frame.groupby(columns, observed=True).size().reset_index(name='count')
+            return counts.assign(**{c: plain(counts[c]) for c in columns}).sort_values(columns, ignore_index=True)
+
+    def nonzero_mean_by(self, column, value, districts=None):
+        """Mean of a value per group, over the rows where the value is neither null nor 0"""
+        with telemetry.timer(f'query/{self.name}/nonzero_mean_by'):
+            values = self.column(value, districts)
+            keep = (values.notna() & (values != 0)).to_numpy()
+            groups = self.column(column, districts)[keep]
+            means = values[keep].astype(float).groupby(groups, observed=True).mean()
+            means.index = plain(means.index)
+            return means.sort_index().rename(value).rename_axis(column)
+
+    def distinct(self, column, districts=None):
+        """Sorted distinct values of a column, as text"""
+        with telemetry.timer(f'query/{self.name}/distinct'):
+            values = self.column(column, districts)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Categories that occur (no per-row strings)
+                codes = values.cat.codes.to_numpy()
+                categories = values.cat.categories
+                values = categories[np.bincount(codes[codes >= 0], minlength=len(categories)) > 0].astype(str)
+            else:
+                values = values.dropna().astype(str).unique()
+            return np.sort(np.asarray(values, dtype=object))
+
+class DuckDBBackend:
+    """Aggregations as SQL over a Parquet file (DuckDB); results match PandasBackend"""
+    name = 'duckdb'
+
+    def __init__(self, path, threads=None):
+        self.path = path
+        self.connection = duckdb.connect()
+        if threads:
+            self.connection.execute(f'SET threads TO {int(threads)}')
+        escaped = path.replace("'", "''")
+        self.connection.execute(f"CREATE VIEW ev AS SELECT * FROM read_parquet('{escaped}')")
+
+    def query(self, sql, districts):
+        """Run a query with a {where} placeholder for the district filter (one cursor per call: thread-safe)"""
+        if not districts:
+            return self.connection.cursor().execute(sql.format(where='TRUE')).df()
+        # A literal IN list (not a subquery) is pushed down into the Parquet scan
+        where = f'"{DISTRICT_COLUMN}" IN ({", ".join("?" * len(districts))})'
+        return self.connection.cursor().execute(sql.format(where=where), [str(d) for d in districts]).df()
+
+    def counts(self, column, districts=None):
+        with telemetry.timer(f'query/{self.name}/counts'):
+            result = self.query(f'SELECT "{column}", COUNT(*) AS "count" FROM ev WHERE {{where}} AND "{column}" IS NOT NULL '
+                                f'GROUP BY 1 ORDER BY 2 DESC, 1', districts)
+            return result.set_index(column)['count']
+
+    def counts_by(self, columns, districts=None):
+        with telemetry.timer(f'query/{self.name}/counts_by'):
+            keys = ', '.join(f'"{c}"' for c in columns)
+            not_null = ' AND '.join(f'"{c}" IS NOT NULL' for c in columns)
+            return self.query(f'SELECT {keys}, COUNT(*) AS "count" FROM ev WHERE {{where}} AND {not_null} '
+                              f'GROUP BY ALL ORDER BY ALL', districts)
+
+    def nonzero_mean_by(self, column, value, districts=None):
+        with telemetry.timer(f'query/{self.name}/nonzero_mean_by'):
+            result = self.query(f'SELECT "{column}", AVG("{value}") AS "{value}" FROM ev WHERE {{where}} AND "{column}" IS NOT NULL '
+                                f'AND "{value}" IS NOT NULL AND "{value}" != 0 GROUP BY 1 ORDER BY 1', districts)
+            return result.set_index(column)[value]
+
+    def distinct(self, column, districts=None):
+        with telemetry.timer(f'query/{self.name}/distinct'):
+            result = self.query(f'SELECT DISTINCT CAST("{column}" AS VARCHAR) AS v FROM ev WHERE {{where}} AND "{column}" IS NOT NULL '
+                                f'ORDER BY 1', districts)
+            return result['v'].to_numpy(dtype=object)
+
+def write_query_table(ev, path):
+    """Queried columns as Parquet, sorted by district in small row groups (written atomically)"""
+    tmp_path = f'{path}.tmp'
+    table = ev[[c for c in QUERY_COLUMNS if c in ev.columns]].sort_values(DISTRICT_COLUMN, kind='stable')
+    table.to_parquet(tmp_path, index=False, row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp_path, path)
+    return path
+
+def parquet_path(ev, ev_file):
+    """Query copy of the EV table, written on first use per data version"""
+    path = cache_path('query', data_version(ev_file), 'ev.parquet')
+    return path if os.path.exists(path) else write_query_table(ev, path)
+
+def load_backend(ev, ev_file='ev.pickle', backend=BACKEND):
+    """DuckDB backend over the table's Parquet file, or the pandas backend (requested, or duckdb not installed)"""
+    if backend == 'duckdb' and duckdb is not None:
+        return DuckDBBackend(parquet_path(ev, ev_file))
+    return PandasBackend(ev)
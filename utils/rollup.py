@@ -0,0 +1,149 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.data import cache_path, data_version, load_pickle, save_pickle
+
+# ================================== #
+# Hierarchical rollup of the EV table: state > legislative district > county > city > census tract
+# Districts cross county lines (and cities cross districts), so each node is a path: "county X within district Y"
+# is a child of district Y. The table is scanned once (a group-by at the finest path); every coarser level is a
+# group-by of that small table. Nodes of each level are ordered by parent, so the children of a node, and all
+# descendants of a range of nodes at any deeper level, are one contiguous slice: drill-down costs O(children).
+# Views by name (e.g. all counties, summed over districts) are kept per level as well.
+
+LEVELS = ['state', 'legislative_district', 'county', 'city', '2020_census_tract']
+LEVEL_LABELS = {'state': 'State', 'legislative_district': 'Legislative District', 'county': 'County',
+                'city': 'City', '2020_census_tract': 'Census Tract'}
+MISSING = '(unknown)' # Key of rows without a value at some level (kept so every level sums to the same total)
+ELIGIBLE = 'Clean Alternative Fuel Vehicle Eligible'
+CACHE_FORMAT = 1 # Bump when Rollup changes, so older pickles in cache/ are not reused
+
+def starts_with(series, prefix):
+    """Boolean array: value starts with prefix (categoricals are tested once per category)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return np.append(series.cat.categories.astype(str).str.startswith(prefix), False)[series.cat.codes.to_numpy()]
+    return series.astype('string').str.startswith(prefix).fillna(False).to_numpy(bool)
+
+def row_measures(ev):
+    """Additive measures per EV row besides the row count (counts and sums, so any group's totals are sums of its parts)"""
+    electric_range = pd.to_numeric(ev['electric_range'], errors='coerce').to_numpy(float)
+    has_range = electric_range > 0 # Zero means "not researched" in the export
+    return {
+        'bev_count': starts_with(ev['ev_type'], 'Battery'),
+        'cafv_eligible_count': (ev['cafv_eligibility'] == ELIGIBLE).to_numpy(bool),
+        'range_sum': np.where(has_range, electric_range, 0.0),
+        'range_count': has_range
+    }
+
+def with_rates(table):
+    """Add shares and the average electric range to a table of measures"""
+    return table.assign(
+        bev_share=table['bev_count'] / table['ev_count'],
+        cafv_eligible_share=table['cafv_eligible_count'] / table['ev_count'],
+        avg_electric_range=table['range_sum'] / table['range_count'].where(table['range_count'] > 0)
+    )
+
+class Rollup:
+    """Per-level node tables (indexed by path) with child offsets, plus per-level totals by name"""
+    def __init__(self, ev):
+        keys = pd.DataFrame({level: self.key_column(ev[level]) for level in LEVELS}, index=ev.index)
+        # The one pass over the rows: a group number per row at the finest path, then weighted counts per group
+        group = keys.groupby(LEVELS, observed=True, sort=False).ngroup().to_numpy()
+        # Without sorting, groups are numbered by first appearance: a group's first row is where the running max grows
+        first = np.flatnonzero(np.diff(np.maximum.accumulate(group), prepend=-1) > 0)
+        leaf = keys.iloc[first].astype(str).reset_index(drop=True) # Small table from here on: plain string keys
+        leaf['ev_count'] = np.bincount(group, minlength=len(leaf))
+        for name, values in row_measures(ev).items():
+            totals = np.bincount(group, weights=values, minlength=len(leaf))
+            leaf[name] = totals if name.endswith('_sum') else totals.astype(np.int64)
+
+        self.nodes, self.child_starts = [], []
+        for depth in range(len(LEVELS)):
+            nodes = leaf.groupby(LEVELS[:depth + 1], sort=False).sum(numeric_only=True)
+            if depth == 0:
+                parent = np.zeros(len(nodes), dtype=np.int64)
+            else:
+                parent = self.nodes[-1].index.get_indexer(nodes.index.droplevel(depth))
+            order = np.lexsort((-nodes['ev_count'].to_numpy(), parent)) # By parent, then largest first
+            nodes, parent = nodes.iloc[order], parent[order]
+            if depth > 0: # Offsets of each parent's children (parents are sorted, so children are contiguous)
+                self.child_starts.append(np.searchsorted(parent, np.arange(len(self.nodes[-1]) + 1)))
+            self.nodes.append(nodes)
+        self.totals = {level: leaf.groupby(level, sort=False).sum(numeric_only=True).sort_values('ev_count', ascending=False)
+                       for level in LEVELS}
+
+    @staticmethod
+    def key_column(series):
+        """Level keys with missing values as MISSING (categoricals stay categorical for a fast group-by)"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            if series.isna().any():
+                series = series.cat.add_categories([MISSING]).fillna(MISSING)
+            return series
+        return series.astype('string').fillna(MISSING).astype('category')
+
+    def children(self, path=()):
+        """Child nodes of the node at path (a tuple of keys from the state down), the states for an empty path"""
+        path = tuple(str(key) for key in path)
+        if not path:
+            return with_rates(self.nodes[0])
+        depth = len(path) - 1
+        if depth >= len(LEVELS) - 1:
+            return with_rates(self.nodes[-1].iloc[:0])
+        position = self.nodes[depth].index.get_loc(path[0] if depth == 0 else path)
+        starts = self.child_starts[depth]
+        return with_rates(self.nodes[depth + 1].iloc[starts[position]:starts[position + 1]])
+
+    def view(self, level, within_level=None, within=None):
+        """Totals by name at level, over everything or only under the given names at an ancestor level"""
+        if within_level is None or not within:
+            return with_rates(self.totals[level])
+        top, depth = LEVELS.index(within_level), LEVELS.index(level)
+        names = self.nodes[top].index.get_level_values(top)
+        positions = np.flatnonzero(names.isin([str(name) for name in within]))
+        # Descend level by level: the descendants of one node are a contiguous range at every deeper level
+        starts, ends = positions, positions + 1
+        for step in range(top, depth):
+            starts, ends = self.child_starts[step][starts], self.child_starts[step][ends]
+        rows = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)]) if len(starts) else np.zeros(0, dtype=int)
+        table = self.nodes[depth].iloc[rows]
+        return with_rates(table.groupby(level=depth, sort=False).sum().sort_values('ev_count', ascending=False))
+
+# ================================== #
+# Cached rollup
+
+def rollup_version(ev_file='ev.pickle'):
+    """Cache key of the rollup: EV data version plus the cache format"""
+    return f'{data_version(ev_file)}_v{CACHE_FORMAT}'
+
+def load_rollup(ev, ev_file='ev.pickle'):
+    """Load the persisted rollup for this data version, building and saving it on a miss"""
+    path = cache_path(f'ev_rollup_{rollup_version(ev_file)}.pickle')
+    try:
+        return load_pickle(path)
+    except (FileNotFoundError, EOFError):
+        rollup = Rollup(ev)
+        save_pickle(rollup, path)
+        return rollup
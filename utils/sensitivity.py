@@ -0,0 +1,201 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.stats import qmc
+
+from utils.data import data_path, cache_path, data_version, load_pickle, save_pickle
+
+# ================================== #
+# Global sensitivity of the predicted EV count (Sobol indices)
+# Inputs are drawn from distributions fitted to ev_merged (normal or lognormal per input, whichever fits better,
+# truncated to the observed range). Saltelli's scheme takes two quasi-random (scrambled Sobol) matrices A and B
+# and, for each input i, a matrix AB_i equal to A with column i taken from B: N * (d + 2) model evaluations.
+# The model scores them in large batches on a process pool. First-order indices use Saltelli (2010) and total
+# indices Jansen's estimator. Convergence is checked on prefixes of the sequence (each a valid smaller design)
+# and with bootstrap confidence intervals. Results are saved per model artifact and dataset version.
+# Usage (from the repository root, to precompute at deploy time):
+#   python -m utils.sensitivity
+#   python -m utils.sensitivity --samples 65536 --workers 4
+
+MODEL_FILE = 'final_model.pkl'
+DEFAULT_SAMPLES = 2 ** 13 # Base samples N (a power of 2 keeps the Sobol sequence balanced)
+BATCH_ROWS = 2 ** 15 # Rows scored per model call
+BOOTSTRAP_RESAMPLES = 200
+CONFIDENCE = 0.95
+CONVERGENCE_STEPS = 5 # Prefixes N/16 ... N
+SEED = 0
+CANDIDATE_DISTRIBUTIONS = {'normal': stats.norm, 'lognormal': stats.lognorm}
+
+def fit_marginals(ev_merged, features):
+    """Per input: the better-fitting of a normal and a lognormal (lowest KS statistic), truncated to the observed range"""
+    marginals = {}
+    for feature in features:
+        values = ev_merged[feature].to_numpy(float)
+        fits = []
+        for name, family in CANDIDATE_DISTRIBUTIONS.items():
+            if name == 'lognormal' and values.min() <= 0:
+                continue
+            params = family.fit(values, floc=0) if name == 'lognormal' else family.fit(values)
+            fits.append((stats.kstest(values, family.cdf, args=params).statistic, name, family(*params)))
+        _, name, dist = min(fits, key=lambda fit: fit[0])
+        marginals[feature] = (name, dist, dist.cdf(values.min()), dist.cdf(values.max()))
+    return marginals
+
+def to_inputs(u, marginals):
+    """Map unit-cube samples (n, d) to input values through each truncated marginal's inverse CDF"""
+    columns = []
+    for i, (name, dist, low, high) in enumerate(marginals.values()):
+        columns.append(dist.ppf(low + u[:, i] * (high - low)))
+    return np.column_stack(columns)
+
+def saltelli_design(samples, d, seed=SEED):
+    """Unit-cube design rows [A; B; AB_1 ... AB_d], shape (samples * (d + 2), d)"""
+    base = qmc.Sobol(2 * d, scramble=True, seed=seed).random_base2(int(np.log2(samples)))
+    a, b = base[:, :d], base[:, d:]
+    ab = np.repeat(a[None, :, :], d, axis=0)
+    for i in range(d):
+        ab[i, :, i] = b[:, i]
+    return np.concatenate([a, b, ab.reshape(-1, d)])
+
+def sobol_indices(f_a, f_b, f_ab):
+    """First-order (Saltelli 2010) and total (Jansen) indices from outputs f_a, f_b (n,) and f_ab (d, n)"""
+    variance = np.var(np.concatenate([f_a, f_b]))
+    first = np.mean(f_b * (f_ab - f_a), axis=1) / variance
+    total = 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance
+    return first, total
+
+def split_outputs(outputs, samples, d):
+    """f_a, f_b and f_ab (d, n) from outputs in design-row order"""
+    return outputs[:samples], outputs[samples:2 * samples], outputs[2 * samples:].reshape(d, samples)
+
+def bootstrap_intervals(f_a, f_b, f_ab, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE, seed=SEED):
+    """Percentile confidence intervals of the first-order and total indices, each (2, d)"""
+    rng = np.random.default_rng(seed)
+    draws = np.empty((resamples, 2, len(f_ab)))
+    for r in range(resamples):
+        idx = rng.integers(0, len(f_a), len(f_a))
+        draws[r] = sobol_indices(f_a[idx], f_b[idx], f_ab[:, idx])
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(draws, [tail, 100 - tail], axis=0)
+    return np.stack([low[0], high[0]]), np.stack([low[1], high[1]])
+
+# ================================== #
+# Process-pool scoring
+
+_model = None # Model bundle of a pool worker process only (never set in the app server, which serves several models)
+
+def _load_worker(model_file=MODEL_FILE):
+    """Pool initializer: load the model bundle once per worker"""
+    global _model
+    _model = load_pickle(data_path(model_file))
+
+def _score_worker_batch(batch):
+    """Score a batch with the worker's model bundle"""
+    return score_batch(_model, batch)
+
+def score_batch(model_bundle, batch):
+    """Predicted EV count for a batch of input rows (original units, in selected_features order)"""
+    scaler = model_bundle['scaler']
+    return model_bundle['model'].predict((batch - scaler.mean_) / scaler.scale_) # StandardScaler.transform on a plain array
+
+def score(inputs, workers=None, model_file=MODEL_FILE):
+    """Score all input rows in batches, on a process pool when more than one worker is available"""
+    batches = [inputs[start:start + BATCH_ROWS] for start in range(0, len(inputs), BATCH_ROWS)]
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers == 1:
+        # In-process: a local bundle, so concurrent sessions scoring other model files cannot swap it
+        model_bundle = load_pickle(data_path(model_file))
+        return np.concatenate([score_batch(model_bundle, batch) for batch in batches])
+    # Spawned (not forked) workers: the app server is multi-threaded, and a forked worker could inherit a held lock
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker, initargs=(model_file,),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        return np.concatenate(list(pool.map(_score_worker_batch, batches)))
+
+def sobol_analysis(ev_merged, samples=DEFAULT_SAMPLES, workers=None, model_file=MODEL_FILE):
+    """Sobol indices of the predicted EV count over input distributions fitted to ev_merged
+    Returns a dict: indices (per input, with confidence intervals), convergence (indices per sample size),
+    distributions (fitted marginal per input), plus output mean/variance, evaluation count and timing."""
+    start = time.perf_counter()
+    features = load_pickle(data_path(model_file))['selected_features']
+    d = len(features)
+    marginals = fit_marginals(ev_merged, features)
+    outputs = score(to_inputs(saltelli_design(samples, d), marginals), workers, model_file)
+
+    f_a, f_b, f_ab = split_outputs(outputs, samples, d)
+    first, total = sobol_indices(f_a, f_b, f_ab)
+    first_ci, total_ci = bootstrap_intervals(f_a, f_b, f_ab)
+    indices = pd.DataFrame({
+        'feature': features,
+        'first_order': first, 'first_order_low': first_ci[0], 'first_order_high': first_ci[1],
+        'total': total, 'total_low': total_ci[0], 'total_high': total_ci[1]
+    })
+
+    # Prefixes of a scrambled Sobol sequence of power-of-2 length are balanced designs themselves
+    convergence = []
+    for n in sorted({max(samples >> step, 2) for step in range(CONVERGENCE_STEPS)}):
+        first_n, total_n = sobol_indices(f_a[:n], f_b[:n], f_ab[:, :n])
+        convergence.append(pd.DataFrame({'samples': n, 'feature': features, 'first_order': first_n, 'total': total_n}))
+
+    return {
+        'indices': indices,
+        'convergence': pd.concat(convergence, ignore_index=True),
+        'distributions': {feature: name for feature, (name, *_) in marginals.items()},
+        'mean': float(outputs.mean()),
+        'variance': float(np.var(np.concatenate([f_a, f_b]))),
+        'samples': samples,
+        'evaluations': len(outputs),
+        'seconds': time.perf_counter() - start
+    }
+
+def load_sensitivity(ev_merged, samples=DEFAULT_SAMPLES, workers=None, model_file=MODEL_FILE):
+    """Load the saved analysis for this model artifact and dataset version, computing and saving it on a miss"""
+    path = cache_path(f'sensitivity_{data_version(model_file, "ev_merged.pickle")}_{samples}.pickle')
+    try:
+        return load_pickle(path)
+    except (FileNotFoundError, EOFError):
+        result = sobol_analysis(ev_merged, samples, workers, model_file)
+        save_pickle(result, path)
+        return result
+
+# ================================== #
+# Command line
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute and save the Sobol sensitivity indices of the prediction model')
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES, help='Base samples N, a power of 2 (N * (d + 2) model evaluations)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: the CPU count)')
+    parser.add_argument('--model', default=MODEL_FILE, help='Model artifact in data_processed (e.g. final_model_compact.pkl)')
+    args = parser.parse_args()
+
+    result = load_sensitivity(load_pickle(data_path('ev_merged.pickle')), args.samples, args.workers, args.model)
+    print(result['indices'].round(3).to_string(index=False))
+    print(f"{result['evaluations']:,} model evaluations in {result['seconds']:.1f}s")
@@ -0,0 +1,67 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import shutil
+
+import shap
+import streamlit.components.v1 as components
+
+from utils import telemetry
+from utils.data import CACHE_DIR
+
+# ================================== #
+# SHAP force plot component
+# The SHAP JavaScript bundle (~300 KB) is served once as a static, versioned file next to the component page
+# and cached by the browser. Per rerun only the force-plot data (base value, attributions, feature values)
+# travels as component args, and the page re-renders the plot in place (see utils/frontend/force_plot.html).
+
+FRONTEND_HTML = os.path.join(os.path.dirname(__file__), 'frontend', 'force_plot.html')
+COMPONENT_DIR = os.path.abspath(os.path.join(CACHE_DIR, 'components', 'force_plot')) # Served as static files
+SHAP_BUNDLE = os.path.join(os.path.dirname(shap.__file__), 'plots', 'resources', 'bundle.js') # What shap.getjs() inlines
+
+def build_component_dir():
+    """Assemble the static folder: component page and SHAP bundle"""
+    os.makedirs(COMPONENT_DIR, exist_ok=True)
+
+    # Versioned bundle name, so a SHAP upgrade is never served from a stale browser cache
+    shap_js = f'shap-{shap.__version__}.js'
+    if not os.path.exists(os.path.join(COMPONENT_DIR, shap_js)):
+        shutil.copyfile(SHAP_BUNDLE, os.path.join(COMPONENT_DIR, shap_js))
+
+    with open(FRONTEND_HTML, encoding='utf-8') as f:
+        page = f.read().replace('__SHAP_JS__', shap_js)
+    with open(os.path.join(COMPONENT_DIR, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(page)
+
+build_component_dir()
+_force_plot = components.declare_component('force_plot', path=COMPONENT_DIR)
+
+def force_plot_chart(plot, key=None):
+    """Show a SHAP force plot (the visualizer returned by shap.force_plot) without resending the SHAP bundle"""
+    args = {'data': {**plot.data, 'labelMargin': 20}} # Same data shap's own html() embeds
+    if telemetry.PAYLOADS:
+        telemetry.record(f'payload/{key}', len(json.dumps(args)), unit='B')
+        telemetry.record(f'payload/{key}/bundle', os.path.getsize(SHAP_BUNDLE), unit='B') # Fetched once per SHAP version
+    return _force_plot(**args, key=key, default=None)
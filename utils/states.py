@@ -0,0 +1,163 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.data import data_path
+
+# ================================== #
+# State-level analytics (cross-state comparison)
+# State data is held as a dense (year x state x metric) array: the 2023 registration counts of ev_state.pickle
+# plus any extra years or metrics found in data_processed/state_history.csv. Derived metrics, ranks and
+# percentiles are computed for every year and metric at once along the state axis, then split into one
+# wide table per year, so charts only look results up.
+
+STATE_DATA_YEAR = 2023 # ev_state.pickle: AFDC light-duty EV registrations by state, 2023
+STATE_HISTORY = 'state_history.csv' # Optional, in data_processed/: columns state, year and one column per metric
+FOCUS_STATE = 'Washington'
+
+# Display labels, in display order (derived metrics appear only when their inputs are available)
+METRIC_LABELS = {
+    'registration_count': 'EV Registrations',
+    'per_1000_residents': 'EVs per 1,000 Residents', # Needs 'population'
+    'share_of_us': 'Share of U.S. EV Registrations',
+    'growth_yoy': 'Year-over-Year Growth', # Needs the previous year
+    'population': 'Population',
+}
+
+def load_state_history(name=STATE_HISTORY):
+    """Extra state metrics by year (None if the file is absent)"""
+    path = data_path(name)
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path)
+
+def state_cube(ev_state, history=None):
+    """(years, states, metric names, values[year, state, metric]) with base and derived metrics"""
+    frames = [ev_state.assign(year=STATE_DATA_YEAR)]
+    if history is not None:
+        frames.append(history)
+    long = pd.concat(frames, ignore_index=True).melt(id_vars=['state', 'year'], var_name='metric', value_name='value')
+    long = long.dropna(subset=['value']).drop_duplicates(['state', 'year', 'metric'], keep='last') # The history file wins
+
+    # Scatter into a dense array; the year axis is regular so "previous year" is one step back
+    state_codes, states = pd.factorize(long['state'], sort=True)
+    metric_codes, base_metrics = pd.factorize(long['metric'], sort=True)
+    states = states.to_numpy(str)
+    first_year, last_year = long['year'].min(), long['year'].max()
+    years = np.arange(first_year, last_year + 1)
+    values = np.full((len(years), len(states), len(base_metrics)), np.nan)
+    values[long['year'].to_numpy() - first_year, state_codes, metric_codes] = long['value'].to_numpy(float)
+    metrics = {name: values[:, :, i] for i, name in enumerate(base_metrics)}
+
+    counts = metrics['registration_count']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['share_of_us'] = counts / np.nansum(counts, axis=1, keepdims=True)
+        if 'population' in metrics:
+            metrics['per_1000_residents'] = counts / metrics['population'] * 1000
+        growth = np.full_like(counts, np.nan)
+        growth[1:] = counts[1:] / counts[:-1] - 1
+        metrics['growth_yoy'] = growth
+
+    names = [name for name in METRIC_LABELS if name in metrics] + [name for name in metrics if name not in METRIC_LABELS]
+    values = np.stack([metrics[name] for name in names], axis=-1)
+    values[~np.isfinite(values)] = np.nan
+    return years, states, names, values
+
+def rank_states(values):
+    """Rank (1 = highest, ties share the best rank) and percentile (share of states at or below) along the state axis"""
+    filled = np.where(np.isnan(values), -np.inf, values)
+    order = np.argsort(-filled, axis=1, kind='stable') # Descending, missing values last
+    ordered = np.take_along_axis(filled, order, axis=1)
+
+    # Ties: every position takes the position of the first value of its run
+    position = np.arange(values.shape[1]).reshape(1, -1, 1)
+    run_start = np.concatenate([np.ones_like(ordered[:, :1], bool), ordered[:, 1:] != ordered[:, :-1]], axis=1)
+    ordered_rank = np.maximum.accumulate(np.where(run_start, position, 0), axis=1) + 1
+
+    ranks = np.empty_like(ordered_rank)
+    np.put_along_axis(ranks, order, ordered_rank, axis=1)
+    n_valid = (~np.isnan(values)).sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentiles = (n_valid - ranks + 1) / n_valid # Values at or below = valid values - strictly higher ones
+    ranks = np.where(np.isnan(values), np.nan, ranks)
+    return ranks, np.where(np.isnan(values), np.nan, percentiles)
+
+class StateAnalytics:
+    """Ranked state metrics with one precomputed wide table per year"""
+    def __init__(self, ev_state, history=None):
+        self.years, self.states, self.metrics, self.values = state_cube(ev_state, history)
+        self.ranks, self.percentiles = rank_states(self.values)
+
+        # Per-year tables: columns <metric>, <metric>_rank, <metric>_percentile; states without data are dropped
+        columns = self.metrics + [f'{m}_rank' for m in self.metrics] + [f'{m}_percentile' for m in self.metrics]
+        self.by_year = {}
+        for i, year in enumerate(self.years.tolist()):
+            data = np.concatenate([self.values[i], self.ranks[i], self.percentiles[i]], axis=1)
+            frame = pd.DataFrame(data, index=pd.Index(self.states, name='state'), columns=columns)
+            self.by_year[year] = frame[~np.isnan(self.values[i]).all(axis=1)]
+
+    @property
+    def latest_year(self):
+        return int(self.years[-1])
+
+    def metrics_for(self, year=None):
+        """Metrics available in a year, in display order"""
+        frame = self.by_year[year or self.latest_year]
+        return [metric for metric in self.metrics if frame[metric].notna().any()]
+
+    def ranking(self, metric='registration_count', year=None):
+        """States ordered by rank for one metric and year: state, value, rank, percentile"""
+        frame = self.by_year[year or self.latest_year]
+        ranking = frame[[metric, f'{metric}_rank', f'{metric}_percentile']].dropna(subset=[metric])
+        ranking.columns = ['value', 'rank', 'percentile']
+        ranking['rank'] = ranking['rank'].astype(int)
+        return ranking.sort_values('rank', kind='stable').reset_index()
+
+    def state_profile(self, state=FOCUS_STATE, year=None):
+        """Value, rank and percentile of every metric for one state"""
+        frame = self.by_year[year or self.latest_year]
+        metrics = self.metrics_for(year)
+        if state not in frame.index:
+            return pd.DataFrame(columns=['value', 'rank', 'percentile'])
+        row = frame.loc[state]
+        return pd.DataFrame({
+            'value': row[metrics].to_numpy(float),
+            'rank': row[[f'{m}_rank' for m in metrics]].to_numpy(float),
+            'percentile': row[[f'{m}_percentile' for m in metrics]].to_numpy(float),
+        }, index=pd.Index(metrics, name='metric'))
+
+    def long_table(self):
+        """Long (state, year, metric, value, rank, percentile) table of every available value"""
+        year, state, metric = np.nonzero(~np.isnan(self.values))
+        return pd.DataFrame({
+            'state': self.states[state],
+            'year': self.years[year],
+            'metric': np.asarray(self.metrics)[metric],
+            'value': self.values[year, state, metric],
+            'rank': self.ranks[year, state, metric].astype(int),
+            'percentile': self.percentiles[year, state, metric],
+        })
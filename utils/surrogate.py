@@ -0,0 +1,143 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import copy
+import time
+import argparse
+
+import numpy as np
+from scipy.stats import qmc
+
+from utils.data import data_path, load_pickle, save_pickle
+
+# ================================== #
+# Compact surrogate of the prediction model
+# Two steps, both keeping the model a GradientBoostingRegressor (so SHAP, goal seeking and batch SHAP still apply):
+# 1. Trees with identical splits are summed into one tree (exact: predictions and SHAP values are unchanged).
+# 2. Trees are dropped in order of their output range, smallest first. A dropped tree's midrange is folded into
+#    the model's constant, so each one moves any prediction by at most half its range. Trees are dropped until
+#    the deviation from the original model on ev_merged or a validation grid would exceed the tolerance.
+#    The sum of the dropped half-ranges is also reported: a worst-case bound over every possible input.
+# Usage (from the repository root):
+#   python -m utils.surrogate                    # data_processed/final_model_compact.pkl, max deviation 1 EV
+#   python -m utils.surrogate --tolerance 0.25
+
+MODEL_FILE = 'final_model.pkl'
+COMPACT_FILE = 'final_model_compact.pkl'
+DEFAULT_TOLERANCE = 1.0 # Max absolute deviation from the original model (EV count)
+GRID_SAMPLES = 2 ** 14 # Validation grid: Sobol points over the observed range of every input
+SEED = 0
+
+def validation_inputs(ev_merged, features, samples=GRID_SAMPLES, seed=SEED):
+    """ev_merged rows followed by a quasi-random grid spanning the observed range of each input (original units)"""
+    values = ev_merged[features].to_numpy(float)
+    grid = qmc.scale(qmc.Sobol(len(features), scramble=True, seed=seed).random_base2(int(np.log2(samples))),
+                     values.min(axis=0), values.max(axis=0))
+    return np.concatenate([values, grid])
+
+def tree_key(tree):
+    """Split structure of a fitted tree (features, thresholds, children)"""
+    t = tree.tree_
+    return (t.feature.tobytes(), t.threshold.tobytes(), t.children_left.tobytes(), t.children_right.tobytes())
+
+def merge_identical_trees(trees):
+    """Sum trees with identical splits into one (their leaf values add up; node covers are identical)"""
+    merged = {}
+    for tree in trees:
+        key = tree_key(tree)
+        if key in merged:
+            merged[key].tree_.value[:] += tree.tree_.value
+        else:
+            merged[key] = copy.copy(tree) # Shares the ensemble's random state instead of pickling a copy per tree
+            merged[key].tree_ = copy.deepcopy(tree.tree_)
+    return list(merged.values())
+
+def leaf_range(tree):
+    """(min, max) of a tree's leaf values"""
+    leaves = tree.tree_.value[tree.tree_.children_left == -1].ravel()
+    return leaves.min(), leaves.max()
+
+def compact_model(model, scaled_inputs, tolerance=DEFAULT_TOLERANCE):
+    """Smaller model whose predictions stay within tolerance of the original on scaled_inputs; returns (model, report)"""
+    rate = model.learning_rate
+    trees = merge_identical_trees(model.estimators_[:, 0])
+    X = np.asarray(scaled_inputs, dtype=np.float32) # As the trees compare
+    original = model.predict(X)
+
+    # Drop order: smallest half-range first; each dropped tree is replaced by its midrange
+    ranges = np.array([leaf_range(tree) for tree in trees]) * rate
+    midrange, half_range = ranges.mean(axis=1), (ranges[:, 1] - ranges[:, 0]) / 2
+    order = np.argsort(half_range, kind='stable')
+    residual = np.empty((len(trees), len(X))) # Row k: what dropping the k-th tree in drop order changes
+    for row, i in enumerate(order):
+        residual[row] = trees[i].predict(X) * rate - midrange[i]
+    np.cumsum(residual, axis=0, out=residual) # In place: (trees, points) is the largest array here
+    deviation = np.abs(residual, out=residual).max(axis=1) # Max deviation after dropping the first k + 1 trees
+    exceeded = np.flatnonzero(deviation > tolerance)
+    n_dropped = exceeded[0] if len(exceeded) else len(trees) - 1 # At least one tree stays
+    dropped, kept = order[:n_dropped], np.sort(order[n_dropped:]) # Kept trees stay in boosting order
+
+    compact = copy.deepcopy(model)
+    compact.estimators_ = np.array([[trees[i]] for i in kept], dtype=object)
+    compact.n_estimators = compact.n_estimators_ = len(kept)
+    compact.train_score_ = model.train_score_[:len(kept)] # Not used for prediction; kept consistent in length
+    compact.init_.constant_ = compact.init_.constant_ + midrange[dropped].sum()
+
+    report = {
+        'source': MODEL_FILE,
+        'trees': len(model.estimators_),
+        'trees_after_merge': len(trees),
+        'trees_kept': len(kept),
+        'tolerance': tolerance,
+        'max_deviation': float(np.abs(compact.predict(X) - original).max()),
+        'worst_case_bound': float(half_range[dropped].sum()), # Over any input, not only the validation points
+        'validation_points': len(X)
+    }
+    return compact, report
+
+def build_compact_model(tolerance=DEFAULT_TOLERANCE, output=COMPACT_FILE):
+    """Compress final_model.pkl against ev_merged and the validation grid, and save it as an alternate artifact"""
+    artifact = load_pickle(data_path(MODEL_FILE))
+    features = artifact['selected_features']
+    inputs = validation_inputs(load_pickle(data_path('ev_merged.pickle')), features)
+    compact, report = compact_model(artifact['model'], artifact['scaler'].transform(inputs), tolerance)
+    if report['max_deviation'] > tolerance: # Guard: the fidelity check must hold for the saved model
+        raise ValueError(f"Compact model deviates by {report['max_deviation']:.4f} (> {tolerance})")
+    save_pickle({**artifact, 'model': compact, 'surrogate': report}, data_path(output))
+    return report
+
+# ================================== #
+# Command line
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compress the prediction model into a smaller model within a max deviation')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Max absolute deviation in predicted EV count')
+    parser.add_argument('--output', default=COMPACT_FILE, help='Artifact name in data_processed')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = build_compact_model(args.tolerance, args.output)
+    print(f"{report['trees']} trees -> {report['trees_after_merge']} after merging identical splits -> {report['trees_kept']} kept")
+    print(f"Max deviation {report['max_deviation']:.4f} over {report['validation_points']:,} points "
+          f"(tolerance {report['tolerance']}); worst case over any input {report['worst_case_bound']:.4f}")
+    print(f"Wrote data_processed/{args.output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,152 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import streamlit as st
+
+# ================================== #
+# Per-process timing histograms (cheap enough to stay on in production)
+
+ENABLED = os.environ.get('EV_TELEMETRY', '1') != '0' # Set EV_TELEMETRY=0 to turn recording off
+DUMP_PATH = os.environ.get('EV_TELEMETRY_DUMP') # If set, a JSON dump is written here when the process exits
+# Set EV_TELEMETRY_PAYLOADS=1 to record chart payload sizes (off by default: measuring serializes each chart a second time)
+PAYLOADS = ENABLED and os.environ.get('EV_TELEMETRY_PAYLOADS') == '1'
+RESET_ENABLED = os.environ.get('EV_TELEMETRY_RESET') == '1' # Set EV_TELEMETRY_RESET=1 to allow resets from the Diagnostics page
+RECENT_SAMPLES = 512 # Samples kept per metric for percentiles
+
+# 1-2-5 bucket upper bounds from 0.1 to 1e8 (ms or bytes), plus an overflow bucket
+BUCKET_BOUNDS = [m * 10.0 ** e for e in range(-1, 8) for m in (1, 2, 5)] + [1e8]
+
+class Histogram:
+    """Fixed-bucket histogram plus a bounded window of recent samples"""
+    def __init__(self, unit):
+        self.unit = unit
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.recent.append(value)
+
+    def summary(self):
+        recent = np.fromiter(self.recent, dtype=float)
+        p50, p90, p99 = np.percentile(recent, [50, 90, 99]) if len(recent) else (0.0, 0.0, 0.0)
+        return {
+            'unit': self.unit,
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'last': self.recent[-1] if self.recent else 0.0,
+            'buckets': {f'<={bound:g}': n for bound, n in zip(BUCKET_BOUNDS + [float('inf')], self.buckets) if n}
+        }
+
+_lock = threading.Lock() # Streamlit runs sessions on separate threads
+_histograms = {}
+_counters = {}
+_started_at = time.time()
+
+def record(name, value, unit='ms'):
+    """Add one observation to the named histogram"""
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(unit)
+        histogram.add(value)
+
+def count(name, n=1):
+    """Increment a named counter"""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+@contextmanager
+def timer(name):
+    """Time a block in milliseconds (recorded even if the block raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+def snapshot():
+    """Machine-readable view of all metrics"""
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'started_at': _started_at,
+            'generated_at': time.time(),
+            'histograms': {name: h.summary() for name, h in sorted(_histograms.items())},
+            'counters': dict(sorted(_counters.items()))
+        }
+
+def dump_json(path):
+    """Write the current snapshot as JSON"""
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+
+def reset():
+    """Clear all metrics"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+if DUMP_PATH:
+    atexit.register(dump_json, DUMP_PATH)
+
+# ================================== #
+# Diagnostics page link
+
+def hide_diagnostics_link():
+    """Hide the Diagnostics page link from the sidebar navigation (called by every page)"""
+    st.markdown("""
+    <style>
+    [data-testid="stSidebarNav"] li:has(a[href$="/Diagnostics"]) {
+        display: none;
+    }
+    </style>
+    """, unsafe_allow_html=True)
@@ -0,0 +1,203 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils.data import cache_path, data_path, data_version, load_pickle
+from utils.coverage import parse_points
+
+# ================================== #
+# Density tile pyramid of EV (and charger) locations
+# Points are binned into square bins of BIN_PIXELS screen pixels in Web Mercator (the web map projection) at
+# every zoom level. Square bins nest: the bin of a point at zoom z - 1 is its bin at zoom z with both indices
+# halved, so only the finest level is computed from the points and each coarser level is summed from the one
+# below. Only non-empty bins are stored, sorted by (x, y), with one count column per layer:
+# all EVs, each EV type, the most common makes (the rest as one layer) and charging stations.
+# Usage (from the repository root, optional; built on first use otherwise):
+#   python -m utils.tiles
+
+MIN_ZOOM, MAX_ZOOM = 5, 13 # Whole state .. neighborhood (bins of about 300 m at 47° N)
+BIN_PIXELS = 16 # Bin size on screen
+TILE_PIXELS = 256 # Web Mercator tile size
+TOP_MAKES = 15 # Makes with their own layer (others are summed into one)
+OTHER_MAKES = 'make:(other)'
+LAYER_ARRAYS = ['x', 'y', 'counts']
+
+def mercator_bins(lon, lat, zoom):
+    """Bin indices (x, y) of lon/lat points at a zoom level"""
+    scale = TILE_PIXELS * 2 ** zoom / BIN_PIXELS # Bins across the world
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = (lon + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * scale
+    return np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+
+def bin_centers(x, y, zoom):
+    """Lon/lat of bin centers"""
+    scale = TILE_PIXELS * 2 ** zoom / BIN_PIXELS
+    lon = (x + 0.5) / scale * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (y + 0.5) / scale))))
+    return lon, lat
+
+def unique_bins(x, y):
+    """Sorted distinct bins (x, y) and the position of each input among them"""
+    keys = (x << 32) | y # Both indices are below 2**31 up to zoom 22
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique >> 32, unique & 0xFFFFFFFF, inverse
+
+def coarsen(level):
+    """Level one zoom out: halve the bin indices and sum the counts of the four bins that merge"""
+    x, y, inverse = unique_bins(level['x'] >> 1, level['y'] >> 1)
+    counts = np.zeros((len(x), level['counts'].shape[1]), dtype=np.int32)
+    for column in range(counts.shape[1]):
+        counts[:, column] = np.bincount(inverse, weights=level['counts'][:, column], minlength=len(x))
+    return {'x': x, 'y': y, 'counts': counts}
+
+def category_codes(series, categories):
+    """Position of each value in categories (-1 if absent or missing), computed per category for categoricals"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        lookup = pd.Index(categories).get_indexer(series.cat.categories.astype(str))
+        return np.append(lookup, -1)[series.cat.codes.to_numpy()]
+    return pd.Index(categories).get_indexer(series.astype(str))
+
+class DensityTiles:
+    """Non-empty bins per zoom level (x, y, counts per layer), plus per-district bounds for fitting the view"""
+    def __init__(self, levels, meta):
+        self.levels = levels # {zoom: {'x', 'y', 'counts'}}
+        self.layers = meta['layers']
+        self.district_bounds = meta['district_bounds'] # {district: [min_lon, min_lat, max_lon, max_lat]}
+
+    @classmethod
+    def build(cls, ev, charger):
+        """Pyramid from the EV table's vehicle_location points and the charging stations"""
+        lon_lat = parse_points(ev['vehicle_location'])
+        located = ~np.isnan(lon_lat).any(axis=1)
+        ev_types = sorted(pd.unique(ev['ev_type'].dropna()).astype(str)) # Distinct values only (no per-row strings)
+        makes = ev['make'].value_counts().nlargest(TOP_MAKES).index.astype(str).tolist()
+        layers = ['all'] + [f'ev_type:{t}' for t in ev_types] + [f'make:{m}' for m in makes] + [OTHER_MAKES, 'chargers']
+
+        # Layer columns of each EV point: 'all', its type, its make (or the other-makes layer)
+        type_column = 1 + category_codes(ev['ev_type'], ev_types)
+        make_code = category_codes(ev['make'], makes)
+        make_column = np.where(make_code >= 0, 1 + len(ev_types) + make_code, layers.index(OTHER_MAKES))
+
+        stations = charger.dropna(subset=['latitude', 'longitude'])
+        lon = np.concatenate([lon_lat[located, 0], stations['longitude'].to_numpy(float)])
+        lat = np.concatenate([lon_lat[located, 1], stations['latitude'].to_numpy(float)])
+        n_ev = int(located.sum())
+
+        # Finest level from the points
+        x, y, inverse = unique_bins(*mercator_bins(lon, lat, MAX_ZOOM))
+        ev_bins, station_bins = inverse[:n_ev], inverse[n_ev:]
+        # Each point adds 1 to cell (bin, layer) of the flattened count matrix
+        cells = len(x) * len(layers)
+        counts = np.bincount(ev_bins * len(layers), minlength=cells) # 'all'
+        has_type = type_column[located] > 0
+        counts += np.bincount(ev_bins[has_type] * len(layers) + type_column[located][has_type], minlength=cells)
+        counts += np.bincount(ev_bins * len(layers) + make_column[located], minlength=cells)
+        counts += np.bincount(station_bins * len(layers) + len(layers) - 1, minlength=cells)
+        levels = {MAX_ZOOM: {'x': x, 'y': y, 'counts': counts.reshape(len(x), len(layers)).astype(np.int32)}}
+
+        for zoom in range(MAX_ZOOM - 1, MIN_ZOOM - 1, -1):
+            levels[zoom] = coarsen(levels[zoom + 1])
+
+        located_ev = pd.DataFrame(lon_lat[located], columns=['lon', 'lat'])
+        bounds = located_ev.groupby(ev['legislative_district'].to_numpy()[located])[['lon', 'lat']].agg(['min', 'max'])
+        district_bounds = {str(district): [row[('lon', 'min')], row[('lat', 'min')], row[('lon', 'max')], row[('lat', 'max')]]
+                           for district, row in bounds.iterrows()}
+        return cls(levels, {'layers': layers, 'district_bounds': district_bounds})
+
+    def save(self, folder):
+        """Write each level's arrays as .npy files and the metadata as JSON (last, atomically: marks the folder complete)"""
+        os.makedirs(folder, exist_ok=True)
+        for zoom, arrays in self.levels.items():
+            for name in LAYER_ARRAYS:
+                np.save(os.path.join(folder, f'{name}_{zoom}.npy'), arrays[name])
+        with open(os.path.join(folder, 'meta.tmp'), 'w', encoding='utf-8') as f:
+            json.dump({'layers': self.layers, 'district_bounds': self.district_bounds, 'zooms': sorted(self.levels)}, f)
+        os.replace(os.path.join(folder, 'meta.tmp'), os.path.join(folder, 'meta.json'))
+
+    @classmethod
+    def load(cls, folder):
+        """Pyramid with its arrays memory-mapped read-only from a saved folder"""
+        with open(os.path.join(folder, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        levels = {zoom: {name: np.load(os.path.join(folder, f'{name}_{zoom}.npy'), mmap_mode='r') for name in LAYER_ARRAYS}
+                  for zoom in meta['zooms']}
+        return cls(levels, meta)
+
+    def bounds_of(self, districts):
+        """[min_lon, min_lat, max_lon, max_lat] around the EVs of the given districts (None: everything)"""
+        boxes = np.array([self.district_bounds[str(d)] for d in districts if str(d) in self.district_bounds])
+        if not len(boxes):
+            return None
+        return [boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max()]
+
+    def bins(self, zoom, layer='all', bounds=None):
+        """Non-empty bins of one layer at a zoom level, optionally within [min_lon, min_lat, max_lon, max_lat]"""
+        level = self.levels[zoom]
+        x, y = level['x'], level['y']
+        start, stop = 0, len(x)
+        if bounds is not None:
+            (x0, y1), (x1, y0) = [mercator_bins(np.array([lon]), np.array([lat]), zoom) for lon, lat in
+                                  [(bounds[0], bounds[1]), (bounds[2], bounds[3])]]
+            start, stop = np.searchsorted(x, x0[0], side='left'), np.searchsorted(x, x1[0], side='right') # x is sorted
+        x, y = np.asarray(x[start:stop]), np.asarray(y[start:stop])
+        counts = np.asarray(level['counts'][start:stop, self.layers.index(layer)])
+        keep = counts > 0
+        if bounds is not None:
+            keep &= (y >= y0[0]) & (y <= y1[0])
+        lon, lat = bin_centers(x[keep], y[keep], zoom)
+        return pd.DataFrame({'lon': lon, 'lat': lat, 'count': counts[keep]})
+
+    def finest_zoom(self, layer='all', bounds=None, max_bins=None, zoom=MAX_ZOOM):
+        """Finest zoom level, not above zoom, whose bins in the view stay within max_bins"""
+        while max_bins is not None and zoom > MIN_ZOOM and len(self.bins(zoom, layer, bounds)) > max_bins:
+            zoom -= 1
+        return zoom
+
+# ================================== #
+# Saved pyramid per data version
+
+def tiles_folder(version):
+    """Cache folder of the pyramid arrays for one data version"""
+    return os.path.dirname(cache_path('density_tiles', version, 'meta.json'))
+
+def load_tiles(ev, ev_file='ev.pickle'):
+    """Pyramid for this data version, built and saved on the first use"""
+    folder = tiles_folder(data_version(ev_file, 'charger.pickle'))
+    if not os.path.exists(os.path.join(folder, 'meta.json')):
+        DensityTiles.build(ev, load_pickle(data_path('charger.pickle'))).save(folder)
+    return DensityTiles.load(folder)
+
+if __name__ == '__main__':
+    from utils.loader import EV_PARQUET, load_ev
+    ev_file = EV_PARQUET if os.path.exists(data_path(EV_PARQUET)) else 'ev.pickle'
+    ev = load_ev() if ev_file == EV_PARQUET else load_pickle(data_path(ev_file))
+    tiles = load_tiles(ev, ev_file)
+    for zoom, level in sorted(tiles.levels.items()):
+        print(f"zoom {zoom:2d}: {len(level['x']):,} bins")
+    print(f"Layers: {', '.join(tiles.layers)}")
@@ -0,0 +1,191 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.data import data_path
+from utils.loader import CHUNK_SIZE, CLEAN_COLUMNS, EV_PARQUET, iter_clean_chunks, load_ev, raw_usecols
+
+# ================================== #
+# Time-series store of EV counts across registration snapshots
+# Layout: data_processed/ev_snapshots/snapshot=YYYY-MM-DD.parquet, one zstd-compressed file per
+# snapshot with counts by (legislative_district, make, ev_type). Snapshots are only ever added;
+# queries run on a dense (month x district x make x ev_type) array built once per store version.
+# Usage (from the repository root):
+#   python -m utils.timeseries append 2024-10-03 --csv ./data/Electric_Vehicle_Population_Data_20241003.csv
+#   python -m utils.timeseries append 2024-10-03   # snapshot of the current data_processed EV table
+#   python -m utils.timeseries list
+
+STORE_DIR = 'ev_snapshots' # Inside data_processed/
+KEY_COLUMNS = ['legislative_district', 'make', 'ev_type']
+
+def store_path(store_dir=None):
+    """Folder holding the snapshot files"""
+    return store_dir or data_path(STORE_DIR)
+
+def snapshot_files(store_dir=None):
+    """Snapshot files in the store, oldest first"""
+    path = store_path(store_dir)
+    if not os.path.isdir(path):
+        return []
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if name.startswith('snapshot=') and name.endswith('.parquet'))
+
+def store_version(store_dir=None):
+    """Fingerprint of the snapshot files (changes whenever a snapshot is appended)"""
+    digest = hashlib.sha1()
+    for path in snapshot_files(store_dir):
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:12]
+
+# ================================== #
+# Writing snapshots
+
+def aggregate_snapshot(ev):
+    """EV counts by (legislative_district, make, ev_type) of one registration table"""
+    return ev.groupby(KEY_COLUMNS, observed=True).size().rename('ev_count').reset_index()
+
+def aggregate_csv(path, chunk_size=CHUNK_SIZE):
+    """Same counts streamed from a raw DOL export (only the key and cleaning columns are parsed)"""
+    totals = None
+    for chunk in iter_clean_chunks(path, chunk_size, usecols=raw_usecols(path, CLEAN_COLUMNS + KEY_COLUMNS)):
+        counts = chunk.groupby(KEY_COLUMNS).size()
+        totals = counts if totals is None else totals.add(counts, fill_value=0)
+    return totals.astype('int64').rename('ev_count').reset_index()
+
+def append_snapshot(counts, snapshot_date, store_dir=None):
+    """Add one snapshot to the store (an existing snapshot is never rewritten)"""
+    snapshot_date = pd.Timestamp(snapshot_date).normalize()
+    path = os.path.join(store_path(store_dir), f'snapshot={snapshot_date:%Y-%m-%d}.parquet')
+    if os.path.exists(path):
+        raise FileExistsError(f'Snapshot {snapshot_date:%Y-%m-%d} is already in the store')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    snapshot = counts[KEY_COLUMNS + ['ev_count']].astype({**{col: str for col in KEY_COLUMNS}, 'ev_count': 'int32'})
+    snapshot.insert(0, 'snapshot_date', snapshot_date)
+    tmp_path = f'{path}.tmp'
+    snapshot.to_parquet(tmp_path, compression='zstd', index=False)
+    os.replace(tmp_path, path)
+    return path
+
+# ================================== #
+# Reading and querying
+
+def load_store(store_dir=None):
+    """All snapshots as one long table (keys as categoricals); None when the store is empty"""
+    files = snapshot_files(store_dir)
+    if not files:
+        return None
+    store = pq.ParquetDataset(files).read().to_pandas()
+    return store.astype({col: 'category' for col in KEY_COLUMNS})
+
+class SnapshotCube:
+    """Dense (month x district x make x ev_type) array of EV counts for vectorized window queries"""
+    def __init__(self, store):
+        # Keep the latest snapshot of each month
+        dates = store['snapshot_date']
+        month_number = dates.dt.year * 12 + dates.dt.month - 1 # Months since year 0
+        store = store[dates == dates.groupby(month_number).transform('max')]
+        month_number = month_number[store.index]
+
+        first, last = month_number.min(), month_number.max()
+        self.months = pd.period_range(pd.Period(year=first // 12, month=first % 12 + 1, freq='M'), periods=last - first + 1, freq='M') # Regular monthly axis
+        self.snapshot_dates = pd.DatetimeIndex(store['snapshot_date'].unique()).sort_values()
+        keys = [store[col].cat.remove_unused_categories() for col in KEY_COLUMNS]
+        self.districts = keys[0].cat.categories
+        self.makes = keys[1].cat.categories
+        self.ev_types = keys[2].cat.categories
+
+        # Scatter counts into the dense array in one bincount
+        shape = (len(self.months), len(self.districts), len(self.makes), len(self.ev_types))
+        month_codes = (month_number - first).to_numpy()
+        flat = np.ravel_multi_index((month_codes, *(key.cat.codes.to_numpy() for key in keys)), shape)
+        self.counts = np.bincount(flat, weights=store['ev_count'], minlength=np.prod(shape)).astype(np.float32).reshape(shape)
+        self.observed = np.bincount(month_codes, minlength=shape[0]) > 0
+        self.counts[~self.observed] = np.nan # Months without a snapshot are unknown, not zero
+
+    @property
+    def n_snapshots(self):
+        return int(self.observed.sum())
+
+    def series(self, districts=None, makes=None, ev_types=None, by_district=True):
+        """Monthly EV counts (index: month start) by district, or as a 'Total' column, for a slice of the cube"""
+        values = self.counts
+        positions = {}
+        for axis, (labels, chosen) in enumerate(((self.districts, districts), (self.makes, makes), (self.ev_types, ev_types)), start=1):
+            if chosen is not None and len(chosen):
+                positions[axis] = labels.get_indexer(pd.Index(chosen).astype(str))
+                values = values.take(positions[axis][positions[axis] >= 0], axis=axis) # Unknown labels are ignored
+        values = values.sum(axis=(2, 3))
+        index = self.months.to_timestamp()
+        if not by_district:
+            total = np.where(self.observed, np.nansum(values, axis=1), np.nan)
+            return pd.DataFrame({'Total': total}, index=index)
+        columns = self.districts if 1 not in positions else self.districts[positions[1][positions[1] >= 0]]
+        return pd.DataFrame(values, index=index, columns=columns)
+
+def rolling_mean(frame, months=3):
+    """Trailing rolling mean over the given number of months"""
+    return frame.rolling(months, min_periods=1).mean()
+
+def year_over_year(frame):
+    """Change against the same month of the previous year"""
+    return (frame / frame.shift(12) - 1).replace([np.inf, -np.inf], np.nan)
+
+def growth_rate(frame, months=12):
+    """Annualized growth rate over a trailing window of the given number of months"""
+    return ((frame / frame.shift(months)) ** (12 / months) - 1).replace([np.inf, -np.inf], np.nan)
+
+# ================================== #
+# Command line
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append registration snapshots to the EV time-series store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    append = subparsers.add_parser('append', help='Add one snapshot')
+    append.add_argument('date', help='Snapshot date (YYYY-MM-DD)')
+    append.add_argument('--csv', default=None, help='Raw DOL export to aggregate (default: the current data_processed EV table)')
+    append.add_argument('--store', default=None, help='Store folder (default: data_processed/ev_snapshots)')
+    listing = subparsers.add_parser('list', help='List stored snapshots')
+    listing.add_argument('--store', default=None, help='Store folder (default: data_processed/ev_snapshots)')
+    args = parser.parse_args()
+
+    if args.command == 'append':
+        if args.csv:
+            counts = aggregate_csv(args.csv)
+        elif os.path.exists(data_path(EV_PARQUET)):
+            counts = aggregate_snapshot(load_ev(columns=KEY_COLUMNS))
+        else:
+            counts = aggregate_snapshot(pd.read_pickle(data_path('ev.pickle'))[KEY_COLUMNS])
+        path = append_snapshot(counts, args.date, args.store)
+        print(f'Wrote {int(counts["ev_count"].sum()):,} EVs in {len(counts):,} groups to {path}')
+    else:
+        for path in snapshot_files(args.store):
+            print(os.path.basename(path), f'{os.path.getsize(path) / 1e3:.1f} kB')
@@ -0,0 +1,216 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils.data import cache_path, data_version
+
+# ================================== #
+# Vehicle index: VIN (first 10 characters) and DOL vehicle ID lookups without scanning the EV table
+# - VIN: the distinct VINs sorted as fixed-width bytes, each with its group of row positions. An exact VIN or
+#   any prefix (e.g. a make's manufacturer code) is a binary search to a contiguous range of groups.
+# - DOL vehicle ID: an open-addressing hash table from ID to its group of row positions (one probe on average).
+# Groups also give the duplicate counts directly. The arrays are saved once per data version as .npy files and
+# memory-mapped read-only, like the batch SHAP engine.
+
+VIN_WIDTH = 10 # The registration export publishes VIN characters 1-10
+INDEX_ARRAYS = ['vin_keys', 'vin_starts', 'vin_rows', 'id_keys', 'id_starts', 'id_rows', 'table_keys', 'table_groups']
+EMPTY = np.iinfo(np.int64).min # Free hash slot (not a valid vehicle ID)
+MAX_VEHICLE_ID = np.iinfo(np.int64).max # Largest DOL vehicle ID the index can hold (larger ones cannot be registered)
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15) # Fibonacci hashing: spreads consecutive IDs over the table
+
+def encode_vins(values, width=VIN_WIDTH):
+    """VIN strings as a fixed-width bytes array (b'' where missing)"""
+    return pd.Series(values, dtype='string').fillna('').str.encode('ascii', 'replace').to_numpy(dtype=f'S{width}')
+
+def sorted_groups(values, positions):
+    """Distinct values (sorted), the positions grouped by value and each group's start offset, from one stable sort"""
+    order = np.argsort(values, kind='stable')
+    ordered = values[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]]) if len(ordered) else np.zeros(0, dtype=np.int64)
+    return ordered[starts], positions[order].astype(np.int64), np.append(starts, len(ordered)).astype(np.int64)
+
+def vin_groups(series):
+    """Sorted distinct VINs, the rows grouped by VIN and each group's start offset (missing VINs left out)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Sort the categories only, then group the rows by their rank among them
+        categories = encode_vins(series.cat.categories.astype(str))
+        ranks = np.argsort(np.argsort(categories, kind='stable'))
+        codes = series.cat.codes.to_numpy()
+        valid = np.flatnonzero(np.append(categories != b'', False)[codes]) # Code -1 (missing) maps to False
+        ranked, rows, starts = sorted_groups(ranks[codes[valid]], valid)
+        return np.sort(categories)[ranked], rows, starts
+    vins = encode_vins(series)
+    valid = np.flatnonzero(vins != b'')
+    return sorted_groups(vins[valid], valid)
+
+def id_groups(series):
+    """Sorted distinct DOL vehicle IDs, the rows grouped by ID and each group's start offset (missing IDs left out)"""
+    ids = pd.to_numeric(series, errors='coerce').astype('Int64')
+    valid = np.flatnonzero(ids.notna().to_numpy())
+    return sorted_groups(ids.to_numpy(np.int64, na_value=0)[valid], valid)
+
+def hash_slots(keys, bits):
+    """Home slot of each key in a table of 2**bits slots"""
+    return (keys.astype(np.uint64) * HASH_MULTIPLIER) >> np.uint64(64 - bits)
+
+def build_hash_table(keys):
+    """Open-addressing (linear probing) table of unique keys -> their position in keys, at most half full"""
+    bits = max(int(np.ceil(np.log2(max(len(keys), 1) * 2))), 1)
+    mask = (1 << bits) - 1
+    table_keys = np.full(1 << bits, EMPTY, dtype=np.int64)
+    table_groups = np.full(1 << bits, -1, dtype=np.int64)
+    home = hash_slots(keys, bits).astype(np.int64)
+    pending, probe = np.arange(len(keys)), 0
+    # All keys are placed in rounds: in round p every unplaced key tries its home slot + p. A slot skipped
+    # in some round stays occupied, so a lookup probing from the home slot never stops early.
+    while len(pending):
+        slots = (home[pending] + probe) & mask
+        free = table_keys[slots] == EMPTY
+        slots, candidates = slots[free], pending[free]
+        slots, first = np.unique(slots, return_index=True) # One key per free slot
+        table_keys[slots] = keys[candidates[first]]
+        table_groups[slots] = candidates[first]
+        placed = np.zeros(len(keys), dtype=bool)
+        placed[candidates[first]] = True
+        pending = pending[~placed[pending]]
+        probe += 1
+    return table_keys, table_groups, probe
+
+class VehicleIndex:
+    """VIN prefix and DOL vehicle ID index over the rows of the EV table"""
+    def __init__(self, arrays, meta):
+        for name in INDEX_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.rows = meta['rows']
+        self.max_probe = meta['max_probe']
+        self.bits = int(np.log2(len(self.table_keys)))
+
+    @classmethod
+    def build(cls, ev):
+        """Index built from the EV table's vin and dol_vehicle_id columns"""
+        vin_keys, vin_rows, vin_starts = vin_groups(ev['vin'])
+        id_keys, id_rows, id_starts = id_groups(ev['dol_vehicle_id'])
+        table_keys, table_groups, probes = build_hash_table(id_keys)
+
+        arrays = {'vin_keys': vin_keys, 'vin_starts': vin_starts, 'vin_rows': vin_rows,
+                  'id_keys': id_keys, 'id_starts': id_starts, 'id_rows': id_rows,
+                  'table_keys': table_keys, 'table_groups': table_groups}
+        return cls(arrays, {'rows': len(ev), 'max_probe': probes})
+
+    def save(self, folder):
+        """Write the arrays as .npy files and the metadata as JSON (last, atomically: marks the folder complete)"""
+        os.makedirs(folder, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(folder, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(folder, 'meta.tmp'), 'w', encoding='utf-8') as f:
+            json.dump({'rows': self.rows, 'max_probe': self.max_probe}, f)
+        os.replace(os.path.join(folder, 'meta.tmp'), os.path.join(folder, 'meta.json'))
+
+    @classmethod
+    def load(cls, folder):
+        """Index with its arrays memory-mapped read-only from a saved folder"""
+        with open(os.path.join(folder, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls({name: np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r') for name in INDEX_ARRAYS}, meta)
+
+    # Lookups return row positions into the EV table (use with ev.iloc)
+
+    def vin_range(self, prefix):
+        """Range of VIN groups starting with prefix (an exact 10-character VIN is one group)"""
+        prefix = prefix.strip().upper().encode('ascii', 'replace')[:VIN_WIDTH]
+        low = np.searchsorted(self.vin_keys, prefix, side='left')
+        high = np.searchsorted(self.vin_keys, prefix + b'\xff' * (VIN_WIDTH - len(prefix)), side='right')
+        return low, high
+
+    def vin_rows_for(self, prefix):
+        """Rows whose VIN starts with prefix, grouped by VIN"""
+        low, high = self.vin_range(prefix)
+        return np.asarray(self.vin_rows[self.vin_starts[low]:self.vin_starts[high]])
+
+    def vin_counts(self, prefix):
+        """Registrations per VIN starting with prefix"""
+        low, high = self.vin_range(prefix)
+        return pd.Series(np.diff(self.vin_starts[low:high + 1]), index=self.vin_keys[low:high].astype(str), name='rows')
+
+    def id_groups(self, ids):
+        """Group of each DOL vehicle ID (-1 if absent), one vectorized probe sequence for all of them"""
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        groups = np.full(len(ids), -1, dtype=np.int64)
+        pending = np.arange(len(ids))
+        home = hash_slots(ids, self.bits).astype(np.int64)
+        mask = len(self.table_keys) - 1
+        for probe in range(self.max_probe):
+            slots = (home[pending] + probe) & mask
+            keys = self.table_keys[slots]
+            found = keys == ids[pending]
+            groups[pending[found]] = self.table_groups[slots[found]]
+            pending = pending[~found & (keys != EMPTY)]
+            if not len(pending):
+                break
+        return groups
+
+    def id_rows_for(self, ids):
+        """Rows with any of the given DOL vehicle IDs"""
+        groups = self.id_groups(ids)
+        groups = groups[groups >= 0]
+        return np.concatenate([self.id_rows[self.id_starts[g]:self.id_starts[g + 1]] for g in groups]) \
+            if len(groups) else np.zeros(0, dtype=np.int64)
+
+    def duplicate_report(self, ev):
+        """Duplicate checks from the group sizes (no scan of the table): summary counts and the duplicated DOL IDs"""
+        vin_sizes, id_sizes = np.diff(self.vin_starts), np.diff(self.id_starts)
+        duplicated_ids = id_sizes > 1
+        records = ev.iloc[np.sort(self.id_rows[np.repeat(duplicated_ids, id_sizes)])] # Rows of every repeated ID
+        # A repeated DOL ID with the same VIN is the same vehicle listed twice; a different VIN is a conflict
+        same_vin = records.duplicated(['dol_vehicle_id', 'vin'], keep='first')
+        summary = pd.DataFrame({
+            'check': ['Rows', 'Distinct VINs (1-10)', 'VINs shared by several rows', 'Rows without a VIN',
+                      'Distinct DOL vehicle IDs', 'DOL IDs on several rows', 'Repeated rows (same DOL ID and VIN)',
+                      'Rows without a DOL ID'],
+            'count': [self.rows, len(vin_sizes), int((vin_sizes > 1).sum()), self.rows - int(vin_sizes.sum()),
+                      len(id_sizes), int(duplicated_ids.sum()), int(same_vin.sum()), self.rows - int(id_sizes.sum())]
+        })
+        return summary, records
+
+# ================================== #
+# Saved index per data version
+
+def index_folder(version):
+    """Cache folder of the index arrays for one data version"""
+    return os.path.dirname(cache_path('vehicle_index', version, 'meta.json'))
+
+def load_vehicle_index(ev, ev_file='ev.pickle'):
+    """Index for this data version, built and saved on the first use (rebuilt if the row count differs)"""
+    folder = index_folder(data_version(ev_file))
+    if os.path.exists(os.path.join(folder, 'meta.json')):
+        index = VehicleIndex.load(folder)
+        if index.rows == len(ev):
+            return index
+    index = VehicleIndex.build(ev)
+    index.save(folder)
+    return VehicleIndex.load(folder)
@@ -0,0 +1,125 @@
+"""
+MIT License
+
+Copyright (c) 2024 Daeyoung Kim
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly
+
+from utils import district_charts
+from utils.components import COMPONENT_DIR, FIGURE_DIR, save_figure
+from utils.data import data_path, data_version, load_pickle
+
+# ================================== #
+# Deploy-time warm-up of the district charts (EV Analysis Sections 3-5)
+# Every chart variant is rendered on a process pool and written as a static figure file under
+# cache/components/district_highlight/figures/<version>/, with a manifest mapping each variant to
+# its file. The version covers the dataset, the chart code and Plotly, so a stale figure is never
+# served. A fresh app process finds the manifest and serves these files without building anything.
+# Usage (from the repository root, before starting the app):
+#   python -m utils.warmup
+#   python -m utils.warmup --workers 4
+
+MANIFEST = 'manifest.json'
+CHART_SOURCES = ['district_charts.py', 'figures.py'] # Code that shapes the figure files
+
+@lru_cache(maxsize=1)
+def code_version():
+    """Fingerprint of the chart code and the Plotly version"""
+    digest = hashlib.sha1(plotly.__version__.encode())
+    for name in CHART_SOURCES:
+        with open(os.path.join(os.path.dirname(__file__), name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+def figure_version():
+    """Version folder of the precomputed figures: dataset version + chart code version"""
+    return f'{data_version("ev_merged.pickle")}-{code_version()}'
+
+def variant_key(chart, args):
+    """Manifest key of one chart variant"""
+    return json.dumps([chart, *args])
+
+def manifest_path(version):
+    """Manifest file of a version folder"""
+    return os.path.join(COMPONENT_DIR, FIGURE_DIR, version, MANIFEST)
+
+def load_manifest(version=None):
+    """{variant key: figure URL} of the precomputed figures ({} if the warm-up has not run for this version)"""
+    try:
+        with open(manifest_path(version or figure_version()), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# ================================== #
+# Process-pool rendering
+
+_ev_merged = None
+
+def _load_worker():
+    """Pool initializer: load the dataset once per worker"""
+    global _ev_merged
+    _ev_merged = load_pickle(data_path('ev_merged.pickle'))
+
+def render_variant(task):
+    """Build one chart variant and write its figure file (runs in a worker)"""
+    version, chart, args = task
+    start = time.perf_counter()
+    url = save_figure(district_charts.BUILDERS[chart](_ev_merged, *args), folder=version)
+    return variant_key(chart, args), url, time.perf_counter() - start
+
+def warm_up(workers=None):
+    """Render every district chart variant on a process pool and write the manifest"""
+    version = figure_version()
+    tasks = [(version, chart, args) for chart, args in district_charts.all_variants()]
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker) as pool:
+        results = list(pool.map(render_variant, tasks))
+    manifest = {key: url for key, url, _ in results}
+
+    # Written last and atomically: a partly warmed folder is never picked up
+    path = manifest_path(version)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(f'{path}.tmp', path)
+    return version, manifest, results # results: (variant key, figure URL, build seconds)
+
+# ================================== #
+# Command line
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the district charts of the EV Analysis page')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per variant, up to the CPU count)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    version, manifest, results = warm_up(args.workers)
+    for key, url, seconds in results:
+        print(f'{seconds:6.2f}s  {url}  {key}')
+    print(f'Wrote {len(manifest)} figures for version {version} in {time.perf_counter() - start:.1f}s')